@@ -4,7 +4,8 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from backend.database.models import Corpus, get_db
+from backend.database.models import SessionLocal
+from backend.database.corpus_store import CorpusBatch
 
 # 文章列表
 articles = [
@@ -410,35 +411,30 @@ articles = [
 
 def add_articles():
     """添加文章到数据库"""
-    db = next(get_db())
-
-    for article in articles:
-        # 检查是否已存在
-        existing = db.query(Corpus).filter(
-            Corpus.title == article["title"],
-            Corpus.source == article["source"]
-        ).first()
-
-        if existing:
-            print(f"文章已存在：{article['title']}")
-            continue
-
-        # 创建新记录
-        corpus = Corpus(
-            source=article["source"],
-            title=article["title"],
-            content=article["content"],
-            url="",
-            plot_tags=["区别对待", "公开处刑", "反杀打脸"],
-            emotion_score=9,
-            view_count=0
-        )
-
-        db.add(corpus)
-        print(f"已添加：{article['title']}")
-
-    db.commit()
-    print("\n所有文章添加完成！")
+    db = SessionLocal()
+    try:
+        for article in articles:
+            # 正文与已有语料近似重复时跳过（重复运行脚本不会重复写入）
+            corpus = CorpusBatch(db, article["source"]).add(
+                title=article["title"],
+                content=article["content"],
+                url="",
+                plot_tags=["区别对待", "公开处刑", "反杀打脸"],
+                emotion_score=9,
+                view_count=0
+            )
+
+            if corpus is None:
+                print(f"文章已存在：{article['title']}")
+                continue
+
+            db.flush()
+            print(f"已添加：{article['title']}")
+
+        db.commit()
+        print("\n所有文章添加完成！")
+    finally:
+        db.close()
 
 if __name__ == "__main__":
     add_articles()
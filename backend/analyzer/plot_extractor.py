@@ -136,3 +136,18 @@ class PlotExtractor:
 
         # 归一化到0-10
         return min(int(total_score), 10)
+
+
+_rules_extractor = None
+
+
+def analyze_by_rules(text: str) -> Dict:
+    """规则分析情节标签和情绪强度（模块级函数，供进程池调用）"""
+    global _rules_extractor
+    if _rules_extractor is None:
+        _rules_extractor = PlotExtractor()
+    analysis = _rules_extractor.extract_by_rules(text)
+    return {
+        "plot_tags": analysis.get("tags", []),
+        "emotion_score": _rules_extractor.calculate_emotion_score(text),
+    }
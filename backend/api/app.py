@@ -6,7 +6,8 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import concurrent.futures
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, load_only
 from contextlib import contextmanager
 import sys
 import os
@@ -17,7 +18,7 @@ import json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from backend.database.models import (
-    init_db, get_db, ExampleAnalysis, NovelProject, PlotModule, CrawlTask, Submission,
+    init_db, get_db, engine, SessionLocal, AsyncSessionLocal, open_async_pool, close_async_pool, json_contains_all, compute_content_hash, ExampleAnalysis, NovelProject, PlotModule, CrawlTask, Submission,
     Character, PlotOutline, ChapterDraft,
     Agent, AgentExecution, AgentVersion, AgentShare, ReferenceMaterial, WritingStyle,
     ChannelAgent, Manuscript, ManuscriptStep, LongNovelMapping, ImitationProject, ImitationStep
@@ -34,6 +35,18 @@ from backend.crawler.k17_crawler import K17Crawler
 from backend.analyzer.plot_extractor import PlotExtractor
 from backend.analyzer.emotion_analyzer import EmotionAnalyzer
 from backend.generator.expansion_engine import ExpansionEngine
+from backend.database.stage_memo import StageMemo, compute_fingerprint
+from backend.database.loaders import load_long_project
+from backend.database.manuscript_versions import load_manuscript, save_version, diff_manuscripts, version_history
+from backend.database import db_metrics, search_index
+from backend.database.bulk import bulk_insert, insert_outlines_with_drafts
+from backend.crawler.page_fetcher import FETCH_MAX_URLS, fetch_articles, shutdown as shutdown_fetcher
+from backend.database.pagination import (
+    parse_fields, clamp_limit, page_limit, keyset_paginate, keyset_paginate_async, load_columns, to_dict
+)
+from backend.generator.rewrite_planner import (
+    RewritePlanner, RewritePlanError, PATCH_RULES, split_paragraphs, number_paragraphs, patch_text, extract_json
+)
 from config.settings import settings
 
 # 初始化数据库
@@ -78,6 +91,19 @@ async def log_requests(request, call_next):
 
     return response
 
+
+@app.on_event("startup")
+async def start_async_pool():
+    """在服务的事件循环中启用异步连接池"""
+    await open_async_pool()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    """关闭异步连接池（aiosqlite 每个连接占用一个后台线程）和例文抽取进程池"""
+    await close_async_pool()
+    shutdown_fetcher()
+
 # 挂载静态文件
 from starlette.responses import Response
 from starlette.staticfiles import StaticFiles
@@ -110,9 +136,8 @@ def get_ai_client(provider: Optional[str] = None, model: Optional[str] = None):
 
 @contextmanager
 def get_db_session():
-    """数据库会话上下文管理器，确保连接总是被关闭"""
-    db_gen = get_db()
-    db = next(db_gen)
+    """数据库会话上下文管理器（用于后台任务/线程），确保连接总是被关闭"""
+    db = SessionLocal()
     try:
         yield db
     finally:
@@ -140,6 +165,7 @@ class CrawlRequest(BaseModel):
 class AnalyzeRequest(BaseModel):
     content: str
     use_ai: bool = True
+    force_reanalyze: bool = False  # 忽略已缓存的分析结果
 
 
 class PolishRequest(BaseModel):
@@ -188,14 +214,19 @@ async def health():
     return {"status": "ok", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/api/metrics/db")
+async def db_metrics_snapshot(top: int = 5):
+    """数据库会话与连接池指标：打开的会话数、泄漏数及创建位置、连接占用时长分布"""
+    return {"success": True, **db_metrics.snapshot(top)}
+
+
 # ========== 小说生成相关 ==========
 
 @app.post("/api/novel/generate")
-async def generate_novel(request: GenerateNovelRequest, background_tasks: BackgroundTasks):
+async def generate_novel(request: GenerateNovelRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """生成小说"""
     try:
         # 创建项目
-        db = next(get_db())
         project = NovelProject(
             name=request.theme,
             status="generating",
@@ -214,7 +245,7 @@ async def generate_novel(request: GenerateNovelRequest, background_tasks: Backgr
         
         def generate_task():
             # 在后台任务中创建新的数据库会话
-            task_db = next(get_db())
+            task_db = SessionLocal()
             try:
                 print(f"[生成任务] 项目 {project_id} 开始生成...")
                 
@@ -248,11 +279,11 @@ async def generate_novel(request: GenerateNovelRequest, background_tasks: Backgr
                         manuscript = Manuscript(
                             project_id=project_id,
                             title=task_project.name,
-                            content=task_project.chapters,
                             created_at=datetime.now(),
                             updated_at=datetime.now()
                         )
                         task_db.add(manuscript)
+                        save_version(task_db, manuscript, task_project.chapters)
                         print(f"[生成任务] 项目 {project_id} 稿件记录已准备")
                     except Exception as ms_err:
                         print(f"保存稿件记录准备失败: {ms_err}")
@@ -290,37 +321,42 @@ async def generate_novel(request: GenerateNovelRequest, background_tasks: Backgr
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# 列表接口可选字段（fields= 参数）；大字段只在显式请求时读取
+PROJECT_LIST_COLUMNS = {
+    "id": NovelProject.id, "name": NovelProject.name, "status": NovelProject.status,
+    "type": NovelProject.type, "source_manuscript_id": NovelProject.source_manuscript_id,
+    "word_count": NovelProject.word_count, "genre": NovelProject.genre, "theme": NovelProject.theme,
+    "target_words": NovelProject.target_words, "core_conflict": NovelProject.core_conflict,
+    "created_at": NovelProject.created_at, "updated_at": NovelProject.updated_at,
+}
+PROJECT_LIST_DEFAULT = ["id", "name", "status", "type", "source_manuscript_id", "word_count", "created_at", "updated_at"]
+
+
 @app.get("/api/novel/projects")
-async def list_projects():
-    """获取所有项目"""
-    db_gen = get_db()
-    db = next(db_gen)
+async def list_projects(fields: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """获取项目列表（传 limit 或 cursor 时游标分页，否则返回全部；fields 指定返回字段）"""
     try:
-        projects = db.query(NovelProject).order_by(NovelProject.created_at.desc()).all()
+        selected = parse_fields(fields, list(PROJECT_LIST_COLUMNS), PROJECT_LIST_DEFAULT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async with AsyncSessionLocal() as db:
+        try:
+            order = [(NovelProject.created_at, "desc"), (NovelProject.id, "desc")]
+            stmt = select(NovelProject).options(load_only(*load_columns(PROJECT_LIST_COLUMNS, selected, order)))
+            projects, next_cursor = await keyset_paginate_async(db, stmt, order, cursor, page_limit(limit, cursor, 100))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         return {
-            "projects": [
-                {
-                    "id": p.id,
-                    "name": p.name,
-                    "status": p.status,
-                    "type": p.type,
-                    "source_manuscript_id": p.source_manuscript_id,
-                    "word_count": p.word_count,
-                    "created_at": p.created_at.isoformat(),
-                    "updated_at": p.updated_at.isoformat()
-                }
-                for p in projects
-            ]
+            "projects": [to_dict(p, selected) for p in projects],
+            "next_cursor": next_cursor
         }
-    finally:
-        db.close()
 
 
 @app.post("/api/novel/projects")
-async def create_project(request: CreateProjectRequest):
+async def create_project(request: CreateProjectRequest, db: Session = Depends(get_db)):
     """创建新项目 - 用于协作写作系统"""
     try:
-        db = next(get_db())
         project = NovelProject(
             name=request.name,
             theme=request.theme,
@@ -484,7 +520,7 @@ async def generate_full_project():
 
 
 @app.post("/api/projects/create-from-preview")
-async def create_project_from_preview(request: dict):
+async def create_project_from_preview(request: dict, db: Session = Depends(get_db)):
     """从预览数据创建项目"""
     try:
         project_data = request.get("project")
@@ -492,8 +528,6 @@ async def create_project_from_preview(request: dict):
             raise HTTPException(status_code=400, detail="缺少项目数据")
 
         # 创建项目
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             project = NovelProject(
                 name=project_data["name"],
@@ -510,47 +544,47 @@ async def create_project_from_preview(request: dict):
                 word_count=0
             )
             db.add(project)
-            db.commit()
-            db.refresh(project)
+            db.flush()
 
             # 创建人物
-            for char_data in project_data.get("characters", []):
-                character = Character(
-                    project_id=project.id,
-                    name=char_data["name"],
-                    role_type=char_data.get("role_type", "supporting"),
-                    age=char_data.get("age"),
-                    gender=char_data.get("gender"),
-                    personality=char_data.get("personality"),
-                    background=char_data.get("background"),
-                    motivation=char_data.get("motivation"),
-                    secret=char_data.get("secret"),
-                    speech_pattern=char_data.get("speech_pattern"),
-                    behavior_habits=char_data.get("behavior_habits"),
-                    source="ai_generated"
-                )
-                db.add(character)
-                db.commit()
+            bulk_insert(db, Character, [
+                {
+                    "project_id": project.id,
+                    "name": char_data["name"],
+                    "role_type": char_data.get("role_type", "supporting"),
+                    "age": char_data.get("age"),
+                    "gender": char_data.get("gender"),
+                    "personality": char_data.get("personality"),
+                    "background": char_data.get("background"),
+                    "motivation": char_data.get("motivation"),
+                    "secret": char_data.get("secret"),
+                    "speech_pattern": char_data.get("speech_pattern"),
+                    "behavior_habits": char_data.get("behavior_habits"),
+                    "source": "ai_generated"
+                }
+                for char_data in project_data.get("characters", [])
+            ])
 
             # 创建大纲
-            for outline_data in project_data.get("outlines", []):
-                outline = PlotOutline(
-                    project_id=project.id,
-                    level="chapter",
-                    chapter_number=outline_data["chapter_number"],
-                    title=outline_data["title"],
-                    summary=outline_data["summary"],
-                    plot_points=outline_data.get("plot_points", []),
-                    target_words=outline_data.get("target_words", 2000),
-                    focus_elements=outline_data.get("focus_elements", []),
-                    emotion_arc=outline_data.get("emotion_arc"),
-                    characters_involved=outline_data.get("characters_involved", []),
-                    source="ai_generated",
-                    status="draft",
-                    order=outline_data["chapter_number"]
-                )
-                db.add(outline)
-                db.commit()
+            bulk_insert(db, PlotOutline, [
+                {
+                    "project_id": project.id,
+                    "level": "chapter",
+                    "chapter_number": outline_data["chapter_number"],
+                    "title": outline_data["title"],
+                    "summary": outline_data["summary"],
+                    "plot_points": outline_data.get("plot_points", []),
+                    "target_words": outline_data.get("target_words", 2000),
+                    "focus_elements": outline_data.get("focus_elements", []),
+                    "emotion_arc": outline_data.get("emotion_arc"),
+                    "characters_involved": outline_data.get("characters_involved", []),
+                    "source": "ai_generated",
+                    "status": "draft",
+                    "order": outline_data["chapter_number"]
+                }
+                for outline_data in project_data.get("outlines", [])
+            ])
+            db.commit()
 
             return {
                 "success": True,
@@ -569,10 +603,9 @@ async def create_project_from_preview(request: dict):
 
 
 @app.get("/api/novel/project/{project_id}")
-async def get_project(project_id: int):
+async def get_project(project_id: int, db: Session = Depends(get_db)):
     """获取项目详情"""
-    db = next(get_db())
-    project = db.query(NovelProject).filter(NovelProject.id == project_id).first()
+    project = db.get(NovelProject, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="项目不存在")
 
@@ -590,9 +623,8 @@ async def get_project(project_id: int):
 
 
 @app.put("/api/novel/chapter")
-async def update_chapter(request: UpdateChapterRequest):
+async def update_chapter(request: UpdateChapterRequest, db: Session = Depends(get_db)):
     """更新章节"""
-    db = next(get_db())
     project = db.query(NovelProject).filter(NovelProject.id == request.project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="项目不存在")
@@ -632,7 +664,7 @@ async def polish_text(request: PolishRequest):
 
 
 @app.get("/api/novel/export/{project_id}")
-async def export_novel_to_word(project_id: int):
+async def export_novel_to_word(project_id: int, db: Session = Depends(get_db)):
     """导出小说为Word文档"""
     try:
         from docx import Document
@@ -640,7 +672,6 @@ async def export_novel_to_word(project_id: int):
         from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
         from fastapi.responses import Response
 
-        db = next(get_db())
         project = db.query(NovelProject).filter(NovelProject.id == project_id).first()
 
         if not project:
@@ -712,282 +743,32 @@ async def export_novel_to_word(project_id: int):
 # ========== 例文拆解相关 ==========
 
 class FetchContentRequest(BaseModel):
-    url: str
+    url: Optional[str] = None
+    urls: Optional[List[str]] = None  # 一次抓取多个页面
 
 
 @app.post("/api/fetch-content")
 async def fetch_content_from_url(request: FetchContentRequest):
-    """从URL获取内容"""
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-        import re
-
-        # 发送请求获取页面
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-
-        response = requests.get(request.url, headers=headers, timeout=15)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # 提取标题
-        title = ""
-        # 优先从meta标签获取标题
-        og_title = soup.find('meta', property='og:title')
-        if og_title:
-            title = og_title.get('content', '')
-        else:
-            title_tag = soup.find('h1')
-            if not title_tag:
-                title_tag = soup.find('title')
-            if title_tag:
-                title = title_tag.get_text(strip=True)
-                # 清理标题中的后缀
-                title = title.split('_')[0].split('|')[0].split('-')[0].strip()
-
-        # 提取正文内容
-        content = ""
-
-        # 针对网易文章的特定处理
-        if '163.com' in request.url or 'dy/article' in request.url:
-            # 网易文章的特定选择器
-            # 首先尝试查找article标签
-            article = soup.find('article')
-
-            # 如果找不到article，尝试查找包含"post"的div
-            if not article:
-                article = soup.find('div', class_=lambda x: x and any('post' in str(c).lower() for c in x))
-
-            # 如果还是找不到，尝试查找主体内容div
-            if not article:
-                for selector in ['.post_text', '.post-text-b', '.text', '.content', '.article-content']:
-                    article = soup.select_one(selector)
-                    if article:
-                        break
-
-            if article:
-                # 移除article内的无用元素
-                for tag in article(['script', 'style', 'iframe', 'noscript', 'nav', 'header', 'footer', 'aside']):
-                    tag.decompose()
-
-                # 移除广告和导航div
-                for element in article.find_all('div'):
-                    class_attr = ' '.join(element.get('class', []))
-                    id_attr = element.get('id', '')
-                    if any(nav_word in class_attr.lower() or nav_word in id_attr.lower()
-                           for nav_word in ['nav', 'menu', 'ad', 'banner', 'toolbar', 'footer', 'ggw', 'ad-', 'guanggao']):
-                        element.decompose()
-
-                # 提取所有段落
-                paragraphs = []
-                for p in article.find_all('p'):
-                    text = p.get_text(strip=True)
-                    if text and len(text) > 5:
-                        # 过滤掉明显的导航和广告文本
-                        skip_keywords = [
-                            '网易首页', '快速导航', '返回网易首页', '下载网易新闻客户端',
-                            '特别声明：以上内容', 'Notice: The content above',
-                            '阅读下一篇', '相关推荐', '热点推荐',
-                            '分享至好友和朋友圈',
-                            '用微信扫码', '举报',
-                            '来源:', '跟贴', '转载请注明', '本文由', '关注公众号',
-                            '长按识别二维码', '点击查看更多',
-                            '查看网易地图', '登录', '注册免费邮箱', '申请入驻',
-                            '###', '####', '#####',  # Markdown标题标记
-                            '一梦春风拂柳近', '清禅幽送芳菲来'  # 作者信息
-                        ]
-
-                        should_skip = False
-                        for keyword in skip_keywords:
-                            if keyword in text:
-                                should_skip = True
-                                break
-
-                        # 跳过单独的导航类别
-                        if text.strip() in ['新闻', '体育', '娱乐', '财经', '汽车', '科技', '时尚', '房产', '教育', '手机', '数码']:
-                            should_skip = True
-
-                        # 跳过时间戳行
-                        if re.match(r'^\d{4}-\d{2}-\d{2}.*来源:', text):
-                            should_skip = True
-
-                        # 检查是否包含过多#符号（可能是导航标题）
-                        if text.count('#') >= 3:
-                            should_skip = True
-
-                        # 检查是否包含过多短横线分隔的导航项
-                        if text.count(' - ') > 2 and len(text) < 100:
-                            should_skip = True
-
-                        if not should_skip:
-                            paragraphs.append(text)
-
-                # 如果提取到了足够的段落，使用这些段落
-                if paragraphs and len('\n\n'.join(paragraphs)) > 200:
-                    content = '\n\n'.join(paragraphs)
-
-        # 如果网易特定方法失败，使用通用方法
-        if not content or len(content) < 100:
-            # 通用回退方法：获取所有p标签
-            # 先移除明显的无用标签
-            for tag in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript']):
-                tag.decompose()
-
-            # 获取所有p标签
-            all_p = soup.find_all('p')
-            paragraphs = []
-
-            for p in all_p:
-                text = p.get_text(strip=True)
-                if text and len(text) > 10:
-                    # 过滤导航和广告
-                    skip_keywords = [
-                        '网易首页', '快速导航', '返回', '下载', '特别声明',
-                        '相关推荐', '热点推荐', '分享至', '举报',
-                        '###', '####', '来源:', '跟贴'
-                    ]
-                    if not any(kw in text for kw in skip_keywords):
-                        # 跳过单独的导航类别
-                        if text.strip() not in ['新闻', '体育', '娱乐', '财经', '汽车', '科技', '时尚', '房产', '教育', '手机', '数码']:
-                            paragraphs.append(text)
-
-            if paragraphs:
-                # 取所有段落，让清理函数来过滤
-                content = '\n\n'.join(paragraphs)
-
-        # 最后的回退：如果还是没有内容，尝试直接获取body文本
-        if not content or len(content) < 50:
-            body = soup.find('body')
-            if body:
-                # 移除所有无用元素
-                for tag in body(['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript']):
-                    tag.decompose()
-
-                content = body.get_text(separator='\n', strip=True)
-
-        # 清理内容
-        content = _clean_content(content)
-
-        word_count = len(content)
-
-        if word_count < 50:
-            return {
-                "success": False,
-                "error": f"提取内容过少（{word_count}字），该网站可能不支持自动提取"
-            }
-
-        return {
-            "success": True,
-            "title": title,
-            "content": content,
-            "author": "",
-            "word_count": word_count
-        }
-
-    except requests.RequestException as e:
-        return {
-            "success": False,
-            "error": f"无法获取页面: {str(e)}"
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": f"提取失败: {str(e)}"
-        }
-
-
-def _extract_text_from_element(element):
-    """从元素中提取文本"""
-    texts = []
-    for child in element.descendants:
-        if child.name == 'p':
-            text = child.get_text(strip=True)
-            if text:
-                texts.append(text)
-        elif child.name == 'br':
-            texts.append("")
-
-    return '\n\n'.join(texts) if texts else element.get_text(separator='\n', strip=True)
-
-
-def _clean_content(text):
-    """清理内容"""
-    if not text:
-        return ""
-
-    # 移除常见的无用文本（使用更精确的模式）
-    noise_patterns = [
-        r'特别声明：以上内容[\s\S]*?为自媒体平台.*?仅提供信息存储服务',
-        r'Notice: The content above[\s\S]*?only provides information storage services',
-        r'阅读下一篇',
-        r'### \s*\n',  # 单独的 ### 标题行
-        r'声明.*?版权归.*',
-        r'本文由.*原创',
-        r'转载请注明.*',
-        r'长按识别二维码.*',
-        r'关注公众号.*',
-        r'分享至好友和朋友圈',
-        r'用微信扫码.*',
-        r'举报\d*$',
-        r'查看网易地图',
-        r'登录\s*\n注册免费邮箱',
-    ]
-
-    for pattern in noise_patterns:
-        text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.DOTALL)
-
-    # 移除空行
-    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-
-    # 分行并智能清理
-    lines = text.split('\n')
-    clean_lines = []
-
-    # 定义导航关键词
-    nav_keywords = [
-        '网易首页', '应用', '快速导航', '返回网易首页', '下载网易新闻客户端',
-        '相关推荐', '热点推荐', '特别声明', '来源:', '跟贴'
-    ]
-
-    # 定义单独的导航类别（如"新闻"、"体育"等后跟大量选项）
-    nav_categories = ['新闻', '体育', '娱乐', '财经', '汽车', '科技', '时尚', '房产', '教育', '手机', '数码']
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        # 跳过包含明显导航关键词的行
-        if any(keyword in line for keyword in nav_keywords):
-            continue
-
-        # 跳过单独的导航类别行
-        if line in nav_categories:
-            continue
-
-        # 跳过纯数字或很短的行（但保留中文数字或混合内容）
-        if len(line) <= 3 and line.isdigit():
-            continue
-
-        # 跳过时间戳行（如：2025-08-31 06:30:44 来源: xxx）
-        if re.match(r'^\d{4}-\d{2}-\d{2}.*来源:', line):
-            continue
-
-        # 跳过包含多个短横线分隔的导航项（如：新闻 - 体育 - 娱乐）
-        if line.count('-') > 3 and len(line) < 100:
-            continue
-
-        # 保留合理的行（超过5个字符的文本）
-        if len(line) > 5:
-            clean_lines.append(line)
-
-    # 保留更多内容，不仅仅是前50行
-    return '\n\n'.join(clean_lines).strip()
+    """
+    从URL获取内容
 
+    传 url 时返回单个结果；传 urls 时并发抓取，results 与 urls 顺序一致，每项带 url 和 success
+    """
+    urls = [u.strip() for u in (request.urls if request.urls is not None else [request.url]) if u and u.strip()]
+    if not urls:
+        raise HTTPException(400, detail="请提供要抓取的 URL")
+    if len(urls) > FETCH_MAX_URLS:
+        raise HTTPException(400, detail=f"一次最多抓取 {FETCH_MAX_URLS} 个 URL")
+
+    results = await fetch_articles(urls)
+    if request.urls is None:
+        result = results[0]
+        result.pop("url")
+        return result
+    return {
+        "success": True,
+        "results": results
+    }
 
 
 class ExampleAnalysisRequest(BaseModel):
@@ -1003,32 +784,58 @@ class ExampleAnalysisRequest(BaseModel):
     tags: Optional[List[str]] = None
 
 
+EXAMPLE_LIST_COLUMNS = {
+    "id": ExampleAnalysis.id, "title": ExampleAnalysis.title, "source_url": ExampleAnalysis.source_url,
+    "tags": ExampleAnalysis.tags, "analysis_title": ExampleAnalysis.analysis_title,
+    "core_conflict": ExampleAnalysis.core_conflict, "notes": ExampleAnalysis.notes,
+    "created_at": ExampleAnalysis.created_at, "updated_at": ExampleAnalysis.updated_at,
+}
+EXAMPLE_LIST_DEFAULT = ["id", "title", "source_url", "content_preview", "tags", "created_at", "updated_at"]
+
+
 @app.get("/api/examples")
-async def list_examples():
-    """获取所有例文拆解笔记"""
-    db = next(get_db())
-    examples = db.query(ExampleAnalysis).order_by(ExampleAnalysis.updated_at.desc()).all()
+async def list_examples(fields: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                        db: Session = Depends(get_db)):
+    """获取例文拆解笔记列表（传 limit 或 cursor 时游标分页，否则返回全部；fields 指定返回字段）"""
+    try:
+        selected = parse_fields(fields, list(EXAMPLE_LIST_COLUMNS) + ["content_preview"], EXAMPLE_LIST_DEFAULT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {
-        "examples": [
-            {
-                "id": e.id,
-                "title": e.title,
-                "source_url": e.source_url,
-                "content_preview": e.content[:200] + "..." if e.content and len(e.content) > 200 else e.content,
-                "tags": e.tags or [],
-                "created_at": e.created_at.isoformat(),
-                "updated_at": e.updated_at.isoformat()
-            }
-            for e in examples
-        ]
-    }
+    try:
+        order = [(ExampleAnalysis.updated_at, "desc"), (ExampleAnalysis.id, "desc")]
+        query = db.query(ExampleAnalysis).options(load_only(*load_columns(EXAMPLE_LIST_COLUMNS, selected, order)))
+        with_preview = "content_preview" in selected
+        if with_preview:
+            # 预览在数据库里截取，不读取整篇原文
+            query = query.add_columns(
+                func.substr(ExampleAnalysis.content, 1, 200),
+                func.length(ExampleAnalysis.content)
+            )
+        rows, next_cursor = keyset_paginate(query, order, cursor, page_limit(limit, cursor, 100))
+
+        examples = []
+        for row in rows:
+            extra = {}
+            if with_preview:
+                e, preview, length = row
+                extra["content_preview"] = preview + "..." if preview and (length or 0) > 200 else preview
+            else:
+                e = row
+            if "tags" in selected:
+                extra["tags"] = e.tags or []
+            examples.append(to_dict(e, selected, extra))
+
+        return {"examples": examples, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        db.close()
 
 
 @app.get("/api/examples/{example_id}")
-async def get_example(example_id: int):
+async def get_example(example_id: int, db: Session = Depends(get_db)):
     """获取单个例文拆解详情"""
-    db = next(get_db())
     example = db.query(ExampleAnalysis).filter(ExampleAnalysis.id == example_id).first()
 
     if not example:
@@ -1052,15 +859,15 @@ async def get_example(example_id: int):
 
 
 @app.post("/api/examples")
-async def create_example(request: ExampleAnalysisRequest):
+async def create_example(request: ExampleAnalysisRequest, db: Session = Depends(get_db)):
     """创建新的例文拆解笔记"""
     try:
-        db = next(get_db())
 
         example = ExampleAnalysis(
             title=request.title,
             source_url=request.source_url,
             content=request.content,
+            content_hash=compute_content_hash(request.content),
             analysis_title=request.analysis_title,
             core_conflict=request.core_conflict,
             information_gap=request.information_gap,
@@ -1080,10 +887,9 @@ async def create_example(request: ExampleAnalysisRequest):
 
 
 @app.put("/api/examples/{example_id}")
-async def update_example(example_id: int, request: ExampleAnalysisRequest):
+async def update_example(example_id: int, request: ExampleAnalysisRequest, db: Session = Depends(get_db)):
     """更新例文拆解笔记"""
     try:
-        db = next(get_db())
         example = db.query(ExampleAnalysis).filter(ExampleAnalysis.id == example_id).first()
 
         if not example:
@@ -1091,6 +897,9 @@ async def update_example(example_id: int, request: ExampleAnalysisRequest):
 
         example.title = request.title
         example.source_url = request.source_url
+        if example.content != request.content:
+            example.content_hash = compute_content_hash(request.content)
+            example.plot_analysis = None
         example.content = request.content
         example.analysis_title = request.analysis_title
         example.core_conflict = request.core_conflict
@@ -1109,10 +918,9 @@ async def update_example(example_id: int, request: ExampleAnalysisRequest):
 
 
 @app.delete("/api/examples/{example_id}")
-async def delete_example(example_id: int):
+async def delete_example(example_id: int, db: Session = Depends(get_db)):
     """删除例文拆解笔记"""
     try:
-        db = next(get_db())
         example = db.query(ExampleAnalysis).filter(ExampleAnalysis.id == example_id).first()
 
         if not example:
@@ -1129,15 +937,35 @@ async def delete_example(example_id: int):
 # ========== 分析相关 ==========
 
 @app.post("/api/analyze/plot")
-async def analyze_plot(request: AnalyzeRequest):
-    """分析情节元素"""
+async def analyze_plot(request: AnalyzeRequest, db: Session = Depends(get_db)):
+    """分析情节元素 (AI分析结果按原文哈希复用)"""
     try:
-        if request.use_ai:
-            result = plot_extractor.extract_by_ai(request.content)
-        else:
+        if not request.use_ai:
             result = plot_extractor.extract_by_rules(request.content)
+            return {"success": True, "result": result}
+
+        content_hash = compute_content_hash(request.content)
+        try:
+            if not request.force_reanalyze:
+                cached = db.query(ExampleAnalysis.plot_analysis).filter(
+                    ExampleAnalysis.content_hash == content_hash,
+                    ExampleAnalysis.plot_analysis.isnot(None)
+                ).first()
+                if cached and cached[0] is not None:
+                    return {"success": True, "result": cached[0], "cached": True}
 
-        return {"success": True, "result": result}
+            result = plot_extractor.extract_by_ai(request.content)
+
+            # 规则降级的结果不缓存
+            if result.get("method") == "ai":
+                db.query(ExampleAnalysis).filter(
+                    ExampleAnalysis.content_hash == content_hash
+                ).update({ExampleAnalysis.plot_analysis: result}, synchronize_session=False)
+                db.commit()
+        finally:
+            db.close()
+
+        return {"success": True, "result": result, "cached": False}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1174,9 +1002,8 @@ class SubmissionRequest(BaseModel):
 
 
 @app.get("/api/submissions")
-async def list_submissions():
+async def list_submissions(db: Session = Depends(get_db)):
     """获取所有投稿记录"""
-    db = next(get_db())
     submissions = db.query(Submission).order_by(Submission.created_at.desc()).all()
 
     results = []
@@ -1206,10 +1033,9 @@ async def list_submissions():
 
 
 @app.post("/api/submissions")
-async def create_submission(request: SubmissionRequest):
+async def create_submission(request: SubmissionRequest, db: Session = Depends(get_db)):
     """创建投稿记录"""
     try:
-        db = next(get_db())
 
         # 获取项目字数
         project = db.query(NovelProject).filter(NovelProject.id == request.project_id).first()
@@ -1240,9 +1066,8 @@ async def create_submission(request: SubmissionRequest):
 
 
 @app.get("/api/submissions/{submission_id}")
-async def get_submission(submission_id: int):
+async def get_submission(submission_id: int, db: Session = Depends(get_db)):
     """获取投稿详情"""
-    db = next(get_db())
     submission = db.query(Submission).filter(Submission.id == submission_id).first()
 
     if not submission:
@@ -1271,10 +1096,9 @@ async def get_submission(submission_id: int):
 
 
 @app.put("/api/submissions/{submission_id}")
-async def update_submission(submission_id: int, request: SubmissionRequest):
+async def update_submission(submission_id: int, request: SubmissionRequest, db: Session = Depends(get_db)):
     """更新投稿记录"""
     try:
-        db = next(get_db())
         submission = db.query(Submission).filter(Submission.id == submission_id).first()
 
         if not submission:
@@ -1305,10 +1129,9 @@ async def update_submission(submission_id: int, request: SubmissionRequest):
 
 
 @app.delete("/api/submissions/{submission_id}")
-async def delete_submission(submission_id: int):
+async def delete_submission(submission_id: int, db: Session = Depends(get_db)):
     """删除投稿记录"""
     try:
-        db = next(get_db())
         submission = db.query(Submission).filter(Submission.id == submission_id).first()
 
         if not submission:
@@ -1343,9 +1166,8 @@ class CharacterRequest(BaseModel):
 
 
 @app.get("/api/projects/{project_id}/characters")
-async def list_characters(project_id: int):
+async def list_characters(project_id: int, db: Session = Depends(get_db)):
     """获取项目的所有人物"""
-    db = next(get_db())
     characters = db.query(Character).filter(
         Character.project_id == project_id
     ).order_by(Character.id).all()
@@ -1374,10 +1196,9 @@ async def list_characters(project_id: int):
 
 
 @app.post("/api/characters")
-async def create_character(request: CharacterRequest):
+async def create_character(request: CharacterRequest, db: Session = Depends(get_db)):
     """创建人物"""
     try:
-        db = next(get_db())
 
         character = Character(
             project_id=request.project_id,
@@ -1416,10 +1237,9 @@ class GenerateCharacterRequest(BaseModel):
 
 
 @app.post("/api/characters/generate")
-async def generate_character(request: GenerateCharacterRequest):
+async def generate_character(request: GenerateCharacterRequest, db: Session = Depends(get_db)):
     """AI辅助生成人物"""
     try:
-        db = next(get_db())
 
         # 调用AI生成人物设定
         prompt = f"""请根据以下信息，生成一个详细的{request.role_type}角色设定：
@@ -1506,10 +1326,9 @@ async def generate_character(request: GenerateCharacterRequest):
 
 
 @app.put("/api/characters/{character_id}")
-async def update_character(character_id: int, request: CharacterRequest):
+async def update_character(character_id: int, request: CharacterRequest, db: Session = Depends(get_db)):
     """更新人物"""
     try:
-        db = next(get_db())
         character = db.query(Character).filter(Character.id == character_id).first()
 
         if not character:
@@ -1539,10 +1358,9 @@ async def update_character(character_id: int, request: CharacterRequest):
 
 
 @app.delete("/api/characters/{character_id}")
-async def delete_character(character_id: int):
+async def delete_character(character_id: int, db: Session = Depends(get_db)):
     """删除人物"""
     try:
-        db = next(get_db())
         character = db.query(Character).filter(Character.id == character_id).first()
 
         if not character:
@@ -1574,9 +1392,8 @@ class PlotOutlineRequest(BaseModel):
 
 
 @app.get("/api/projects/{project_id}/outlines")
-async def list_plot_outlines(project_id: int, level: Optional[str] = None):
+async def list_plot_outlines(project_id: int, level: Optional[str] = None, db: Session = Depends(get_db)):
     """获取项目的情节大纲"""
-    db = next(get_db())
     query = db.query(PlotOutline).filter(PlotOutline.project_id == project_id)
 
     if level:
@@ -1609,10 +1426,9 @@ async def list_plot_outlines(project_id: int, level: Optional[str] = None):
 
 
 @app.post("/api/outlines")
-async def create_plot_outline(request: PlotOutlineRequest):
+async def create_plot_outline(request: PlotOutlineRequest, db: Session = Depends(get_db)):
     """创建情节大纲"""
     try:
-        db = next(get_db())
 
         # 获取当前最大的order值
         max_order = db.query(func.max(PlotOutline.order)).filter(
@@ -1647,10 +1463,9 @@ async def create_plot_outline(request: PlotOutlineRequest):
 
 
 @app.put("/api/outlines/{outline_id}")
-async def update_plot_outline(outline_id: int, request: PlotOutlineRequest):
+async def update_plot_outline(outline_id: int, request: PlotOutlineRequest, db: Session = Depends(get_db)):
     """更新情节大纲"""
     try:
-        db = next(get_db())
         outline = db.query(PlotOutline).filter(PlotOutline.id == outline_id).first()
 
         if not outline:
@@ -1674,10 +1489,9 @@ async def update_plot_outline(outline_id: int, request: PlotOutlineRequest):
 
 
 @app.delete("/api/outlines/{outline_id}")
-async def delete_plot_outline(outline_id: int):
+async def delete_plot_outline(outline_id: int, db: Session = Depends(get_db)):
     """删除情节大纲"""
     try:
-        db = next(get_db())
         outline = db.query(PlotOutline).filter(PlotOutline.id == outline_id).first()
 
         if not outline:
@@ -1700,10 +1514,9 @@ class GenerateChapterRequest(BaseModel):
 
 
 @app.post("/api/chapters/generate")
-async def generate_chapter_content(request: GenerateChapterRequest):
+async def generate_chapter_content(request: GenerateChapterRequest, db: Session = Depends(get_db)):
     """根据大纲生成章节内容"""
     try:
-        db = next(get_db())
 
         # 获取大纲信息
         outline = db.query(PlotOutline).filter(PlotOutline.id == request.outline_id).first()
@@ -1792,33 +1605,40 @@ async def generate_chapter_content(request: GenerateChapterRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+CHAPTER_LIST_COLUMNS = {
+    "id": ChapterDraft.id, "outline_id": ChapterDraft.outline_id, "chapter_number": ChapterDraft.chapter_number,
+    "title": ChapterDraft.title, "content": ChapterDraft.content, "word_count": ChapterDraft.word_count,
+    "status": ChapterDraft.status, "edit_count": ChapterDraft.edit_count,
+    "ai_revision_count": ChapterDraft.ai_revision_count, "human_ai_ratio": ChapterDraft.human_ai_ratio,
+    "notes": ChapterDraft.notes, "issues": ChapterDraft.issues,
+    "created_at": ChapterDraft.created_at, "updated_at": ChapterDraft.updated_at,
+}
+CHAPTER_LIST_DEFAULT = ["id", "outline_id", "chapter_number", "title", "content", "word_count", "status",
+                        "edit_count", "ai_revision_count", "human_ai_ratio", "notes", "created_at", "updated_at"]
+
+
 @app.get("/api/projects/{project_id}/chapters")
-async def list_chapters(project_id: int):
-    """获取项目的所有章节"""
-    db = next(get_db())
-    chapters = db.query(ChapterDraft).filter(
-        ChapterDraft.project_id == project_id
-    ).order_by(ChapterDraft.chapter_number).all()
+async def list_chapters(project_id: int, fields: Optional[str] = None, cursor: Optional[str] = None,
+                        limit: Optional[int] = None):
+    """获取项目章节（传 limit 或 cursor 时游标分页，否则返回全部；传 fields 不含 content 时不读取正文）"""
+    try:
+        selected = parse_fields(fields, list(CHAPTER_LIST_COLUMNS), CHAPTER_LIST_DEFAULT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async with AsyncSessionLocal() as db:
+        try:
+            order = [(ChapterDraft.chapter_number, "asc"), (ChapterDraft.id, "asc")]
+            stmt = select(ChapterDraft).options(
+                load_only(*load_columns(CHAPTER_LIST_COLUMNS, selected, order))
+            ).filter(ChapterDraft.project_id == project_id)
+            chapters, next_cursor = await keyset_paginate_async(db, stmt, order, cursor, page_limit(limit, cursor, 200))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     return {
-        "chapters": [
-            {
-                "id": c.id,
-                "outline_id": c.outline_id,
-                "chapter_number": c.chapter_number,
-                "title": c.title,
-                "content": c.content,
-                "word_count": c.word_count,
-                "status": c.status,
-                "edit_count": c.edit_count,
-                "ai_revision_count": c.ai_revision_count,
-                "human_ai_ratio": c.human_ai_ratio,
-                "notes": c.notes,
-                "created_at": c.created_at.isoformat(),
-                "updated_at": c.updated_at.isoformat()
-            }
-            for c in chapters
-        ]
+        "chapters": [to_dict(c, selected) for c in chapters],
+        "next_cursor": next_cursor
     }
 
 
@@ -1828,10 +1648,9 @@ class UpdateChapterContentRequest(BaseModel):
 
 
 @app.put("/api/chapters/{chapter_id}")
-async def update_chapter(chapter_id: int, request: UpdateChapterContentRequest):
+async def update_chapter(chapter_id: int, request: UpdateChapterContentRequest, db: Session = Depends(get_db)):
     """更新章节内容（人工编辑）"""
     try:
-        db = next(get_db())
         chapter = db.query(ChapterDraft).filter(ChapterDraft.id == chapter_id).first()
 
         if not chapter:
@@ -1869,13 +1688,14 @@ class ReviseChapterRequest(BaseModel):
     focus: str = "情绪钩子"
     style: Optional[str] = None
     instructions: Optional[str] = None
+    mode: str = "patch"  # patch: 段落补丁; full: 整章重写
+    fallback_to_full: bool = False  # 补丁无效时退回整章重写；为 False 时返回 success=False 和 patch_failed
 
 
 @app.post("/api/chapters/{chapter_id}/revise")
-async def revise_chapter_with_ai(chapter_id: int, request: ReviseChapterRequest):
-    """使用AI润色章节"""
+async def revise_chapter_with_ai(chapter_id: int, request: ReviseChapterRequest, db: Session = Depends(get_db)):
+    """使用AI润色章节 (默认段落补丁模式，只输出被修改的段落)"""
     try:
-        db = next(get_db())
         chapter = db.query(ChapterDraft).filter(ChapterDraft.id == chapter_id).first()
 
         if not chapter:
@@ -1884,8 +1704,50 @@ async def revise_chapter_with_ai(chapter_id: int, request: ReviseChapterRequest)
         # 获取项目信息
         project = db.query(NovelProject).filter(NovelProject.id == chapter.project_id).first()
 
-        # AI润色
-        prompt = f"""请润色以下章节内容：
+        requirements = f"""1. 重点优化：{request.focus}
+2. 保持原有剧情不变
+{f"3. 风格要求：{request.style}" if request.style else ""}
+{f"4. 额外说明：{request.instructions}" if request.instructions else ""}"""
+
+        revised_content = None
+        edits = []
+        mode = request.mode
+        if mode not in ("patch", "full"):
+            raise HTTPException(status_code=400, detail="mode 只支持 patch 或 full")
+
+        if mode == "patch":
+            # 段落补丁：正文按段编号，模型只返回需要改动的段落
+            paragraphs = split_paragraphs(chapter.content or "")
+            prompt = f"""请润色以下章节内容，只修改确实需要改动的段落：
+
+章节标题：{chapter.title}
+主题：{project.theme if project else '未设定'}
+
+原文（已按段落编号）：
+{number_paragraphs(paragraphs)}
+
+润色要求：
+{requirements}
+
+""" + PATCH_RULES.format()
+            messages = [{"role": "user", "content": prompt}]
+            response = ai_client._call_api(messages, temperature=0.7, max_tokens=1500)
+            result = extract_json(response)
+            edits = result.get("edits") if isinstance(result, dict) else result
+            if isinstance(edits, list) and paragraphs:
+                patched, applied = patch_text(chapter.content or "", edits)
+                if applied:
+                    revised_content = patched
+
+            if revised_content is None:
+                if not request.fallback_to_full:
+                    return {"success": False, "patch_failed": True, "message": "AI未返回有效的段落补丁，章节未修改"}
+                print(f"⚠️ 章节 {chapter_id} 补丁无效，退回整章重写")
+                mode = "full"
+                edits = []
+
+        if mode == "full":
+            prompt = f"""请润色以下章节内容：
 
 章节标题：{chapter.title}
 主题：{project.theme if project else '未设定'}
@@ -1894,16 +1756,12 @@ async def revise_chapter_with_ai(chapter_id: int, request: ReviseChapterRequest)
 {chapter.content}
 
 润色要求：
-1. 重点优化：{request.focus}
-2. 保持原有剧情不变
-{f"3. 风格要求：{request.style}" if request.style else ""}
-{f"4. 额外说明：{request.instructions}" if request.instructions else ""}
+{requirements}
 
 请直接输出润色后的内容，不要有说明。
 """
-
-        messages = [{"role": "user", "content": prompt}]
-        revised_content = ai_client._call_api(messages, temperature=0.7)
+            messages = [{"role": "user", "content": prompt}]
+            revised_content = ai_client._call_api(messages, temperature=0.7)
 
         # 更新章节
         old_content = chapter.content
@@ -1921,10 +1779,40 @@ async def revise_chapter_with_ai(chapter_id: int, request: ReviseChapterRequest)
 
         return {
             "success": True,
+            "mode": mode,
+            "edits": edits,
             "content": revised_content,
             "word_count": len(revised_content),
             "ai_revision_count": chapter.ai_revision_count
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ========== 全文检索 ==========
+
+@app.get("/api/search")
+async def search_content(
+    q: str,
+    types: Optional[str] = None,
+    project_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0
+):
+    """全文检索章节、参考素材、范文和稿件（types=chapter,material,example,manuscript；按相关度排序并返回高亮片段）"""
+    if engine.dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="全文检索仅支持 SQLite 数据库")
+    try:
+        kinds = [t.strip() for t in types.split(",") if t.strip()] if types else None
+        async with AsyncSessionLocal() as db:
+            result = await db.run_sync(
+                lambda s: search_index.search(s, q, kinds, project_id, clamp_limit(limit, 20), max(offset, 0))
+            )
+        return {"success": True, "query": q, **result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1953,84 +1841,77 @@ async def fill_template(category: str, subcategory: str, name: str, variables: D
 
 # ========== AI智能体相关 ==========
 
+AGENT_LIST_COLUMNS = {
+    "id": Agent.id, "name": Agent.name, "description": Agent.description, "category": Agent.category,
+    "agent_type": Agent.agent_type, "variables": Agent.variables, "tags": Agent.tags,
+    "usage_count": Agent.usage_count, "like_count": Agent.like_count, "is_official": Agent.is_official,
+    "visibility": Agent.visibility, "ai_model": Agent.ai_model, "order": Agent.order,
+    "created_at": Agent.created_at,
+}
+AGENT_LIST_DEFAULT = ["id", "name", "description", "category", "agent_type", "variables", "tags",
+                      "usage_count", "like_count", "is_official", "created_at"]
+
+
 @app.get("/api/agents")
-async def list_agents(category: str = None, agent_type: str = None):
-    """获取智能体列表"""
+async def list_agents(category: str = None, agent_type: str = None, fields: Optional[str] = None,
+                      cursor: Optional[str] = None, limit: Optional[int] = None):
+    """获取智能体列表（传 limit 或 cursor 时游标分页，否则返回全部；fields 指定返回字段，不读取系统提示词）"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
-        try:
-            query = db.query(Agent)
+        selected = parse_fields(fields, list(AGENT_LIST_COLUMNS), AGENT_LIST_DEFAULT)
+        async with AsyncSessionLocal() as db:
+            order = [(Agent.order, "asc"), (Agent.created_at, "desc"), (Agent.id, "desc")]
+            stmt = select(Agent).options(load_only(*load_columns(AGENT_LIST_COLUMNS, selected, order)))
 
             # 筛选条件
             if category:
-                query = query.filter(Agent.category == category)
+                stmt = stmt.filter(Agent.category == category)
             if agent_type:
-                query = query.filter(Agent.agent_type == agent_type)
+                stmt = stmt.filter(Agent.agent_type == agent_type)
 
             # 只返回公开的或用户自己的智能体（这里简化为返回所有）
-            agents = query.order_by(Agent.order.asc(), Agent.created_at.desc()).all()
+            agents, next_cursor = await keyset_paginate_async(db, stmt, order, cursor, page_limit(limit, cursor, 100))
 
-            return {
-                "success": True,
-                "agents": [
-                    {
-                        "id": agent.id,
-                        "name": agent.name,
-                        "description": agent.description,
-                        "category": agent.category,
-                        "agent_type": agent.agent_type,
-                        "variables": agent.variables,
-                        "tags": agent.tags,
-                        "usage_count": agent.usage_count,
-                        "like_count": agent.like_count,
-                        "is_official": agent.is_official,
-                        "created_at": agent.created_at.isoformat() if agent.created_at else None
-                    }
-                    for agent in agents
-                ]
-            }
-        finally:
-            db.close()
+        return {
+            "success": True,
+            "agents": [to_dict(agent, selected) for agent in agents],
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/agents/{agent_id}")
-async def get_agent(agent_id: int):
+async def get_agent(agent_id: int, db: Session = Depends(get_db)):
     """获取智能体详情"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
-        try:
-            agent = db.query(Agent).filter(Agent.id == agent_id).first()
-            if not agent:
-                raise HTTPException(status_code=404, detail="智能体不存在")
+        agent = db.get(Agent, agent_id)
+        if not agent:
+            raise HTTPException(status_code=404, detail="智能体不存在")
 
-            return {
-                "success": True,
-                "agent": {
-                    "id": agent.id,
-                    "name": agent.name,
-                    "description": agent.description,
-                    "category": agent.category,
-                    "agent_type": agent.agent_type,
-                    "system_prompt": agent.system_prompt,
-                    "variables": agent.variables,
-                    "ai_model": agent.ai_model,
-                    "temperature": agent.temperature,
-                    "max_tokens": agent.max_tokens,
-                    "batch_count": agent.batch_count,
-                    "visibility": agent.visibility,
-                    "tags": agent.tags,
-                    "usage_count": agent.usage_count,
-                    "like_count": agent.like_count,
-                    "is_official": agent.is_official,
-                    "created_at": agent.created_at.isoformat() if agent.created_at else None
-                }
+        return {
+            "success": True,
+            "agent": {
+                "id": agent.id,
+                "name": agent.name,
+                "description": agent.description,
+                "category": agent.category,
+                "agent_type": agent.agent_type,
+                "system_prompt": agent.system_prompt,
+                "variables": agent.variables,
+                "ai_model": agent.ai_model,
+                "temperature": agent.temperature,
+                "max_tokens": agent.max_tokens,
+                "batch_count": agent.batch_count,
+                "visibility": agent.visibility,
+                "tags": agent.tags,
+                "usage_count": agent.usage_count,
+                "like_count": agent.like_count,
+                "is_official": agent.is_official,
+                "created_at": agent.created_at.isoformat() if agent.created_at else None
             }
-        finally:
-            db.close()
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -2038,11 +1919,9 @@ async def get_agent(agent_id: int):
 
 
 @app.post("/api/agents")
-async def create_agent(request: dict):
+async def create_agent(request: dict, db: Session = Depends(get_db)):
     """创建智能体"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             agent = Agent(
                 name=request.get("name"),
@@ -2077,11 +1956,9 @@ async def create_agent(request: dict):
 
 
 @app.put("/api/agents/{agent_id}")
-async def update_agent(agent_id: int, request: dict):
+async def update_agent(agent_id: int, request: dict, db: Session = Depends(get_db)):
     """更新智能体"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             agent = db.query(Agent).filter(Agent.id == agent_id).first()
             if not agent:
@@ -2123,11 +2000,9 @@ async def update_agent(agent_id: int, request: dict):
 
 
 @app.delete("/api/agents/{agent_id}")
-async def delete_agent(agent_id: int):
+async def delete_agent(agent_id: int, db: Session = Depends(get_db)):
     """删除智能体"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             agent = db.query(Agent).filter(Agent.id == agent_id).first()
             if not agent:
@@ -2162,11 +2037,9 @@ def replace_variables(prompt: str, variables: Dict) -> str:
 
 
 @app.post("/api/agents/{agent_id}/execute")
-async def execute_agent(agent_id: int, request: dict):
+async def execute_agent(agent_id: int, request: dict, db: Session = Depends(get_db)):
     """执行智能体 - 支持批量生成"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             # 获取智能体
             agent = db.query(Agent).filter(Agent.id == agent_id).first()
@@ -2248,11 +2121,9 @@ async def execute_agent(agent_id: int, request: dict):
 
 
 @app.get("/api/agents/{agent_id}/executions")
-async def get_agent_executions(agent_id: int, limit: int = 10):
+async def get_agent_executions(agent_id: int, limit: int = 10, db: Session = Depends(get_db)):
     """获取智能体的执行历史"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             executions = db.query(AgentExecution)\
                 .filter(AgentExecution.agent_id == agent_id)\
@@ -2280,11 +2151,9 @@ async def get_agent_executions(agent_id: int, limit: int = 10):
 
 
 @app.get("/api/executions/{execution_id}/versions")
-async def get_execution_versions(execution_id: int):
+async def get_execution_versions(execution_id: int, db: Session = Depends(get_db)):
     """获取执行记录的所有版本"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             versions = db.query(AgentVersion)\
                 .filter(AgentVersion.execution_id == execution_id)\
@@ -2311,11 +2180,9 @@ async def get_execution_versions(execution_id: int):
 
 
 @app.post("/api/versions/{version_id}/select")
-async def select_version(version_id: int):
+async def select_version(version_id: int, db: Session = Depends(get_db)):
     """选择某个版本（标记为已选中）"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             version = db.query(AgentVersion).filter(AgentVersion.id == version_id).first()
             if not version:
@@ -2355,102 +2222,97 @@ UPLOAD_DIR = "uploads/materials"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+MATERIAL_LIST_COLUMNS = {
+    "id": ReferenceMaterial.id, "title": ReferenceMaterial.title, "author": ReferenceMaterial.author,
+    "source": ReferenceMaterial.source, "file_type": ReferenceMaterial.file_type,
+    "content_type": ReferenceMaterial.content_type, "genre": ReferenceMaterial.genre,
+    "tags": ReferenceMaterial.tags, "core_conflict": ReferenceMaterial.core_conflict,
+    "emotion_style": ReferenceMaterial.emotion_style, "status": ReferenceMaterial.status,
+    "usage_count": ReferenceMaterial.usage_count, "like_count": ReferenceMaterial.like_count,
+    "is_favorite": ReferenceMaterial.is_favorite, "created_at": ReferenceMaterial.created_at,
+}
+MATERIAL_LIST_DEFAULT = list(MATERIAL_LIST_COLUMNS)
+
+
 @app.get("/api/materials")
 async def list_materials(
     content_type: Optional[str] = None,
     genre: Optional[str] = None,
     tags: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    """获取参考素材列表"""
+    """获取参考素材列表（游标分页，fields 指定返回字段，不读取原文和解析结果）"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
-        try:
-            query = db.query(ReferenceMaterial)
+        selected = parse_fields(fields, list(MATERIAL_LIST_COLUMNS), MATERIAL_LIST_DEFAULT)
+        async with AsyncSessionLocal() as db:
+            order = [(ReferenceMaterial.created_at, "desc"), (ReferenceMaterial.id, "desc")]
+            stmt = select(ReferenceMaterial).options(
+                load_only(*load_columns(MATERIAL_LIST_COLUMNS, selected, order))
+            )
 
             # 筛选条件
             if content_type:
-                query = query.filter(ReferenceMaterial.content_type == content_type)
+                stmt = stmt.filter(ReferenceMaterial.content_type == content_type)
             if genre:
-                query = query.filter(ReferenceMaterial.genre == genre)
+                stmt = stmt.filter(ReferenceMaterial.genre == genre)
             if tags:
-                # JSON字段搜索（简化处理）
-                query = query.filter(ReferenceMaterial.tags.contains(tags.split(',')))
+                # 需同时包含全部标签（PostgreSQL 走 GIN 索引）
+                tag_list = [t.strip() for t in tags.split(',') if t.strip()]
+                if tag_list:
+                    stmt = stmt.filter(json_contains_all(ReferenceMaterial.tags, tag_list))
 
-            materials = query.order_by(ReferenceMaterial.created_at.desc()).limit(limit).all()
+            materials, next_cursor = await keyset_paginate_async(db, stmt, order, cursor, clamp_limit(limit, 50))
 
-            return {
-                "success": True,
-                "materials": [
-                    {
-                        "id": m.id,
-                        "title": m.title,
-                        "author": m.author,
-                        "source": m.source,
-                        "file_type": m.file_type,
-                        "content_type": m.content_type,
-                        "genre": m.genre,
-                        "tags": m.tags,
-                        "core_conflict": m.core_conflict,
-                        "emotion_style": m.emotion_style,
-                        "status": m.status,
-                        "usage_count": m.usage_count,
-                        "like_count": m.like_count,
-                        "is_favorite": m.is_favorite,
-                        "created_at": m.created_at.isoformat() if m.created_at else None
-                    }
-                    for m in materials
-                ]
-            }
-        finally:
-            db.close()
+        return {
+            "success": True,
+            "materials": [to_dict(m, selected) for m in materials],
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/materials/{material_id}")
-async def get_material(material_id: int):
+async def get_material(material_id: int, db: Session = Depends(get_db)):
     """获取素材详情"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
-        try:
-            material = db.query(ReferenceMaterial).filter(ReferenceMaterial.id == material_id).first()
-            if not material:
-                raise HTTPException(status_code=404, detail="素材不存在")
+        material = db.get(ReferenceMaterial, material_id)
+        if not material:
+            raise HTTPException(status_code=404, detail="素材不存在")
 
-            return {
-                "success": True,
-                "material": {
-                    "id": material.id,
-                    "title": material.title,
-                    "author": material.author,
-                    "source": material.source,
-                    "source_url": material.source_url,
-                    "file_type": material.file_type,
-                    "file_size": material.file_size,
-                    "content_type": material.content_type,
-                    "raw_content": material.raw_content,
-                    "analysis": material.analysis,
-                    "genre": material.genre,
-                    "tags": material.tags,
-                    "core_conflict": material.core_conflict,
-                    "emotion_style": material.emotion_style,
-                    "writing_style": material.writing_style,
-                    "characters_extracted": material.characters_extracted,
-                    "plot_structure": material.plot_structure,
-                    "similarity_tags": material.similarity_tags,
-                    "usage_count": material.usage_count,
-                    "like_count": material.like_count,
-                    "is_favorite": material.is_favorite,
-                    "status": material.status,
-                    "notes": material.notes,
-                    "created_at": material.created_at.isoformat() if material.created_at else None
-                }
+        return {
+            "success": True,
+            "material": {
+                "id": material.id,
+                "title": material.title,
+                "author": material.author,
+                "source": material.source,
+                "source_url": material.source_url,
+                "file_type": material.file_type,
+                "file_size": material.file_size,
+                "content_type": material.content_type,
+                "raw_content": material.raw_content,
+                "analysis": material.analysis,
+                "genre": material.genre,
+                "tags": material.tags,
+                "core_conflict": material.core_conflict,
+                "emotion_style": material.emotion_style,
+                "writing_style": material.writing_style,
+                "characters_extracted": material.characters_extracted,
+                "plot_structure": material.plot_structure,
+                "similarity_tags": material.similarity_tags,
+                "usage_count": material.usage_count,
+                "like_count": material.like_count,
+                "is_favorite": material.is_favorite,
+                "status": material.status,
+                "notes": material.notes,
+                "created_at": material.created_at.isoformat() if material.created_at else None
             }
-        finally:
-            db.close()
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -2464,7 +2326,8 @@ async def upload_material(
     source: str = Form(None),
     content_type: str = Form(...),
     file: UploadFile = File(...),
-    notes: str = Form(None)
+    notes: str = Form(None),
+    db: Session = Depends(get_db)
 ):
     """上传参考素材文件"""
     try:
@@ -2482,8 +2345,6 @@ async def upload_material(
         raw_content = extract_text_from_file(file_path, file_ext)
 
         # 创建数据库记录
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             material = ReferenceMaterial(
                 title=title,
@@ -2532,11 +2393,9 @@ async def analyze_material(material_id: int):
 
 
 @app.get("/api/materials/{material_id}/similar")
-async def find_similar_materials(material_id: int, limit: int = 5):
+async def find_similar_materials(material_id: int, limit: int = 5, db: Session = Depends(get_db)):
     """查找相似的素材（基于标签和题材）"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             target = db.query(ReferenceMaterial).filter(ReferenceMaterial.id == material_id).first()
             if not target:
@@ -2573,11 +2432,9 @@ async def find_similar_materials(material_id: int, limit: int = 5):
 
 
 @app.post("/api/materials/{material_id}/write-similar")
-async def write_similar(material_id: int, request: dict):
+async def write_similar(material_id: int, request: dict, db: Session = Depends(get_db)):
     """基于素材生成同款作品"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
         try:
             material = db.query(ReferenceMaterial).filter(ReferenceMaterial.id == material_id).first()
             if not material:
@@ -2777,8 +2634,7 @@ def analyze_material_async(material_id: int):
 
     def analyze():
         try:
-            db_gen = get_db()
-            db = next(db_gen)
+            db = SessionLocal()
             try:
                 material = db.query(ReferenceMaterial).filter(ReferenceMaterial.id == material_id).first()
                 if not material:
@@ -2874,8 +2730,7 @@ def analyze_material_async(material_id: int):
 def init_default_agents():
     """初始化默认的智能体模板"""
     try:
-        db_gen = get_db()
-        db = next(db_gen)
+        db = SessionLocal()
         try:
             # 检查是否已经初始化
             existing = db.query(Agent).filter(Agent.agent_type == "system").count()
@@ -3193,6 +3048,7 @@ class ShortStoryReviewRequest(BaseModel):
     settings: Dict[str, Any]
     project_id: Optional[int] = None
     manuscript_id: Optional[int] = None
+    use_memo: bool = False  # 输入未变化时复用上次审稿结果（生成结果不确定，需显式开启）
 
 
 class ShortStoryRewriteRequest(BaseModel):
@@ -3207,8 +3063,70 @@ class ShortStoryStepRequest(BaseModel):
     step_name: str
 
 
+def memo_fetch(step_name: str, inputs: Dict[str, Any], owner_id: Optional[int] = None, use_memo: bool = False):
+    """
+    阶段记忆化查询：返回 (指纹, 命中的步骤数据)
+    命中时为当前稿件补一条步骤记录，保证步骤历史完整
+    """
+    fingerprint = compute_fingerprint(step_name, inputs, getattr(ai_client, "model", None))
+    if not use_memo:
+        return fingerprint, None
+    db = SessionLocal()
+    try:
+        memo = StageMemo(db, ManuscriptStep)
+        hit = memo.lookup(step_name, fingerprint)
+        if not hit:
+            return fingerprint, None
+        print(f"♻️ 复用阶段产物: {step_name} (步骤 {hit.id})")
+        if owner_id and hit.manuscript_id != owner_id:
+            memo.record(owner_id, step_name, hit.step_data, fingerprint)
+            db.commit()
+        return fingerprint, hit.step_data
+    except Exception as e:
+        print(f"阶段记忆化查询失败: {e}")
+        return fingerprint, None
+    finally:
+        db.close()
+
+
+def memo_save(owner_id: Optional[int], step_name: str, step_data: Any, fingerprint: str):
+    """保存带指纹的步骤记录；没有所属稿件时不保存"""
+    if not owner_id:
+        return
+    db = SessionLocal()
+    try:
+        StageMemo(db, ManuscriptStep).record(owner_id, step_name, step_data, fingerprint)
+        db.commit()
+    except Exception as db_e:
+        print(f"保存{step_name}步骤失败: {db_e}")
+    finally:
+        db.close()
+
+
+class StageMemoInvalidateRequest(BaseModel):
+    pipeline: str = "short_story"  # short_story: 稿件步骤; imitation: 仿写步骤
+    step_name: Optional[str] = None  # 为空时所有阶段
+    owner_id: Optional[int] = None  # 稿件ID / 仿写项目ID，为空时不限
+
+
+@app.post("/api/stage-memo/invalidate")
+async def invalidate_stage_memo(request: StageMemoInvalidateRequest, db: Session = Depends(get_db)):
+    """使阶段产物记忆失效，之后同样的输入会重新调用AI"""
+    step_models = {"short_story": ManuscriptStep, "imitation": ImitationStep}
+    if request.pipeline not in step_models:
+        raise HTTPException(status_code=400, detail="pipeline 只支持 short_story 或 imitation")
+
+    try:
+        count = StageMemo(db, step_models[request.pipeline]).invalidate(request.step_name, request.owner_id)
+        return {"success": True, "invalidated": count}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        db.close()
+
+
 @app.post("/api/short-story/generate-settings")
-async def generate_short_story_settings(request: ShortStorySettingsRequest):
+async def generate_short_story_settings(request: ShortStorySettingsRequest, db: Session = Depends(get_db)):
     """短故事: 生成设定 (含30字标题、极致人设)"""
     try:
         tropes_str = "、".join(request.tropes) if request.tropes else "自由发挥"
@@ -3283,7 +3201,6 @@ async def generate_short_story_settings(request: ShortStorySettingsRequest):
         
         if result:
             # === 保存稿件和步骤数据 ===
-            db = next(get_db())
             
             # 如果有 manuscript_id，说明是重试，更新现有稿件
             if request.manuscript_id:
@@ -3294,7 +3211,7 @@ async def generate_short_story_settings(request: ShortStorySettingsRequest):
             else:
                 # 创建新稿件
                 manuscript = Manuscript(
-                    project_id=0, # 暂时为0，最后成文才关联具体项目
+                    project_id=None, # 暂时为空，最后成文才关联具体项目
                     title=result.get('title', '未命名'),
                     status="generating"
                 )
@@ -3328,12 +3245,17 @@ async def generate_short_story_settings(request: ShortStorySettingsRequest):
 class ShortStoryOutlineRequest(BaseModel):
     settings: Dict[str, Any]
     manuscript_id: Optional[int] = None  # 新增
+    use_memo: bool = False  # 设定未变化时复用已有大纲（需显式开启，默认每次重新生成）
 
 @app.post("/api/short-story/generate-outline")
 async def generate_short_story_outline(request: ShortStoryOutlineRequest):
     """短故事: 生成大纲 (紧凑节奏，每章设钩子)"""
     try:
         settings = request.settings
+
+        fingerprint, memo_data = memo_fetch("outline", {"settings": settings}, request.manuscript_id, request.use_memo)
+        if memo_data:
+            return {"success": True, "data": memo_data, "memoized": True}
         
         # 强制转换为整数，处理AI可能返回字符串的情况
         try:
@@ -3400,20 +3322,9 @@ async def generate_short_story_outline(request: ShortStoryOutlineRequest):
         
         if result and result.get('chapters'):
             # === 保存步骤数据 ===
-            if request.manuscript_id:
-                try:
-                    db = next(get_db())
-                    step = ManuscriptStep(
-                        manuscript_id=request.manuscript_id,
-                        step_name="outline",
-                        step_data=result
-                    )
-                    db.add(step)
-                    db.commit()
-                except Exception as db_e:
-                    print(f"保存大纲步骤失败: {db_e}")
+            memo_save(request.manuscript_id, "outline", result, fingerprint)
 
-            return {"success": True, "data": result}
+            return {"success": True, "data": result, "memoized": False}
         else:
 
             # 如果解析失败，返回失败，让前端处理
@@ -3436,6 +3347,7 @@ class ShortStoryChaptersRequest(BaseModel):
     settings: Dict[str, Any]
     outline: Dict[str, Any]
     manuscript_id: Optional[int] = None # 新增
+    use_memo: bool = False  # 设定和大纲未变化时复用已有章节（需显式开启，默认每次重新生成）
 
 
 @app.post("/api/short-story/generate-chapters")
@@ -3448,6 +3360,12 @@ async def generate_short_story_chapters(request: ShortStoryChaptersRequest):
         
         if not chapters or not isinstance(chapters, list):
             raise HTTPException(status_code=400, detail="大纲中没有有效的章节信息")
+
+        fingerprint, memo_data = memo_fetch(
+            "chapters", {"settings": settings, "outline": outline}, request.manuscript_id, request.use_memo
+        )
+        if memo_data:
+            return {"success": True, "data": memo_data, "memoized": True}
         
         # 构建角色上下文
         characters = settings.get('characters', [])
@@ -3537,25 +3455,16 @@ async def generate_short_story_chapters(request: ShortStoryChaptersRequest):
         
         print(f"短故事章节生成完成，成功 {len(generated_chapters)}/{len(chapters)} 章")
         
-        print(f"短故事章节生成完成，成功 {len(generated_chapters)}/{len(chapters)} 章")
-        
         result_data = {"chapters": generated_chapters}
 
         # === 保存步骤数据 ===
-        if request.manuscript_id:
-            try:
-                db = next(get_db())
-                step = ManuscriptStep(
-                    manuscript_id=request.manuscript_id,
-                    step_name="chapters",
-                    step_data=result_data
-                )
-                db.add(step)
-                db.commit()
-            except Exception as db_e:
-                print(f"保存章节步骤失败: {db_e}")
+        # 有章节失败时不记忆，避免下次直接复用残缺结果
+        if len(generated_chapters) == len(chapters):
+            memo_save(request.manuscript_id, "chapters", result_data, fingerprint)
+        elif request.manuscript_id:
+            memo_save(request.manuscript_id, "chapters", result_data, None)
 
-        return {"success": True, "data": result_data}
+        return {"success": True, "data": result_data, "memoized": False}
         
     except HTTPException as e:
         raise e
@@ -3573,33 +3482,13 @@ class ShortStoryNovelRequest(BaseModel):
 
 
 @app.post("/api/short-story/generate-novel")
-async def generate_short_story_novel(request: ShortStoryNovelRequest):
+async def generate_short_story_novel(request: ShortStoryNovelRequest, db: Session = Depends(get_db)):
     """短故事: 一键成文 (创建项目并保存)"""
     try:
         settings = request.settings
         outline = request.outline
         chapters_data = request.chapters
         
-        db = next(get_db())
-        
-        # 创建项目
-        project = NovelProject(
-            name=settings.get('title', '未命名短故事'),
-            theme=settings.get('summary', ''),
-            background=settings.get('genre', ''),
-            genre="短故事",
-            core_conflict=settings.get('main_conflict', ''),
-            target_words=settings.get('target_words', 22000),
-            status="completed",
-            outline=outline,
-            characters=settings.get('characters', []),
-            chapters=[],
-            word_count=0
-        )
-        
-        db.add(project)
-        db.commit()
-        db.refresh(project)
         
         # 转换章节格式
         chapters = []
@@ -3617,56 +3506,61 @@ async def generate_short_story_novel(request: ShortStoryNovelRequest):
             chapters.append(chapter)
             total_words += ch.get('word_count', 0)
         
-        project.chapters = chapters
-        project.word_count = total_words
-        db.commit()
+        # 创建项目、角色和章节数据（一个短事务）
+        project = NovelProject(
+            name=settings.get('title', '未命名短故事'),
+            theme=settings.get('summary', ''),
+            background=settings.get('genre', ''),
+            genre="短故事",
+            core_conflict=settings.get('main_conflict', ''),
+            target_words=settings.get('target_words', 22000),
+            status="completed",
+            outline=outline,
+            characters=settings.get('characters', []),
+            chapters=chapters,
+            word_count=total_words
+        )
+        db.add(project)
+        db.flush()
         
-        # 创建角色和章节数据
-        for char in settings.get('characters', []):
-            try:
-                character = Character(
-                    project_id=project.id,
-                    name=char.get('name', '未命名'),
-                    role_type=char.get('role_type', 'supporting'),
-                    importance='core' if char.get('role_type') == 'protagonist' else 'important',
-                    core_identity=char.get('identity'),
-                    core_personality=char.get('personality'),
-                    personality_flaw=char.get('flaw'),
-                    source="short_story_assistant"
-                )
-                db.add(character)
-            except Exception as e:
-                print(f"创建角色失败: {e}")
+        bulk_insert(db, Character, [
+            {
+                "project_id": project.id,
+                "name": char.get('name', '未命名'),
+                "role_type": char.get('role_type', 'supporting'),
+                "importance": 'core' if char.get('role_type') == 'protagonist' else 'important',
+                "core_identity": char.get('identity'),
+                "core_personality": char.get('personality'),
+                "personality_flaw": char.get('flaw'),
+                "source": "short_story_assistant"
+            }
+            for char in settings.get('characters', [])
+        ])
         
+        outline_rows, draft_rows = [], []
         for idx, ch in enumerate(chapters_data.get('chapters', [])):
-            try:
-                plot_outline = PlotOutline(
-                    project_id=project.id,
-                    level="chapter",
-                    chapter_number=ch.get('chapter_number', idx + 1),
-                    title=ch.get('title', ''),
-                    summary=ch.get('summary', ''),
-                    target_words=ch.get('word_count', 2000),
-                    source="short_story_assistant",
-                    status="generated",
-                    order=ch.get('chapter_number', idx + 1)
-                )
-                db.add(plot_outline)
-                db.flush()
-                
-                chapter_draft = ChapterDraft(
-                    project_id=project.id,
-                    outline_id=plot_outline.id,
-                    chapter_number=ch.get('chapter_number', idx + 1),
-                    title=ch.get('title', ''),
-                    content=ch.get('content', ''),
-                    word_count=ch.get('word_count', 0),
-                    status="completed",
-                    generation_params={"source": "short_story_assistant"}
-                )
-                db.add(chapter_draft)
-            except Exception as e:
-                print(f"创建章节数据失败: {e}")
+            chapter_number = ch.get('chapter_number', idx + 1)
+            outline_rows.append({
+                "project_id": project.id,
+                "level": "chapter",
+                "chapter_number": chapter_number,
+                "title": ch.get('title', ''),
+                "summary": ch.get('summary', ''),
+                "target_words": ch.get('word_count', 2000),
+                "source": "short_story_assistant",
+                "status": "generated",
+                "order": chapter_number
+            })
+            draft_rows.append({
+                "project_id": project.id,
+                "chapter_number": chapter_number,
+                "title": ch.get('title', ''),
+                "content": ch.get('content', ''),
+                "word_count": ch.get('word_count', 0),
+                "status": "completed",
+                "generation_params": {"source": "short_story_assistant"}
+            })
+        insert_outlines_with_drafts(db, outline_rows, draft_rows)
         
         db.commit()
         
@@ -3675,11 +3569,11 @@ async def generate_short_story_novel(request: ShortStoryNovelRequest):
             manuscript = Manuscript(
                 project_id=project.id,
                 title=project.name,
-                content=chapters,
                 created_at=datetime.now(),
                 updated_at=datetime.now()
             )
             db.add(manuscript)
+            save_version(db, manuscript, chapters)
             db.commit()
             db.refresh(manuscript)
             manuscript_id = manuscript.id
@@ -3732,9 +3626,15 @@ async def generate_short_story_novel(request: ShortStoryNovelRequest):
 
 
 @app.post("/api/short-story/review")
-async def review_short_story(request: ShortStoryReviewRequest):
+async def review_short_story(request: ShortStoryReviewRequest, db: Session = Depends(get_db)):
     """短故事: AI 审稿 (结构-情绪 双轨版)"""
     try:
+        review_inputs = {
+            "title": request.title, "intro": request.intro,
+            "chapters": request.chapters, "settings": request.settings
+        }
+        fingerprint, memo_data = memo_fetch("review", review_inputs, request.manuscript_id, request.use_memo)
+
         chapters_text = "\n\n".join([
             f"### 第{c.get('chapter_number', i+1)}章: {c.get('title', '')}\n{c.get('content', '')}"
             for i, c in enumerate(request.chapters)
@@ -3772,18 +3672,22 @@ async def review_short_story(request: ShortStoryReviewRequest):
 
 请以 Markdown 格式输出。
 """
-        messages = [{"role": "user", "content": prompt}]
-        report = ai_client._call_api(messages, temperature=0.8, max_tokens=6000)
-        
-        # 提取评级
-        grade = "B"
-        if "**S**" in report or "评级：S" in report: grade = "S"
-        elif "**A**" in report or "评级：A" in report: grade = "A"
-        elif "**C**" in report or "评级：C" in report: grade = "C"
+        if memo_data:
+            report, grade = memo_data["report"], memo_data["grade"]
+        else:
+            messages = [{"role": "user", "content": prompt}]
+            report = ai_client._call_api(messages, temperature=0.8, max_tokens=6000)
+
+            # 提取评级
+            grade = "B"
+            if "**S**" in report or "评级：S" in report: grade = "S"
+            elif "**A**" in report or "评级：A" in report: grade = "A"
+            elif "**C**" in report or "评级：C" in report: grade = "C"
+
+            memo_save(request.manuscript_id, "review", {"report": report, "grade": grade}, fingerprint)
         
         # 如果提供了manuscript_id或project_id，保存审稿报告
         try:
-            db = next(get_db())
             if request.manuscript_id:
                 manuscript = db.query(Manuscript).filter(Manuscript.id == request.manuscript_id).first()
                 if manuscript:
@@ -3802,7 +3706,7 @@ async def review_short_story(request: ShortStoryReviewRequest):
         except Exception as db_err:
             print(f"保存审稿报告失败: {db_err}")
 
-        return {"success": True, "data": {"report": report, "grade": grade}}
+        return {"success": True, "data": {"report": report, "grade": grade}, "memoized": bool(memo_data)}
         
     except Exception as e:
         import traceback
@@ -3814,8 +3718,13 @@ async def review_short_story(request: ShortStoryReviewRequest):
 async def list_manuscripts(project_id: int):
     """列出项目的所有稿件版本"""
     try:
-        db = next(get_db())
-        manuscripts = db.query(Manuscript).filter(Manuscript.project_id == project_id).order_by(Manuscript.created_at.desc()).all()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Manuscript).options(
+                    load_only(Manuscript.id, Manuscript.title, Manuscript.grade, Manuscript.created_at)
+                ).filter(Manuscript.project_id == project_id).order_by(Manuscript.created_at.desc())
+            )
+            manuscripts = result.scalars().all()
         return {
             "success": True, 
             "manuscripts": [
@@ -3834,8 +3743,8 @@ async def list_manuscripts(project_id: int):
 async def get_manuscript(manuscript_id: int):
     """获取指定稿件的详细内容和审稿报告"""
     try:
-        db = next(get_db())
-        m = db.query(Manuscript).filter(Manuscript.id == manuscript_id).first()
+        async with AsyncSessionLocal() as db:
+            m = await db.run_sync(load_manuscript, manuscript_id)
         if not m:
             raise HTTPException(status_code=404, detail="稿件未找到")
         return {
@@ -3854,121 +3763,133 @@ async def get_manuscript(manuscript_id: int):
         if isinstance(e, HTTPException): raise e
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/api/manuscript/{manuscript_id}/history")
+async def get_manuscript_history(manuscript_id: int):
+    """稿件版本链：从当前稿件回溯到最近的完整快照"""
+    def query(db):
+        m = db.query(Manuscript).filter(Manuscript.id == manuscript_id).first()
+        return version_history(db, m) if m else None
+
+    try:
+        async with AsyncSessionLocal() as db:
+            history = await db.run_sync(query)
+        if history is None:
+            raise HTTPException(status_code=404, detail="稿件未找到")
+        return {"success": True, "history": history}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/manuscript/{manuscript_id}/diff/{other_id}")
+async def diff_manuscript(manuscript_id: int, other_id: int):
+    """对比两个稿件版本（以 manuscript_id 为旧版本），返回逐章的段落级差异"""
+    def query(db):
+        old = db.query(Manuscript).filter(Manuscript.id == manuscript_id).first()
+        new = db.query(Manuscript).filter(Manuscript.id == other_id).first()
+        return diff_manuscripts(db, old, new) if old and new else None
+
+    try:
+        async with AsyncSessionLocal() as db:
+            changes = await db.run_sync(query)
+        if changes is None:
+            raise HTTPException(status_code=404, detail="稿件未找到")
+        return {
+            "success": True,
+            "from_id": manuscript_id,
+            "to_id": other_id,
+            "changed_chapters": [c["chapter_number"] for c in changes],
+            "changes": changes
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/short-story/rewrite")
-async def rewrite_short_story(request: ShortStoryRewriteRequest):
-    """短故事: 根据审稿报告重写"""
+async def rewrite_short_story(request: ShortStoryRewriteRequest, db: Session = Depends(get_db)):
+    """短故事: 根据审稿报告定向重写 (只改被点名的章节，生成新稿件版本)"""
     try:
         story = request.story_data
         report = request.review_report
         instruction = request.instruction or ""
-        
-        chapters = story.get('chapters', [])
-        chapters_summary = "\n".join([
-            f"- 第{c.get('chapter_number', i+1)}章: {c.get('title', '')} (约{c.get('word_count', 0)}字)"
-            for i, c in enumerate(chapters)
-        ])
-        
-        # 1. 生成重写计划 (JSON)
-        plan_prompt = f"""你是顶级网文主编。请根据“审稿报告”，为这部短篇小说的每一章制定详细的“重写指令”。
-        
-**审稿报告建议:**
-{report}
+        base_manuscript_id = request.manuscript_id or story.get('manuscript_id')
 
-**额外修改要求:**
-{instruction}
+        base_manuscript = None
+        if base_manuscript_id:
+            base_manuscript = load_manuscript(db, base_manuscript_id)
 
-**原稿章节列表:**
-{chapters_summary}
+        chapters = story.get('chapters', [])
+        if not chapters and base_manuscript and isinstance(base_manuscript.content, list):
+            chapters = base_manuscript.content
+        if not chapters:
+            raise HTTPException(status_code=400, detail="没有可重写的章节")
 
-**任务:**
-请输出一份JSON格式的重写计划，明确每一章需要如何根据建议进行具体调整（如：将冲突从第三章移到第一章，强化主角在第二章的反击等）。
+        # 1. 生成重写计划 (只包含需要修改的章节)
+        planner = RewritePlanner(ai_client)
+        try:
+            rewrite_plans = planner.plan(chapters, report, instruction)
+        except RewritePlanError as e:
+            return {"success": False, "message": str(e)}
+        if not rewrite_plans:
+            return {
+                "success": True,
+                "data": {"chapters": chapters, "changed_chapters": [], "manuscript_id": base_manuscript_id},
+                "message": "审稿报告未指出需要修改的章节"
+            }
+        print(f"✂️ 定向重写: {[p['chapter_number'] for p in rewrite_plans]} / 共{len(chapters)}章")
 
-格式如下：
-```json
-{{
-  "rewrite_plan": [
-    {{
-      "chapter_number": 1,
-      "original_title": "旧标题",
-      "new_title": "新爆款标题",
-      "modifications": "具体修改点：1... 2... 3...",
-      "target_hook": "本章必须强化的悬念/钩子"
-    }}
-  ]
-}}
-```
-"""
-        messages = [{"role": "user", "content": plan_prompt}]
-        plan_response = ai_client._call_api(messages, temperature=0.7, max_tokens=2000)
-        plan_result = parse_json_response(plan_response)
-        
-        if not plan_result or not plan_result.get('rewrite_plan'):
-            # 记录原始响应以便调试
-            with open("plan_response_error.log", "w") as f:
-                f.write(f"RAW RESPONSE:\n{plan_response}\n\nPARSED RESULT:\n{json.dumps(plan_result, ensure_ascii=False)}")
-            raise HTTPException(status_code=500, detail="生成重写计划失败，已记录原始响应")
+        # 2. 并行重写被点名的章节，其余章节原样保留
+        new_chapters, changed = planner.execute(chapters, rewrite_plans)
+        if not changed:
+            return {"success": False, "message": "所有章节重写均失败"}
 
-        rewrite_plans = plan_result['rewrite_plan']
-        
-        # 2. 并行重写每一章
-        def execute_chapter_rewrite(idx, plan):
-            orig_chapter = chapters[idx] if idx < len(chapters) else {}
-            chapter_num = plan.get('chapter_number', idx + 1)
-            
-            chapter_prompt = f"""你是顶级网文修改专家。请执行具体的章节重写。
-            
-**原章节内容 (第{chapter_num}章):**
-标题: {orig_chapter.get('title', '无')}
-正文:
-{orig_chapter.get('content', '无内容')}
-
-**重写计划要求:**
-新标题: {plan.get('new_title', '爆款标题')}
-具体修改指令: {plan.get('modifications', '全方位升级')}
-核心钩子: {plan.get('target_hook', '留悬念')}
-
-**重写规则:**
-1. 保持视角一致。
-2. 节奏极速，砍掉废话。
-3. 心理描写融入行动。
-4. 结尾必须卡在钩子上。
-
-直接输出重写后的章节正文，不要有任何说明。
-"""
-            try:
-                msg = [{"role": "user", "content": chapter_prompt}]
-                new_content = ai_client._call_api(msg, temperature=0.85, max_tokens=4000)
-                return {
-                    "chapter_number": chapter_num,
-                    "title": plan.get('new_title', '新标题'),
-                    "content": new_content,
-                    "word_count": len(new_content)
+        # 3. 保存为新稿件版本 (未修改章节与原稿共享)
+        manuscript_id = None
+        project_id = base_manuscript.project_id if base_manuscript else story.get('project_id')
+        if project_id and not db.query(NovelProject.id).filter(NovelProject.id == project_id).first():
+            project_id = None
+        try:
+            manuscript = Manuscript(
+                project_id=project_id,
+                title=base_manuscript.title if base_manuscript else story.get('title'),
+                status="completed",
+                created_at=datetime.now(),
+                updated_at=datetime.now()
+            )
+            db.add(manuscript)
+            # 以原稿为基准只保存段落级增量
+            save_version(db, manuscript, new_chapters, base_manuscript.id if base_manuscript else None)
+            db.add(ManuscriptStep(
+                manuscript_id=manuscript.id,
+                step_name="rewrite",
+                step_data={
+                    "base_manuscript_id": base_manuscript_id,
+                    "changed_chapters": changed,
+                    "rewrite_plan": rewrite_plans
                 }
-            except Exception as e:
-                print(f"重写章节 {chapter_num} 失败: {e}")
-                return None
+            ))
+            db.commit()
+            manuscript_id = manuscript.id
+        except Exception as db_e:
+            db.rollback()
+            print(f"保存重写稿件失败: {db_e}")
 
-        # 并行执行
-        new_chapters = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [
-                executor.submit(execute_chapter_rewrite, i, plan)
-                for i, plan in enumerate(rewrite_plans)
-            ]
-            
-            for future in concurrent.futures.as_completed(futures):
-                res = future.result()
-                if res:
-                    new_chapters.append(res)
-        
-        # 排序
-        new_chapters.sort(key=lambda x: x['chapter_number'])
-        
-        if new_chapters:
-            return {"success": True, "data": {"chapters": new_chapters}}
-        else:
-            return {"success": False, "message": "所有章节重写均失败"}
-            
+        return {
+            "success": True,
+            "data": {
+                "chapters": new_chapters,
+                "changed_chapters": changed,
+                "rewrite_plan": rewrite_plans,
+                "manuscript_id": manuscript_id,
+                "base_manuscript_id": base_manuscript_id
+            }
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_msg = traceback.format_exc()
@@ -3976,6 +3897,8 @@ async def rewrite_short_story(request: ShortStoryRewriteRequest):
         with open("rewrite_debug.log", "w") as f:
             f.write(error_msg)
         raise HTTPException(status_code=500, detail=f"重构失败: {str(e)}")
+    finally:
+        db.close()
 
 
 if __name__ == "__main__":
@@ -4001,10 +3924,9 @@ class CharacterCardCreate(BaseModel):
 
 
 @app.post("/api/character-cards")
-async def create_character_card(request: CharacterCardCreate):
+async def create_character_card(request: CharacterCardCreate, db: Session = Depends(get_db)):
     """创建角色卡"""
     try:
-        db = next(get_db())
         character = Character(
             project_id=request.project_id,
             name=request.name,
@@ -4027,10 +3949,9 @@ async def create_character_card(request: CharacterCardCreate):
 
 
 @app.get("/api/character-cards/{project_id}")
-async def get_character_cards(project_id: int):
+async def get_character_cards(project_id: int, db: Session = Depends(get_db)):
     """获取角色卡列表（星月风格：智能过滤 + 按重要性排序）"""
     try:
-        db = next(get_db())
 
         # 使用 CASE 语句实现正确的排序：core → important → supporting
         from sqlalchemy import case
@@ -4076,10 +3997,9 @@ async def get_character_cards(project_id: int):
 
 
 @app.put("/api/character-cards/{character_id}")
-async def update_character_card(character_id: int, request: dict):
+async def update_character_card(character_id: int, request: dict, db: Session = Depends(get_db)):
     """更新角色卡"""
     try:
-        db = next(get_db())
         character = db.query(Character).filter(Character.id == character_id).first()
         if not character:
             raise HTTPException(status_code=404, detail="角色卡不存在")
@@ -4097,10 +4017,9 @@ async def update_character_card(character_id: int, request: dict):
 
 
 @app.delete("/api/character-cards/{character_id}")
-async def delete_character_card(character_id: int):
+async def delete_character_card(character_id: int, db: Session = Depends(get_db)):
     """删除角色卡"""
     try:
-        db = next(get_db())
         character = db.query(Character).filter(Character.id == character_id).first()
         if not character:
             raise HTTPException(status_code=404, detail="角色卡不存在")
@@ -4141,10 +4060,9 @@ class ChannelAgentUpdate(BaseModel):
 
 
 @app.post("/api/channel-agents")
-async def create_channel_agent(agent: ChannelAgentCreate):
+async def create_channel_agent(agent: ChannelAgentCreate, db: Session = Depends(get_db)):
     """创建渠道智能体"""
     try:
-        db = next(get_db())
         new_agent = ChannelAgent(
             name=agent.name,
             description=agent.description,
@@ -4174,10 +4092,9 @@ async def create_channel_agent(agent: ChannelAgentCreate):
 
 
 @app.get("/api/channel-agents")
-async def list_channel_agents():
+async def list_channel_agents(db: Session = Depends(get_db)):
     """获取所有渠道智能体列表"""
     try:
-        db = next(get_db())
         agents = db.query(ChannelAgent).filter(
             ChannelAgent.is_active == 1
         ).order_by(ChannelAgent.id.desc()).all()
@@ -4208,10 +4125,9 @@ async def list_channel_agents():
 
 
 @app.get("/api/channel-agents/{agent_id}")
-async def get_channel_agent(agent_id: int):
+async def get_channel_agent(agent_id: int, db: Session = Depends(get_db)):
     """获取渠道智能体详情"""
     try:
-        db = next(get_db())
         agent = db.query(ChannelAgent).filter(ChannelAgent.id == agent_id).first()
         if not agent:
             raise HTTPException(status_code=404, detail="智能体不存在")
@@ -4224,10 +4140,9 @@ async def get_channel_agent(agent_id: int):
 
 
 @app.post("/api/channel-agents/{agent_id}/upload-corpus")
-async def upload_corpus(agent_id: int, files: List[UploadFile] = File(...)):
+async def upload_corpus(agent_id: int, files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
     """上传语料文件（支持多文件）"""
     try:
-        db = next(get_db())
         agent = db.query(ChannelAgent).filter(ChannelAgent.id == agent_id).first()
         if not agent:
             raise HTTPException(status_code=404, detail="智能体不存在")
@@ -4306,10 +4221,8 @@ class GenerateLongChapterRequest(BaseModel):
 expansion_engine = ExpansionEngine()
 
 @app.post("/api/long-novel/create")
-async def create_long_project(request: CreateLongProjectRequest):
+async def create_long_project(request: CreateLongProjectRequest, db: Session = Depends(get_db)):
     """从短篇稿件创建长篇项目"""
-    db_gen = get_db()
-    db = next(db_gen)
     try:
         manuscript = db.query(Manuscript).filter(Manuscript.id == request.manuscript_id).first()
         if not manuscript:
@@ -4336,92 +4249,26 @@ async def create_long_project(request: CreateLongProjectRequest):
         db.close()
 
 @app.get("/api/long-novel/{project_id}")
-async def get_long_project(project_id: int):
-    """获取长篇项目详情 (包含卷和章节结构)"""
-    db_gen = get_db()
-    db = next(db_gen)
-    try:
-        project = db.query(NovelProject).filter(NovelProject.id == project_id).first()
-        if not project:
-            return {"success": False, "message": "项目不存在"}
+async def get_long_project(project_id: int, include_content: bool = True):
+    """获取长篇项目详情 (包含卷和章节结构)，include_content=false 时只返回章节元数据"""
+    async with AsyncSessionLocal() as db:
+        data = await db.run_sync(load_long_project, project_id, include_content)
+    if not data:
+        return {"success": False, "message": "项目不存在"}
 
-        # 获取映射关系 (卷结构)
-        mappings = db.query(LongNovelMapping).filter(LongNovelMapping.project_id == project_id).order_by(LongNovelMapping.volume_number).all()
-        
-        # 获取所有生成的大纲/章节
-        # 这里为了简化，我们假设 plot_outlines 表存了大纲，chapter_drafts 存了正文
-        # 实际需要根据前面的数据库设计来关联
-        
-        # 构造返回结构
-        volumes = []
-        for m in mappings:
-            # 查询本卷下的章节
-            chapters = db.query(ChapterDraft).join(PlotOutline).filter(
-                PlotOutline.project_id == project_id,
-                ChapterDraft.chapter_number >= m.start_chapter,
-                ChapterDraft.chapter_number <= m.end_chapter
-            ).all()
-            
-            # 手动组装 chapters info 
-            # (这里简化处理，实际应该 join 查询 PlotOutline 获取标题和摘要)
-            chapter_list = []
-            outlines = db.query(PlotOutline).filter(
-                PlotOutline.project_id == project_id,
-                PlotOutline.chapter_number >= m.start_chapter,
-                PlotOutline.chapter_number <= m.end_chapter
-            ).order_by(PlotOutline.chapter_number).all()
-            
-            for ol in outlines:
-                draft = db.query(ChapterDraft).filter(ChapterDraft.outline_id == ol.id).first()
-                focus = json.loads(ol.focus_elements) if ol.focus_elements else {}
-                chapter_list.append({
-                    "id": draft.id if draft else None,
-                    "outline_id": ol.id,
-                    "chapter_number": ol.chapter_number,
-                    "title": ol.title,
-                    "summary": ol.summary,
-                    "main_conflict": focus.get("main_conflict"),
-                    "sub_conflict": focus.get("sub_conflict"),
-                    "emotion_arc": focus.get("emotion_arc"),
-                    "status": draft.status if draft else "planning",
-                    "word_count": draft.word_count if draft else 0,
-                    "content": draft.content if draft else ""
-                })
-            
-            volumes.append({
-                "volume_number": m.volume_number,
-                "title": m.short_chapter_title,
-                "summary": m.short_chapter_summary,
-                "chapters": chapter_list
-            })
-            
-        return {
-            "success": True, 
-            "data": {
-                "project": {
-                    "id": project.id,
-                    "name": project.name,
-                    "source_manuscript_id": project.source_manuscript_id
-                },
-                "volumes": volumes
-            }
-        }
-    finally:
-        db.close()
+    return {"success": True, "data": data}
 
 @app.post("/api/long-novel/expand-volume")
-async def expand_volume(request: ExpandVolumeRequest):
+async def expand_volume(request: ExpandVolumeRequest, db: Session = Depends(get_db)):
     """
     【新算法逻辑】将短篇的一章扩写为长篇的一卷 (裂变为 18-20 章)
     """
-    db_gen = get_db()
-    db = next(db_gen)
     try:
         project = db.query(NovelProject).filter(NovelProject.id == request.project_id).first()
         if not project or not project.source_manuscript_id:
             return {"success": False, "message": "无效的长篇项目"}
             
-        manuscript = db.query(Manuscript).filter(Manuscript.id == project.source_manuscript_id).first()
+        manuscript = load_manuscript(db, project.source_manuscript_id)
         if not manuscript:
             return {"success": False, "message": "找不到源短篇稿件"}
             
@@ -4458,35 +4305,32 @@ async def expand_volume(request: ExpandVolumeRequest):
         db.add(mapping)
         db.flush()
         
-        # 4. 批量创建 PlotOutline 和 ChapterDraft
+        # 4. 批量创建 PlotOutline 和 ChapterDraft（各一条语句，写锁只持有到提交）
+        outline_rows, draft_rows = [], []
         for i, ch_data in enumerate(chapters_data):
             curr_ch_num = start_chap + i
-            outline = PlotOutline(
-                project_id=project.id,
-                level="chapter",
-                parent_id=mapping.id,
-                chapter_number=curr_ch_num,
-                title=ch_data.get("title"),
-                summary=ch_data.get("summary"),
-                target_words=3000,
-                focus_elements=json.dumps({
+            outline_rows.append({
+                "project_id": project.id,
+                "level": "chapter",
+                "parent_id": mapping.id,
+                "chapter_number": curr_ch_num,
+                "title": ch_data.get("title"),
+                "summary": ch_data.get("summary"),
+                "target_words": 3000,
+                "focus_elements": json.dumps({
                     "main_conflict": ch_data.get("main_conflict"),
                     "sub_conflict": ch_data.get("sub_conflict"),
                     "emotion_arc": ch_data.get("emotion_arc")
                 }),
-                status="ready"
-            )
-            db.add(outline)
-            db.flush()
-            
-            draft = ChapterDraft(
-                project_id=project.id,
-                outline_id=outline.id,
-                chapter_number=curr_ch_num,
-                title=ch_data.get("title"),
-                status="draft"
-            )
-            db.add(draft)
+                "status": "ready"
+            })
+            draft_rows.append({
+                "project_id": project.id,
+                "chapter_number": curr_ch_num,
+                "title": ch_data.get("title"),
+                "status": "draft"
+            })
+        insert_outlines_with_drafts(db, outline_rows, draft_rows)
             
         db.commit()
         return {"success": True, "data": {"volume_number": mapping.volume_number, "num_chapters": num_new_chapters}}
@@ -4500,17 +4344,15 @@ async def expand_volume(request: ExpandVolumeRequest):
         db.close()
 
 @app.post("/api/long-novel/preview-outline")
-async def preview_long_outline(request: CreateLongProjectRequest):
+async def preview_long_outline(request: CreateLongProjectRequest, db: Session = Depends(get_db)):
     """
     【预览功能】生成完整的长篇扩写大纲预览（不保存到数据库）
 
     用于在创建长篇项目前，让用户预览整体结构规划
     返回完整的180章规划结构，方便用户确认是否符合预期
     """
-    db_gen = get_db()
-    db = next(db_gen)
     try:
-        manuscript = db.query(Manuscript).filter(Manuscript.id == request.manuscript_id).first()
+        manuscript = load_manuscript(db, request.manuscript_id)
         if not manuscript:
             return {"success": False, "message": "找不到原始稿件"}
 
@@ -4530,10 +4372,8 @@ async def preview_long_outline(request: CreateLongProjectRequest):
 
 
 @app.post("/api/long-novel/generate-chapter")
-async def generate_long_chapter(request: GenerateLongChapterRequest):
+async def generate_long_chapter(request: GenerateLongChapterRequest, db: Session = Depends(get_db)):
     """【新扩写策略】生成长篇单章正文 (3000字+)"""
-    db_gen = get_db()
-    db = next(db_gen)
     try:
         # 1. 获取草稿和关联大纲
         draft = db.query(ChapterDraft).filter(ChapterDraft.id == request.chapter_id).first()
@@ -4565,7 +4405,7 @@ async def generate_long_chapter(request: GenerateLongChapterRequest):
         
         # 4. 获取人物信息 (从原始稿件中提取)
         characters = []
-        manuscript = db.query(Manuscript).filter(Manuscript.id == project.source_manuscript_id).first()
+        manuscript = load_manuscript(db, project.source_manuscript_id)
         if manuscript and manuscript.content:
             characters = manuscript.content.get('characters', [])
         
@@ -4603,10 +4443,9 @@ async def generate_long_chapter(request: GenerateLongChapterRequest):
 
 
 @app.post("/api/channel-agents/{agent_id}/train")
-async def train_channel_agent(agent_id: int):
+async def train_channel_agent(agent_id: int, db: Session = Depends(get_db)):
     """AI拆解训练 - 从语料中提取风格特征"""
     try:
-        db = next(get_db())
         agent = db.query(ChannelAgent).filter(ChannelAgent.id == agent_id).first()
         if not agent:
             raise HTTPException(status_code=404, detail="智能体不存在")
@@ -4619,6 +4458,9 @@ async def train_channel_agent(agent_id: int):
         db.commit()
 
         async def train_agent():
+            # 训练在响应返回后继续执行，使用独立会话（请求会话已关闭）
+            task_db = SessionLocal()
+            agent = task_db.query(ChannelAgent).filter(ChannelAgent.id == agent_id).first()
             try:
                 corpus_texts = []
                 for file_info in agent.training_files:
@@ -4633,7 +4475,7 @@ async def train_channel_agent(agent_id: int):
                 analysis_prompt = f"""分析以下公众号语料风格，以JSON格式返回特征：\n\n{full_corpus[:10000]}\n\n请提取：title_style, topic_preferences, writing_style, content_structure, length_requirements, vocabulary_features"""
 
                 agent.training_progress = 50
-                db.commit()
+                task_db.commit()
 
                 response = ai_client.chat(analysis_prompt, temperature=0.3)
                 
@@ -4651,12 +4493,14 @@ async def train_channel_agent(agent_id: int):
                 agent.training_progress = 100
                 agent.training_status = "completed"
                 agent.last_training_at = datetime.now()
-                db.commit()
+                task_db.commit()
 
             except Exception as e:
                 agent.training_status = "failed"
                 agent.training_error = str(e)
-                db.commit()
+                task_db.commit()
+            finally:
+                task_db.close()
 
         import asyncio
         asyncio.create_task(train_agent())
@@ -4669,10 +4513,9 @@ async def train_channel_agent(agent_id: int):
 
 
 @app.post("/api/channel-agents/{agent_id}/generate-inspiration")
-async def generate_inspiration(agent_id: int, request: dict):
+async def generate_inspiration(agent_id: int, request: dict, db: Session = Depends(get_db)):
     """使用渠道智能体生成文章灵感/大纲"""
     try:
-        db = next(get_db())
         agent = db.query(ChannelAgent).filter(ChannelAgent.id == agent_id).first()
         if not agent:
             raise HTTPException(status_code=404, detail="智能体不存在")
@@ -4800,10 +4643,9 @@ async def generate_inspiration(agent_id: int, request: dict):
 
 
 @app.post("/api/channel-agents/{agent_id}/generate")
-async def generate_with_agent(agent_id: int, request: dict):
+async def generate_with_agent(agent_id: int, request: dict, db: Session = Depends(get_db)):
     """使用渠道智能体生成投稿文章"""
     try:
-        db = next(get_db())
         agent = db.query(ChannelAgent).filter(ChannelAgent.id == agent_id).first()
         if not agent:
             raise HTTPException(status_code=404, detail="智能体不存在")
@@ -4953,15 +4795,19 @@ async def ocr_image(image: UploadFile = File(...)):
 
 
 @app.post("/api/imitation/deconstruct")
-async def deconstruct_original(request: DeconstructionRequest):
+async def deconstruct_original(request: DeconstructionRequest, db: Session = Depends(get_db)):
     """阶段一：深度拆解原文"""
     try:
-        db = next(get_db())
         generator = ImitationGenerator(db)
         result = generator.deconstruct(request)
 
         if result.success:
-            return {"success": True, "project_id": result.project_id, "analysis": result.analysis}
+            return {
+                "success": True,
+                "project_id": result.project_id,
+                "analysis": result.analysis,
+                "reused_from": result.reused_from
+            }
         else:
             return {"success": False, "message": result.message}
     except Exception as e:
@@ -4971,10 +4817,9 @@ async def deconstruct_original(request: DeconstructionRequest):
 
 
 @app.post("/api/imitation/configure")
-async def configure_imitation(request: ConfigurationRequest):
+async def configure_imitation(request: ConfigurationRequest, db: Session = Depends(get_db)):
     """阶段二：配置新设定"""
     try:
-        db = next(get_db())
         generator = ImitationGenerator(db)
         result = generator.configure(request)
 
@@ -4989,10 +4834,9 @@ async def configure_imitation(request: ConfigurationRequest):
 
 
 @app.post("/api/imitation/preview")
-async def preview_reconstruction(request: PreviewRequest):
+async def preview_reconstruction(request: PreviewRequest, db: Session = Depends(get_db)):
     """阶段三：生成重构蓝图预览"""
     try:
-        db = next(get_db())
         generator = ImitationGenerator(db)
         result = generator.preview(request)
 
@@ -5007,10 +4851,9 @@ async def preview_reconstruction(request: PreviewRequest):
 
 
 @app.post("/api/imitation/generate")
-async def generate_imitation(request: GenerationRequest):
+async def generate_imitation(request: GenerationRequest, db: Session = Depends(get_db)):
     """阶段四：生成仿写正文"""
     try:
-        db = next(get_db())
         generator = ImitationGenerator(db)
         result = generator.generate(request)
 
@@ -5025,10 +4868,9 @@ async def generate_imitation(request: GenerationRequest):
 
 
 @app.get("/api/imitation/projects/{project_id}")
-async def get_imitation_project(project_id: int):
+async def get_imitation_project(project_id: int, db: Session = Depends(get_db)):
     """获取仿写项目详情"""
     try:
-        db = next(get_db())
         project = db.query(ImitationProject).filter(ImitationProject.id == project_id).first()
 
         if not project:
@@ -5060,10 +4902,9 @@ async def get_imitation_project(project_id: int):
 
 
 @app.get("/api/imitation/projects")
-async def list_imitation_projects():
+async def list_imitation_projects(db: Session = Depends(get_db)):
     """获取所有仿写项目列表"""
     try:
-        db = next(get_db())
         projects = db.query(ImitationProject).order_by(ImitationProject.created_at.desc()).all()
 
         return {
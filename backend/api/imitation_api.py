@@ -4,14 +4,21 @@
 
 from fastapi import HTTPException
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from backend.ai.ai_factory import AIClientFactory
+from backend.database.models import ImitationProject, ImitationStep, DeconstructionChunk, compute_content_hash
+from backend.database.stage_memo import StageMemo, compute_fingerprint
 from backend.prompts.imitation_prompts import (
     DECONSTRUCTION_PROMPT,
     RECONSTRUCTION_PROMPT,
-    GENERATION_PROMPT
+    GENERATION_PROMPT,
+    CHUNK_DECONSTRUCTION_PROMPT,
+    CHUNK_MERGE_PROMPT
 )
+import concurrent.futures
+import hashlib
 import json
+import re
 
 
 # ========== 数据模型 ==========
@@ -21,6 +28,8 @@ class DeconstructionRequest(BaseModel):
     original_title: str
     original_content: str
     original_source: Optional[str] = None
+    chunked: Optional[bool] = None  # 分块拆解；None 表示按原文长度自动判断
+    force_reanalyze: bool = False  # 忽略已有拆解结果，强制重新分析
 
 
 class ConfigurationRequest(BaseModel):
@@ -35,11 +44,13 @@ class ConfigurationRequest(BaseModel):
 class PreviewRequest(BaseModel):
     """阶段三：预览请求"""
     project_id: int
+    use_memo: bool = False  # 拆解结果和新设定未变化时复用已有蓝图（需显式开启，默认每次重新生成）
 
 
 class GenerationRequest(BaseModel):
     """阶段四：生成请求"""
     project_id: int
+    use_memo: bool = False  # 蓝图和新设定未变化时复用已有正文（需显式开启，默认每次重新生成）
 
 
 # ========== 响应模型 ==========
@@ -49,6 +60,7 @@ class DeconstructionResponse(BaseModel):
     success: bool
     project_id: Optional[int] = None
     analysis: Optional[Dict[str, Any]] = None
+    reused_from: Optional[int] = None  # 复用了哪个项目的拆解结果
     message: Optional[str] = None
 
 
@@ -74,9 +86,19 @@ class GenerationResponse(BaseModel):
 
 # ========== 核心逻辑 ==========
 
+# 章节标题行：第一章 / 第12章 / 第三回 / Chapter 3
+CHAPTER_HEADING_PATTERN = re.compile(r"^\s*(第[0-9零一二两三四五六七八九十百千]+[章节回卷]|chapter\s*\d+)", re.IGNORECASE)
+
+
 class ImitationGenerator:
     """仿写生成器"""
 
+    CHUNK_THRESHOLD = 6000   # 原文超过该字数时自动分块拆解
+    CHUNK_SIZE = 4000        # 单块目标字数
+    CHUNK_WORKERS = 5        # 分块并行数
+    # 合并后拆解结果（deconstruction_result）必须包含的字段
+    MERGED_KEYS = ("emotional_peak", "core_emotion", "beat_sheet", "abstract_structure", "hook_techniques")
+
     def __init__(self, db):
         self.db = db
         self.ai_client = AIClientFactory.get_client()
@@ -85,19 +107,39 @@ class ImitationGenerator:
         """阶段一：深度拆解"""
 
         try:
-            # 调用AI进行拆解分析
-            messages = [{"role": "user", "content": DECONSTRUCTION_PROMPT + request.original_content}]
-
-            response = self.ai_client._call_api(
-                messages,
-                temperature=0.7,
-                max_tokens=3000
-            )
-
-            # 解析JSON响应
+            content_hash = compute_content_hash(request.original_content)
+            chunked = request.chunked
+            if chunked is None:
+                chunked = len(request.original_content) > self.CHUNK_THRESHOLD
+
+            # 相同原文已拆解过：直接复用结果
+            source = None
+            if not request.force_reanalyze:
+                source = self.db.query(ImitationProject).filter(
+                    ImitationProject.content_hash == content_hash,
+                    ImitationProject.deconstruction_result.isnot(None)
+                ).order_by(ImitationProject.id.desc()).first()
+
+            response = ""
             try:
-                # 尝试提取JSON
-                analysis = self._extract_json(response)
+                if source:
+                    print(f"♻️ 复用仿写项目 {source.id} 的拆解结果")
+                    analysis = source.deconstruction_result
+                elif chunked:
+                    # 长文：分块并行拆解后合并
+                    analysis = self._deconstruct_chunked(request.original_content)
+                else:
+                    # 调用AI进行拆解分析
+                    messages = [{"role": "user", "content": DECONSTRUCTION_PROMPT + request.original_content}]
+
+                    response = self.ai_client._call_api(
+                        messages,
+                        temperature=0.7,
+                        max_tokens=3000
+                    )
+
+                    # 尝试提取JSON
+                    analysis = self._extract_json(response)
 
                 # 创建仿写项目
                 project = ImitationProject(
@@ -105,6 +147,7 @@ class ImitationGenerator:
                     status="configuring",
                     original_title=request.original_title,
                     original_content=request.original_content,
+                    content_hash=content_hash,
                     original_source=request.original_source,
                     deconstruction_result=analysis
                 )
@@ -126,7 +169,8 @@ class ImitationGenerator:
                 return DeconstructionResponse(
                     success=True,
                     project_id=project.id,
-                    analysis=analysis
+                    analysis=analysis,
+                    reused_from=source.id if source else None
                 )
 
             except Exception as e:
@@ -204,31 +248,31 @@ class ImitationGenerator:
                 golden_finger=project.golden_finger
             )
 
-            # 调用AI生成蓝图
-            messages = [{"role": "user", "content": prompt}]
+            memo = StageMemo(self.db, ImitationStep)
+            fingerprint = compute_fingerprint("preview", {"prompt": prompt}, getattr(self.ai_client, "model", None))
+            hit = memo.lookup("preview", fingerprint) if request.use_memo else None
 
-            response = self.ai_client._call_api(
-                messages,
-                temperature=0.8,
-                max_tokens=4000
-            )
+            response = ""
+            if not hit:
+                # 调用AI生成蓝图
+                messages = [{"role": "user", "content": prompt}]
+
+                response = self.ai_client._call_api(
+                    messages,
+                    temperature=0.8,
+                    max_tokens=4000
+                )
 
             # 解析JSON响应
             try:
-                blueprint = self._extract_json(response)
+                blueprint = hit.step_data if hit else self._extract_json(response)
 
                 # 更新项目
                 project.reconstruction_blueprint = blueprint
                 project.status = "generating"
 
                 # 创建步骤记录
-                step = ImitationStep(
-                    project_id=project.id,
-                    step_name="preview",
-                    step_data=blueprint,
-                    status="completed"
-                )
-                self.db.add(step)
+                memo.record(project.id, "preview", blueprint, fingerprint)
 
                 self.db.commit()
 
@@ -276,27 +320,28 @@ class ImitationGenerator:
                 original_chapter=project.original_content[:1000]  # 只取前1000字作为风格参考
             )
 
-            # 调用AI生成正文
-            messages = [{"role": "user", "content": prompt}]
+            memo = StageMemo(self.db, ImitationStep)
+            fingerprint = compute_fingerprint("generation", {"prompt": prompt}, getattr(self.ai_client, "model", None))
+            hit = memo.lookup("generation", fingerprint) if request.use_memo else None
 
-            response = self.ai_client._call_api(
-                messages,
-                temperature=0.85,
-                max_tokens=6000
-            )
+            if hit and (hit.step_data or {}).get("content"):
+                response = hit.step_data["content"]
+            else:
+                # 调用AI生成正文
+                messages = [{"role": "user", "content": prompt}]
+
+                response = self.ai_client._call_api(
+                    messages,
+                    temperature=0.85,
+                    max_tokens=6000
+                )
 
             # 更新项目
             project.generated_content = response
             project.status = "completed"
 
             # 创建步骤记录
-            step = ImitationStep(
-                project_id=project.id,
-                step_name="generation",
-                step_data={"word_count": len(response)},
-                status="completed"
-            )
-            self.db.add(step)
+            memo.record(project.id, "generation", {"word_count": len(response), "content": response}, fingerprint)
 
             self.db.commit()
 
@@ -310,6 +355,185 @@ class ImitationGenerator:
             traceback.print_exc()
             return GenerationResponse(success=False, message=str(e))
 
+    # ========== 长文分块拆解 ==========
+
+    def _split_chunks(self, content: str) -> List[str]:
+        """
+        按章节/段落边界切分原文
+
+        先按章节标题切开，超长章节再按段落累积到 CHUNK_SIZE；
+        章节是硬边界，修改某一章只会影响该章所在的分块
+        """
+        chapters, current = [], []
+        for line in content.split("\n"):
+            if CHAPTER_HEADING_PATTERN.match(line) and any(l.strip() for l in current):
+                chapters.append(current)
+                current = []
+            current.append(line)
+        if any(l.strip() for l in current):
+            chapters.append(current)
+
+        chunks = []
+        for lines in chapters:
+            buffer, size = [], 0
+            for line in lines:
+                if size + len(line) > self.CHUNK_SIZE and buffer:
+                    chunks.append("\n".join(buffer).strip())
+                    buffer, size = [], 0
+                buffer.append(line)
+                size += len(line) + 1
+            if buffer and "".join(buffer).strip():
+                chunks.append("\n".join(buffer).strip())
+        return chunks
+
+    @staticmethod
+    def _chunk_hash(chunk: str) -> str:
+        """分块缓存键：提示词变更时缓存自动失效"""
+        return hashlib.sha256((CHUNK_DECONSTRUCTION_PROMPT + chunk).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _as_number(value) -> float:
+        """模型给出的强度可能是 "8"、"8分" 之类的字符串，取不到数字时按 0 计"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        match = re.search(r"\d+(?:\.\d+)?", str(value or ""))
+        return float(match.group(0)) if match else 0
+
+    @classmethod
+    def _normalize_chunk(cls, result: Any) -> Dict[str, Any]:
+        """整理单块拆解结果：只保留对象形式的节拍，强度转为数字，缺失字段补空值"""
+        if not isinstance(result, dict):
+            raise ValueError("分块拆解结果不是JSON对象")
+        beats = []
+        for beat in result.get("beats") if isinstance(result.get("beats"), list) else []:
+            if isinstance(beat, dict):
+                beats.append({**beat, "content": str(beat.get("content") or ""),
+                              "emotion": str(beat.get("emotion") or ""),
+                              "intensity": cls._as_number(beat.get("intensity"))})
+        peak = result.get("emotional_peak") if isinstance(result.get("emotional_peak"), dict) else {}
+        hooks = result.get("hook_techniques") if isinstance(result.get("hook_techniques"), list) else []
+        return {
+            "beats": beats,
+            "emotional_peak": {**peak, "content": str(peak.get("content") or ""),
+                               "analysis": str(peak.get("analysis") or ""),
+                               "intensity": cls._as_number(peak.get("intensity"))},
+            "hook_techniques": [str(h) for h in hooks if isinstance(h, (str, int, float)) and str(h).strip()],
+            "summary": str(result.get("summary") or ""),
+        }
+
+    def _deconstruct_chunk(self, chunk: str) -> Dict[str, Any]:
+        """拆解单个分块（在线程池中执行，不访问数据库）"""
+        messages = [{"role": "user", "content": CHUNK_DECONSTRUCTION_PROMPT.format() + chunk}]
+        response = self.ai_client._call_api(messages, temperature=0.7, max_tokens=1500)
+        return self._normalize_chunk(self._extract_json(response))
+
+    def _deconstruct_chunked(self, content: str) -> Dict[str, Any]:
+        """分块并行拆解（map），再合并为完整拆解结果（reduce）"""
+        chunks = self._split_chunks(content)
+        hashes = [self._chunk_hash(c) for c in chunks]
+
+        cached = {}
+        for row in self.db.query(DeconstructionChunk).filter(DeconstructionChunk.content_hash.in_(set(hashes))).all():
+            try:
+                cached[row.content_hash] = self._normalize_chunk(row.result)
+            except ValueError:
+                # 早期未校验就写入的缓存，当作未命中重新拆解
+                continue
+        missing = {h: c for h, c in zip(hashes, chunks) if h not in cached}
+        print(f"🧩 分块拆解: 共{len(chunks)}块, 命中缓存{len(chunks) - len(missing)}块")
+
+        if missing:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.CHUNK_WORKERS) as executor:
+                futures = {executor.submit(self._deconstruct_chunk, c): h for h, c in missing.items()}
+                for future in concurrent.futures.as_completed(futures):
+                    h = futures[future]
+                    try:
+                        cached[h] = future.result()
+                    except Exception as e:
+                        # 单块失败不缓存，下次重跑时重新分析
+                        print(f"分块拆解失败: {e}")
+                        continue
+                    self.db.add(DeconstructionChunk(
+                        content_hash=h,
+                        char_count=len(missing[h]),
+                        result=cached[h]
+                    ))
+            try:
+                self.db.commit()
+            except Exception as e:
+                # 并发请求可能已写入相同分块，缓存写失败不影响本次结果
+                self.db.rollback()
+                print(f"分块缓存写入失败: {e}")
+
+        failed = sum(1 for h in hashes if h not in cached)
+        if failed:
+            # 只用部分分块合并会得到残缺的骨架；成功的分块已缓存，重试时只重跑失败的分块
+            raise ValueError(f"{failed}/{len(hashes)} 个分块拆解失败，拆解结果不完整，请重试")
+        return self._merge_chunk_results([cached[h] for h in hashes], hashes, cached)
+
+    def _merge_chunk_results(self, chunk_results: List[Dict[str, Any]], hashes: List[str],
+                             cached: Dict[str, Any]) -> Dict[str, Any]:
+        """把各分块结果合并为 deconstruction_result 结构，AI合并失败时按规则合并"""
+        compact = [
+            {
+                "chunk": i,
+                "summary": cached[h].get("summary", ""),
+                "beats": cached[h].get("beats", []),
+                "emotional_peak": cached[h].get("emotional_peak", {}),
+                "hook_techniques": cached[h].get("hook_techniques", [])
+            }
+            for i, h in enumerate(hashes, 1) if h in cached
+        ]
+        try:
+            prompt = CHUNK_MERGE_PROMPT.format(chunk_results=json.dumps(compact, ensure_ascii=False))
+            response = self.ai_client._call_api(
+                [{"role": "user", "content": prompt}],
+                temperature=0.5,
+                max_tokens=3000
+            )
+            merged = self._extract_json(response)
+            if not isinstance(merged, dict) or any(key not in merged for key in self.MERGED_KEYS):
+                raise ValueError("合并结果缺少 deconstruction_result 字段")
+            return merged
+        except Exception as e:
+            print(f"AI合并分块失败，按规则合并: {e}")
+
+        # 规则合并：情绪最高的分块作为爆点，节拍按位置四等分为起承转合
+        peak_idx, peak = 0, {}
+        for item in compact:
+            p = item["emotional_peak"] or {}
+            if p.get("intensity", 0) > peak.get("intensity", 0):
+                peak_idx, peak = item["chunk"], p
+
+        beats = [b for item in compact for b in item["beats"]]
+        phases = ["起", "承", "转", "合"]
+        beat_sheet = []
+        for n, phase in enumerate(phases):
+            part = beats[n * len(beats) // 4:(n + 1) * len(beats) // 4]
+            beat_sheet.append({
+                "phase": phase,
+                "content": "；".join(b.get("content", "") for b in part),
+                "emotion": part[-1].get("emotion", "") if part else ""
+            })
+
+        hooks = []
+        for item in compact:
+            for hook in item["hook_techniques"]:
+                if hook not in hooks:
+                    hooks.append(hook)
+
+        return {
+            "emotional_peak": {
+                "position": f"第{peak_idx}块",
+                "content": peak.get("content", ""),
+                "analysis": peak.get("analysis", "")
+            },
+            "core_emotion": compact[0]["summary"] if compact else "",
+            "beat_sheet": beat_sheet,
+            "abstract_structure": " → ".join(item["summary"] for item in compact if item["summary"]),
+            "hook_techniques": hooks
+        }
+
     def _extract_json(self, text: str) -> Dict[str, Any]:
         """从AI响应中提取JSON"""
 
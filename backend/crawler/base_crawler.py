@@ -1,10 +1,10 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Optional
-import requests
-import time
 import random
 from bs4 import BeautifulSoup
 from .content_extractor import EnhancedContentExtractor
+from .engine import domain_of, executor_for
+from .recorder import crawler_session
 
 
 class BaseCrawler(ABC):
@@ -17,7 +17,8 @@ class BaseCrawler(ABC):
         Args:
             cookies: 登录后的Cookie（可选）
         """
-        self.session = requests.Session()
+        # 按域名限速、共用连接池的会话（见 engine.py）；CRAWL_FIXTURES 可切换为录制或回放（见 recorder.py）
+        self.session = crawler_session()
         self.cookies = cookies
         if cookies:
             self.session.headers.update({"Cookie": cookies})
@@ -45,8 +46,8 @@ class BaseCrawler(ABC):
         })
 
     def _random_delay(self, min_sec: float = 2, max_sec: float = 5):
-        """随机延迟，避免被检测"""
-        time.sleep(random.uniform(min_sec, max_sec))
+        """随机延迟，避免被检测（推迟本站下一次请求，不阻塞当前线程）"""
+        self.session.throttle.defer(domain_of(getattr(self, "base_url", "")), random.uniform(min_sec, max_sec))
 
     @abstractmethod
     def search(self, keyword: str, limit: int = 20) -> List[Dict]:
@@ -77,7 +78,9 @@ class BaseCrawler(ABC):
 
     def batch_fetch(self, urls: List[str]) -> List[Dict]:
         """
-        批量获取内容
+        批量获取内容（按域名并发，请求间隔由会话调度）
+
+        供同步代码调用；在事件循环中请使用 engine.fetch_all
 
         Args:
             urls: URL列表
@@ -85,16 +88,15 @@ class BaseCrawler(ABC):
         Returns:
             内容列表
         """
-        results = []
-        for url in urls:
+        def fetch(url):
             try:
-                content = self.fetch_content(url)
-                if content:
-                    results.append(content)
-                self._random_delay()
+                return self.fetch_content(url)
             except Exception as e:
                 print(f"获取失败 {url}: {e}")
-        return results
+                return None
+
+        futures = [executor_for(domain_of(url)).submit(fetch, url) for url in urls]
+        return [content for content in (f.result() for f in futures) if content]
 
     def clean_html(self, html: str) -> str:
         """
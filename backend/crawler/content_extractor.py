@@ -1,13 +1,27 @@
 """增强的内容提取器 - 提供更高质量的文本提取功能"""
+import os
 import re
 from typing import Dict, Optional, List
 from bs4 import BeautifulSoup, Tag
 import html
 
+from .http_cache import cached_extraction
+
+try:
+    from .lxml_extractor import LxmlEngine
+except ImportError:  # 未安装 lxml 时只能用 BeautifulSoup
+    LxmlEngine = None
+
+# 抽取引擎：lxml（默认，结果与 bs4 一致，快一个数量级）或 bs4
+EXTRACTOR_ENGINE = os.getenv("EXTRACTOR_ENGINE", "lxml").lower()
+
 
 class EnhancedContentExtractor:
     """增强的内容提取器，支持多种网站结构的智能解析"""
 
+    # 抽取逻辑变更时加一，使按正文哈希缓存的旧结果失效
+    VERSION = 2
+
     # 无用元素标签
     USELESS_TAGS = [
         'script', 'style', 'iframe', 'noscript', 'header', 'footer',
@@ -47,12 +61,26 @@ class EnhancedContentExtractor:
         '.post-title', '.entry-title', 'h2.title'
     ]
 
-    def __init__(self):
-        """初始化提取器"""
+    # 作者选择器
+    AUTHOR_SELECTORS = [
+        '.author', '.post-author', '.writer', '.by-author',
+        '[class*="author"]', '[class*="writer"]',
+        'meta[name="author"]'
+    ]
+
+    def __init__(self, engine: str = EXTRACTOR_ENGINE):
+        """初始化提取器，engine 为 lxml 或 bs4"""
         self.pruned_selectors = (
             self.NAVIGATION_SELECTORS +
             self.AD_SELECTORS
         )
+        self._lxml = None
+        if engine == "lxml" and LxmlEngine:
+            try:
+                self._lxml = LxmlEngine(self)
+            except ValueError as e:  # 子类加了 lxml 引擎不支持的选择器
+                print(f"⚠️ {e}，改用 BeautifulSoup")
+        self.engine = "lxml" if self._lxml else "bs4"
 
     def extract(self, html_content: str, url: str = "") -> Dict[str, str]:
         """
@@ -67,7 +95,33 @@ class EnhancedContentExtractor:
         """
         if not html_content:
             return {"title": "", "content": "", "author": "", "word_count": 0}
+        # 抽取结果按正文哈希缓存，页面未变化时跳过解析
+        return cached_extraction(f"enhanced-{self.engine}-v{self.VERSION}", html_content,
+                                 lambda: self._extract(html_content))
+
+    def _extract(self, html_content: str) -> Dict[str, str]:
+        raw = self._extract_raw(html_content)
 
+        # 4. 清理和格式化文本
+        cleaned_content = self._clean_text(raw["content"])
+
+        return {
+            "title": raw["title"],
+            "content": cleaned_content,
+            "author": raw["author"],
+            "word_count": len(cleaned_content)
+        }
+
+    def _extract_raw(self, html_content: str) -> Dict[str, str]:
+        """解析页面，返回标题、作者和未清理的正文"""
+        if self._lxml:
+            try:
+                return self._lxml.extract(html_content)
+            except Exception as e:
+                print(f"⚠️ lxml 解析失败，改用 BeautifulSoup: {e}")
+        return self._extract_bs4(html_content)
+
+    def _extract_bs4(self, html_content: str) -> Dict[str, str]:
         soup = BeautifulSoup(html_content, 'html.parser')
 
         # 1. 预处理：移除无用元素
@@ -79,18 +133,10 @@ class EnhancedContentExtractor:
         # 3. 提取正文内容
         content = self._extract_main_content(soup)
 
-        # 4. 清理和格式化文本
-        cleaned_content = self._clean_text(content)
-
         # 5. 提取作者（如果可能）
         author = self._extract_author(soup)
 
-        return {
-            "title": title,
-            "content": cleaned_content,
-            "author": author,
-            "word_count": len(cleaned_content)
-        }
+        return {"title": title, "content": content, "author": author}
 
     def _remove_useless_elements(self, soup: BeautifulSoup):
         """移除无用的HTML元素"""
@@ -210,8 +256,8 @@ class EnhancedContentExtractor:
                     paragraphs.append(text)
             elif child.name == 'br':
                 paragraphs.append("")
-            elif isinstance(child, str) and child.strip():
-                # 纯文本节点
+            elif isinstance(child, str) and child.strip() and not self._inside_p(child, element):
+                # 纯文本节点（p 内的文本已随 p 收集）
                 text = child.strip()
                 if text and len(text) > 10:
                     paragraphs.append(text)
@@ -225,6 +271,15 @@ class EnhancedContentExtractor:
         content = '\n\n'.join(p for p in paragraphs if p)
         return content
 
+    @staticmethod
+    def _inside_p(node, root: Tag) -> bool:
+        for parent in node.parents:
+            if parent is root:
+                return False
+            if parent.name == 'p':
+                return True
+        return False
+
     def _clean_text(self, text: str) -> str:
         """清理和格式化文本"""
         if not text:
@@ -234,7 +289,7 @@ class EnhancedContentExtractor:
         text = html.unescape(text)
 
         # 移除多余的空白
-        text = re.sub(r'\s+', ' ', text)  # 多个空格替换为一个
+        text = re.sub(r'[^\S\n]+', ' ', text)  # 多个空格替换为一个（保留换行，否则整篇成为一行）
         text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)  # 多个空行替换为两个
 
         # 移除常见的无用文本
@@ -266,13 +321,7 @@ class EnhancedContentExtractor:
 
     def _extract_author(self, soup: BeautifulSoup) -> str:
         """提取作者信息"""
-        author_selectors = [
-            '.author', '.post-author', '.writer', '.by-author',
-            '[class*="author"]', '[class*="writer"]',
-            'meta[name="author"]'
-        ]
-
-        for selector in author_selectors:
+        for selector in self.AUTHOR_SELECTORS:
             element = soup.select_one(selector)
             if element:
                 if element.name == 'meta':
@@ -0,0 +1,147 @@
+"""
+并发抓取引擎 - 各平台同时抓取，同一域名限制并发数和请求间隔
+
+原先每个爬虫请求后 time.sleep(2-5 秒) 并逐条抓取，夜间任务总时长是所有平台耗时之和。
+- 所有爬虫共用一个连接池（HTTPAdapter，keep-alive），请求头/Cookie 仍由各自的会话维护
+- 每个域名一个线程池，线程数即该域名的并发上限，慢域名不会占满其他域名的线程
+- 请求间隔按域名调度：请求发出前领取该域名的下一个发车时间，只有同域名的请求需要等待；
+  爬虫里的 _random_delay 只推迟该域名的下一个发车时间，不再阻塞当前线程
+- GET 请求经 http_cache 落盘缓存，命中新鲜缓存的请求不排队
+- 事件循环只负责分发，总耗时取决于最慢的域名
+
+爬虫解析代码保持同步（requests + BeautifulSoup），阻塞部分在各域名的工作线程中执行
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from .http_cache import CachedSession
+
+CRAWL_DOMAIN_CONCURRENCY = int(os.getenv("CRAWL_DOMAIN_CONCURRENCY", "2"))
+# 同一域名两次请求发出的最小间隔（秒，区间内随机）
+CRAWL_DOMAIN_INTERVAL = tuple(float(x) for x in os.getenv("CRAWL_DOMAIN_INTERVAL", "1,3").split(","))
+
+# 反爬较严的域名单独限制: 域名 -> (并发数, (最小间隔, 最大间隔))
+DOMAIN_POLICIES: Dict[str, Tuple[int, Tuple[float, float]]] = {
+    "www.zhihu.com": (1, (2, 5)),
+    "www.xiaohongshu.com": (1, (3, 6)),
+}
+
+# 所有爬虫会话共用的连接池
+SHARED_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=max(
+    [CRAWL_DOMAIN_CONCURRENCY] + [c for c, _ in DOMAIN_POLICIES.values()]
+))
+
+
+def domain_of(url: str) -> str:
+    return urlsplit(url or "").netloc.lower()
+
+
+def policy(domain: str) -> Tuple[int, Tuple[float, float]]:
+    return DOMAIN_POLICIES.get(domain, (CRAWL_DOMAIN_CONCURRENCY, CRAWL_DOMAIN_INTERVAL))
+
+
+# ========== 请求间隔 ==========
+
+class _DomainState:
+    def __init__(self, interval: Tuple[float, float]):
+        self.interval = interval
+        self.next_start = 0.0
+        self.requests = 0
+        self.waited = 0.0
+
+
+class DomainThrottle:
+    """按域名调度请求发出时间（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._domains: Dict[str, _DomainState] = {}
+
+    def _state(self, domain: str) -> _DomainState:
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains.setdefault(domain, _DomainState(policy(domain)[1]))
+        return state
+
+    def wait_turn(self, domain: str):
+        """领取发车时间并等待到点（只阻塞当前工作线程）"""
+        with self._lock:
+            state = self._state(domain)
+            now = time.monotonic()
+            start = max(now, state.next_start)
+            state.next_start = start + random.uniform(*state.interval)
+            state.requests += 1
+            state.waited += start - now
+        if start > now:
+            time.sleep(start - now)
+
+    def defer(self, domain: str, seconds: float):
+        """把该域名的下一个发车时间推迟到至少 seconds 秒之后"""
+        with self._lock:
+            state = self._state(domain)
+            state.next_start = max(state.next_start, time.monotonic() + seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {domain: {"requests": s.requests, "waited": round(s.waited, 2)}
+                    for domain, s in self._domains.items()}
+
+
+throttle = DomainThrottle()
+
+
+class PoliteSession(CachedSession):
+    """按域名限速的会话，连接池与其他爬虫共用；GET 经落盘缓存，命中新鲜缓存时不占限速名额"""
+
+    def __init__(self, domain_throttle: Optional[DomainThrottle] = None):
+        super().__init__()
+        self.throttle = domain_throttle or throttle
+        self.mount("http://", SHARED_ADAPTER)
+        self.mount("https://", SHARED_ADAPTER)
+
+    def _send_network(self, request, **kwargs):
+        self.throttle.wait_turn(domain_of(request.url))
+        return super()._send_network(request, **kwargs)
+
+
+# ========== 分发 ==========
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def executor_for(domain: str) -> ThreadPoolExecutor:
+    """域名专属线程池，线程数即并发上限"""
+    with _executors_lock:
+        executor = _executors.get(domain)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=policy(domain)[0], thread_name_prefix=f"crawl-{domain}")
+            _executors[domain] = executor
+        return executor
+
+
+async def run_on_domain(domain: str, fn: Callable, *args, **kwargs) -> Any:
+    """在该域名的工作线程中执行阻塞调用"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor_for(domain), lambda: fn(*args, **kwargs))
+
+
+async def fetch_all(crawler, urls: List[str]) -> List[Optional[Dict]]:
+    """并发获取正文，结果与 urls 一一对应，失败为 None"""
+    async def fetch(url):
+        try:
+            return await run_on_domain(domain_of(url), crawler.fetch_content, url) or None
+        except Exception as e:
+            print(f"获取失败 {url}: {e}")
+            return None
+
+    return list(await asyncio.gather(*[fetch(url) for url in urls]))
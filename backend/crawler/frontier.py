@@ -0,0 +1,212 @@
+"""
+持久化抓取队列（frontier）- 断点续抓、布隆过滤器判重、按页面变化频率自适应重抓
+
+- 列表页发现的正文链接写入 crawl_frontier 表（优先级、下次抓取时间、失败次数），
+  抓取结果逐批提交；任务中断后，未抓取的链接仍在表中到期待抓，下次运行（或调度器启动时）接着抓
+- 已知链接（队列 + 语料表）的 URL 哈希在启动时装入内存布隆过滤器：不在过滤器中的链接一定是新的，
+  直接入队不查库；可能已见过的才查库确认（误判率 BLOOM_ERROR_RATE）
+- 每次抓到正文比较哈希：有变化则重抓间隔减半，无变化则加倍（RECRAWL_MIN_INTERVAL ~ RECRAWL_MAX_INTERVAL）；
+  失败按指数退避重试，连续失败 FRONTIER_MAX_RETRIES 次后不再抓取
+
+用法:
+    frontier.enqueue(db, "晋江", results)            # 列表页结果 [{"url", "title"}]，按排名定优先级
+    for entry in frontier.due(db, "晋江", 50):
+        ...抓取...
+        frontier.record_success(entry, content)     # 返回 new / changed / unchanged
+        frontier.record_failure(entry, error)
+    db.commit()
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from backend.database.bulk import bulk_insert
+from backend.database.corpus_store import url_hash
+from backend.database.models import Corpus, CrawlFrontier
+
+RECRAWL_INITIAL_INTERVAL = 86400
+RECRAWL_MIN_INTERVAL = int(os.getenv("RECRAWL_MIN_INTERVAL", str(6 * 3600)))
+RECRAWL_MAX_INTERVAL = int(os.getenv("RECRAWL_MAX_INTERVAL", str(30 * 86400)))
+FRONTIER_MAX_RETRIES = int(os.getenv("FRONTIER_MAX_RETRIES", "5"))
+RETRY_BACKOFF = 600  # 第 n 次失败后等待 RETRY_BACKOFF * 2^(n-1) 秒
+
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = 0.001
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def content_hash(content: str) -> str:
+    """正文哈希（忽略空白差异）"""
+    return hashlib.sha1(_WHITESPACE.sub("", content or "").encode("utf-8")).hexdigest()
+
+
+# ========== 布隆过滤器 ==========
+
+class BloomFilter:
+    """URL 哈希的布隆过滤器：不在其中的一定没见过，在其中的可能见过"""
+
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, h: str) -> List[int]:
+        # URL 哈希本身是 sha1，取两段做双重哈希
+        a, b = int(h[:16], 16), int(h[16:32], 16) | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, h: str):
+        for p in self._positions(h):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, h: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(h))
+
+
+# ========== 队列 ==========
+
+class Frontier:
+    """抓取队列（线程安全）；布隆过滤器在首次使用时从数据库重建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+
+    def load(self, db) -> int:
+        """从队列表和语料表重建布隆过滤器，返回已知链接数"""
+        hashes = {h for (h,) in db.query(CrawlFrontier.url_hash)}
+        hashes.update(h for (h,) in db.query(Corpus.url_hash).filter(Corpus.url_hash.isnot(None)))
+        bloom = BloomFilter(max(BLOOM_CAPACITY, len(hashes) * 2))
+        for h in hashes:
+            bloom.add(h)
+        with self._lock:
+            self._bloom = bloom
+        return bloom.count
+
+    def _seen_maybe(self, db, hashes: List[str]) -> List[bool]:
+        with self._lock:
+            bloom = self._bloom
+        if bloom is None:
+            self.load(db)
+            bloom = self._bloom
+        return [h in bloom for h in hashes]
+
+    def _remember(self, db, hashes: Iterable[str]):
+        with self._lock:
+            for h in hashes:
+                self._bloom.add(h)
+            full = self._bloom.count > self._bloom.capacity
+        if full:
+            self.load(db)
+
+    def enqueue(self, db, source: str, items: List[Dict], priority: Optional[int] = None) -> int:
+        """
+        列表页结果入队（不提交），返回新入队条数
+
+        已在队列或已入库的链接跳过；priority 为空时按排名（越靠前越大）
+        """
+        candidates: Dict[str, Dict] = {}
+        for rank, item in enumerate(items):
+            h = url_hash(item.get("url", ""))
+            if h and h not in candidates:
+                candidates[h] = dict(item, rank=rank)
+        if not candidates:
+            return 0
+
+        hashes = list(candidates)
+        maybe = [h for h, seen in zip(hashes, self._seen_maybe(db, hashes)) if seen]
+        known = set()
+        if maybe:
+            # 布隆过滤器可能误判，查库确认
+            with db.no_autoflush:
+                known.update(h for (h,) in db.query(CrawlFrontier.url_hash).filter(CrawlFrontier.url_hash.in_(maybe)))
+                known.update(h for (h,) in db.query(Corpus.url_hash).filter(Corpus.url_hash.in_(maybe)))
+
+        now = datetime.now()
+        rows = [
+            {"url_hash": h, "url": item["url"], "source": source, "title": (item.get("title") or "")[:500],
+             "priority": priority if priority is not None else len(items) - item["rank"],
+             "next_fetch_at": now, "retries": 0, "recrawl_interval": RECRAWL_INITIAL_INTERVAL,
+             "fetch_count": 0, "change_count": 0, "created_at": now}
+            for h, item in candidates.items() if h not in known
+        ]
+        bulk_insert(db, CrawlFrontier, rows)
+        self._remember(db, [row["url_hash"] for row in rows])
+        return len(rows)
+
+    def due(self, db, source: str, limit: int = 50, exclude: Iterable[int] = ()) -> List[CrawlFrontier]:
+        """该平台到期待抓的链接，新发现的优先；exclude 为已取出但结果尚未提交的队列ID"""
+        query = db.query(CrawlFrontier).filter(
+            CrawlFrontier.source == source,
+            CrawlFrontier.next_fetch_at <= datetime.now(),
+            CrawlFrontier.retries < FRONTIER_MAX_RETRIES,
+        )
+        if exclude:
+            query = query.filter(CrawlFrontier.id.notin_(list(exclude)))
+        return query.order_by(CrawlFrontier.priority.desc(), CrawlFrontier.next_fetch_at).limit(limit).all()
+
+    def pending_sources(self, db) -> List[str]:
+        """有到期链接的平台（用于启动时续抓）"""
+        return [s for (s,) in db.query(CrawlFrontier.source).filter(
+            CrawlFrontier.next_fetch_at <= datetime.now(),
+            CrawlFrontier.retries < FRONTIER_MAX_RETRIES,
+        ).distinct()]
+
+    @staticmethod
+    def record_success(entry: CrawlFrontier, content: str) -> str:
+        """
+        记录一次成功抓取并安排重抓，返回 new（首次抓到）/ changed / unchanged
+
+        页面有变化则重抓间隔减半，无变化则加倍
+        """
+        h = content_hash(content)
+        interval = entry.recrawl_interval or RECRAWL_INITIAL_INTERVAL
+        if entry.content_hash is None:
+            status = "new"
+        elif entry.content_hash != h:
+            status = "changed"
+            entry.change_count = (entry.change_count or 0) + 1
+            interval = max(RECRAWL_MIN_INTERVAL, interval // 2)
+        else:
+            status = "unchanged"
+            interval = min(RECRAWL_MAX_INTERVAL, interval * 2)
+
+        now = datetime.now()
+        entry.content_hash = h
+        entry.recrawl_interval = interval
+        entry.next_fetch_at = now + timedelta(seconds=interval)
+        entry.last_fetched_at = now
+        entry.fetch_count = (entry.fetch_count or 0) + 1
+        entry.retries = 0
+        entry.priority = 0
+        entry.last_error = None
+        return status
+
+    @staticmethod
+    def record_failure(entry: CrawlFrontier, error: str = ""):
+        """记录一次失败，按指数退避安排重试"""
+        entry.retries = (entry.retries or 0) + 1
+        entry.next_fetch_at = datetime.now() + timedelta(seconds=RETRY_BACKOFF * 2 ** (entry.retries - 1))
+        entry.last_error = (error or "未获取到正文")[:1000]
+
+    def stats(self, db) -> Dict[str, int]:
+        now = datetime.now()
+        query = db.query(CrawlFrontier)
+        return {
+            "total": query.count(),
+            "due": query.filter(CrawlFrontier.next_fetch_at <= now,
+                                CrawlFrontier.retries < FRONTIER_MAX_RETRIES).count(),
+            "failed": query.filter(CrawlFrontier.retries >= FRONTIER_MAX_RETRIES).count(),
+        }
+
+
+frontier = Frontier()
@@ -0,0 +1,292 @@
+"""
+HTTP 缓存 - 爬虫和例文抓取的响应落盘缓存，过期后用 ETag / Last-Modified 条件请求重新验证
+
+- 响应正文 zlib 压缩后存入本地 SQLite 文件（HTTP_CACHE_PATH），只缓存无跳转的 GET 200 响应
+- 新鲜期按域名配置（DOMAIN_FRESHNESS，其余域名 HTTP_CACHE_TTL 秒）：期内直接返回缓存，
+  不发请求也不占用域名限速名额；过期后带 If-None-Match / If-Modified-Since 请求，304 时沿用缓存正文
+- 多数站点对动态页面返回 no-cache，新鲜期不采用服务端 max-age；响应带 no-store 时不缓存
+- 正文抽取结果按正文哈希缓存（cached_extraction），页面未变化时跳过 HTML 解析
+- 缓存文件超过 HTTP_CACHE_MAX_MB 时按写入时间淘汰最旧的响应
+
+缓存命中的响应带 from_cache=True；异步客户端（page_fetcher）用 lookup / complete 共享同一缓存
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "./cache/http_cache.db")
+HTTP_CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", "3600"))
+HTTP_CACHE_MAX_MB = int(os.getenv("HTTP_CACHE_MAX_MB", "512"))
+
+# 各域名的新鲜期（秒），0 表示每次都发条件请求
+DOMAIN_FRESHNESS: Dict[str, int] = {
+    "www.zhihu.com": 600,          # 搜索结果变化快
+    "www.xiaohongshu.com": 600,
+    "www.jjwxc.net": 6 * 3600,     # 榜单和书页每天更新一次左右
+    "www.qidian.com": 6 * 3600,
+    "b.faloo.com": 6 * 3600,
+    "www.17k.com": 6 * 3600,
+}
+
+EXTRACTION_KEEP_DAYS = 30      # 抽取结果超过该天数未命中即清理
+_PRUNE_EVERY = 200             # 每写入多少条响应检查一次文件大小
+# 解压后的正文不再对应这些头
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+def freshness(url: str) -> int:
+    return DOMAIN_FRESHNESS.get(urlsplit(url or "").netloc.lower(), HTTP_CACHE_TTL)
+
+
+def body_hash(body: Union[bytes, str]) -> str:
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class HttpCache:
+    """落盘 HTTP 缓存（线程安全，单个连接加锁）"""
+
+    def __init__(self, path: str = HTTP_CACHE_PATH, max_bytes: int = HTTP_CACHE_MAX_MB * 1024 * 1024):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                fresh_until REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_stored_at ON responses (stored_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                used_at REAL NOT NULL
+            )""")
+        self._writes = 0
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "extraction_hits": 0}
+
+    # ========== 响应 ==========
+
+    @staticmethod
+    def key_for(method: str, url: str, cookie: str = "") -> str:
+        # 带 Cookie 的请求内容可能因账号不同，Cookie 计入键
+        return hashlib.sha1(f"{method} {url}\n{cookie}".encode("utf-8")).hexdigest()
+
+    def send(self, request: requests.PreparedRequest,
+             send: Callable[[requests.PreparedRequest], requests.Response]) -> requests.Response:
+        """经缓存发送 GET 请求：新鲜则直接返回，过期则条件请求，304 沿用缓存"""
+        key = self.key_for(request.method, request.url, request.headers.get("Cookie", ""))
+        entry, fresh = self.lookup(key)
+        if fresh:
+            return self._build_response(request, entry)
+
+        conditional = {}
+        if entry is not None and "If-None-Match" not in request.headers \
+                and "If-Modified-Since" not in request.headers:
+            conditional = self.conditional_headers(entry)
+            request.headers.update(conditional)
+
+        response = send(request)
+        cached = self.complete(key, entry if conditional else None, request.url, response.url,
+                               response.status_code, bool(response.history), response.headers,
+                               lambda: response.content)
+        if cached is not None:
+            return self._build_response(request, cached)
+        return response
+
+    def lookup(self, key: str) -> Tuple[Optional[tuple], bool]:
+        """返回 (缓存条目, 是否新鲜)，新鲜的条目计入命中"""
+        with self._lock:
+            entry = self._conn.execute(
+                "SELECT url, headers, body, etag, last_modified, fresh_until FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        fresh = entry is not None and entry[5] > time.time()
+        if fresh:
+            self.stats["hits"] += 1
+        return entry, fresh
+
+    @staticmethod
+    def conditional_headers(entry: tuple) -> Dict[str, str]:
+        """重新验证过期条目的条件请求头"""
+        headers = {}
+        if entry[3]:
+            headers["If-None-Match"] = entry[3]
+        if entry[4]:
+            headers["If-Modified-Since"] = entry[4]
+        return headers
+
+    def complete(self, key: str, entry: Optional[tuple], url: str, final_url: str, status: int,
+                 redirected: bool, headers, content: Callable[[], bytes]) -> Optional[tuple]:
+        """
+        处理网络响应：条件请求（entry 非空）得到 304 时刷新新鲜期并返回更新后的缓存条目；
+        无跳转的 200 响应存入缓存，返回 None
+        """
+        now = time.time()
+        if entry is not None and status == 304:
+            self.stats["revalidated"] += 1
+            merged = json.loads(entry[1])
+            merged.update(self._headers(headers))
+            etag = headers.get("ETag") or entry[3]
+            last_modified = headers.get("Last-Modified") or entry[4]
+            fresh_until = now + freshness(url)
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE responses SET headers = ?, etag = ?, last_modified = ?, fresh_until = ? WHERE key = ?",
+                    (json.dumps(merged), etag, last_modified, fresh_until, key),
+                )
+            return entry[0], json.dumps(merged), entry[2], etag, last_modified, fresh_until
+
+        self.stats["misses"] += 1
+        if status == 200 and not redirected and self._storable(headers):
+            self._store(key, url, final_url, headers, content(), now)
+        return None
+
+    @staticmethod
+    def _headers(headers) -> Dict[str, str]:
+        return {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}
+
+    @staticmethod
+    def _storable(headers) -> bool:
+        cache_control = headers.get("Cache-Control", "").lower()
+        return "no-store" not in cache_control and "private" not in cache_control
+
+    def _store(self, key: str, url: str, final_url: str, headers, content: bytes, now: float):
+        body = zlib.compress(content, 6)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, headers, body, size, etag, last_modified, stored_at, fresh_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, final_url, json.dumps(self._headers(headers)), body, len(body),
+                 headers.get("ETag"), headers.get("Last-Modified"), now, now + freshness(url)),
+            )
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        self.stats["stored"] += 1
+        if prune:
+            self.prune()
+
+    @staticmethod
+    def unpack(entry: tuple) -> Tuple[str, CaseInsensitiveDict, bytes]:
+        """缓存条目的 (最终 URL, 响应头, 解压后的正文)"""
+        return entry[0], CaseInsensitiveDict(json.loads(entry[1])), zlib.decompress(entry[2])
+
+    @classmethod
+    def _build_response(cls, request: requests.PreparedRequest, entry) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url, response.headers, response._content = cls.unpack(entry)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.request = request
+        response.from_cache = True
+        return response
+
+    def prune(self):
+        """超过容量时按写入时间淘汰到容量的 80%，并清理长期未命中的抽取结果"""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - int(self.max_bytes * 0.8)
+                self._conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, size, SUM(size) OVER (ORDER BY stored_at) AS running FROM responses
+                        ) WHERE running - size < ?
+                    )""", (excess,))
+            self._conn.execute("DELETE FROM extractions WHERE used_at < ?",
+                               (time.time() - EXTRACTION_KEEP_DAYS * 86400,))
+
+    # ========== 抽取结果 ==========
+
+    def cached_extraction(self, namespace: str, body: Union[bytes, str], extract: Callable[[], Any]) -> Any:
+        """
+        按正文哈希缓存抽取结果（结果需可 JSON 序列化）
+
+        namespace 区分不同的抽取逻辑，抽取代码变更时应修改其版本号
+        """
+        key = f"{namespace}:{body_hash(body)}"
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE extractions SET used_at = ? WHERE key = ?", (time.time(), key))
+        if row is not None:
+            self.stats["extraction_hits"] += 1
+            return json.loads(row[0])
+        result = extract()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO extractions (key, result, used_at) VALUES (?, ?, ?)",
+                               (key, json.dumps(result, ensure_ascii=False), time.time()))
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            responses, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            extractions = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+        return {**self.stats, "responses": responses, "size_mb": round(size / 1024 / 1024, 2),
+                "extractions": extractions}
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[HttpCache]:
+    """全局缓存实例（首次使用时创建缓存文件）；HTTP_CACHE_ENABLED=false 时返回 None"""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def cached_extraction(namespace: str, body: Union[bytes, str], extract: Callable[[], Any]) -> Any:
+    """按正文哈希缓存抽取结果；缓存关闭时直接抽取"""
+    cache = get_cache()
+    if cache is None:
+        return extract()
+    return cache.cached_extraction(namespace, body, extract)
+
+
+class CachedSession(requests.Session):
+    """GET 请求经落盘缓存的会话；stream=True 的请求不缓存"""
+
+    def __init__(self, cache: Optional[HttpCache] = None):
+        super().__init__()
+        self.cache = cache
+
+    def send(self, request, **kwargs):
+        cache = self.cache or get_cache()
+        if cache is None or request.method != "GET" or kwargs.get("stream"):
+            return self._send_network(request, **kwargs)
+        return cache.send(request, lambda req: self._send_network(req, **kwargs))
+
+    def _send_network(self, request, **kwargs):
+        """实际发出请求（子类在此加限速）"""
+        return super().send(request, **kwargs)
@@ -0,0 +1,205 @@
+"""
+例文页面抓取 - 异步下载任意网页并抽取正文（/api/fetch-content）
+
+- httpx 异步客户端流式下载，正文超过 FETCH_MAX_MB 立即中止；单个 URL 总耗时不超过 FETCH_TIMEOUT 秒，
+  慢站点只拖慢自己的结果，不占用事件循环，也不影响同批和其他请求
+- 编码依次取自 Content-Type、BOM、<meta charset>，都没有时先试 UTF-8 再用 charset_normalizer 检测；
+  GB2312 / GBK 按其超集 GB18030 解码
+- 正文抽取用共享的 EnhancedContentExtractor，在进程池中执行（编码检测和 HTML 解析是 CPU 密集型）
+- GET 响应经落盘 HTTP 缓存（http_cache），抽取结果按正文哈希缓存
+"""
+
+import asyncio
+import codecs
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import charset_normalizer
+import httpx
+
+from .content_extractor import EnhancedContentExtractor
+from .http_cache import HttpCache, get_cache
+
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_MB", "5")) * 1024 * 1024
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "20"))          # 单个 URL 下载总时限（秒）
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "5"))      # 一次请求内同时下载的 URL 数
+FETCH_EXTRACT_WORKERS = int(os.getenv("FETCH_EXTRACT_WORKERS", "2"))
+FETCH_MAX_URLS = 20            # 一次请求最多抓取的 URL 数
+MIN_WORDS = 50                 # 正文少于该字数视为提取失败
+
+FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+}
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.I)
+_ENCODING_ALIASES = {"gb2312": "gb18030", "gbk": "gb18030", "x-gbk": "gb18030"}
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+
+class FetchError(Exception):
+    """页面无法下载（HTTP 错误、超出大小上限）"""
+
+
+# ========== 编码检测 ==========
+
+def _normalize_encoding(name) -> Optional[str]:
+    """规范化编码名，Python 不认识的返回 None"""
+    if isinstance(name, bytes):
+        name = name.decode("ascii", "ignore")
+    if not name:
+        return None
+    name = name.strip().strip("\"'").lower()
+    name = _ENCODING_ALIASES.get(name, name)
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return name
+
+
+def sniff_encoding(body: bytes, content_type: str = "") -> str:
+    """按 Content-Type、BOM、<meta charset>、UTF-8 试解码、charset_normalizer 的顺序确定编码"""
+    match = re.search(r"charset\s*=\s*([\w.:\"'-]+)", content_type or "", re.I)
+    encoding = _normalize_encoding(match.group(1)) if match else None
+    if encoding:
+        return encoding
+    for bom, name in _BOMS:
+        if body.startswith(bom):
+            return name
+    match = _META_CHARSET.search(body[:4096])
+    encoding = _normalize_encoding(match.group(1)) if match else None
+    if encoding:
+        return encoding
+    try:
+        body.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    best = charset_normalizer.from_bytes(body[:65536]).best()
+    return _normalize_encoding(best.encoding if best else None) or "utf-8"
+
+
+# ========== 正文抽取（进程池） ==========
+
+_extractor: Optional[EnhancedContentExtractor] = None
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def extract_page(body: bytes, content_type: str, url: str) -> Dict[str, str]:
+    """在工作进程中解码并抽取正文"""
+    global _extractor
+    if _extractor is None:
+        _extractor = EnhancedContentExtractor()
+    html = body.decode(sniff_encoding(body, content_type), errors="replace")
+    return _extractor.extract(html, url)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max(1, FETCH_EXTRACT_WORKERS), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown():
+    """关闭抽取进程池（应用退出时调用）"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _extract(body: bytes, content_type: str, url: str) -> Dict[str, str]:
+    global _pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), extract_page, body, content_type, url)
+    except BrokenProcessPool:
+        # 工作进程异常退出（如内存不足被杀）后重建进程池，本次结果按失败处理
+        _pool = None
+        raise
+
+
+# ========== 下载 ==========
+
+async def _download(client: httpx.AsyncClient, url: str) -> Tuple[bytes, str, str]:
+    """流式下载页面，返回 (正文, Content-Type, 最终 URL)；新鲜的缓存直接返回，过期的发条件请求"""
+    cache = get_cache()
+    key = HttpCache.key_for("GET", url)
+    entry, conditional = None, {}
+    if cache is not None:
+        entry, fresh = await asyncio.to_thread(cache.lookup, key)
+        if fresh:
+            final_url, headers, body = await asyncio.to_thread(HttpCache.unpack, entry)
+            return body, headers.get("Content-Type", ""), final_url
+        if entry is not None:
+            conditional = HttpCache.conditional_headers(entry)
+
+    async with client.stream("GET", url, headers=conditional) as response:
+        if response.status_code >= 400:
+            raise FetchError(f"HTTP {response.status_code}")
+        if int(response.headers.get("Content-Length") or 0) > FETCH_MAX_BYTES:
+            raise FetchError(f"页面超过 {FETCH_MAX_BYTES // 1024 // 1024} MB")
+        chunks, size = [], 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > FETCH_MAX_BYTES:
+                raise FetchError(f"页面超过 {FETCH_MAX_BYTES // 1024 // 1024} MB")
+            chunks.append(chunk)
+    body = b"".join(chunks)
+
+    if cache is not None:
+        cached = await asyncio.to_thread(
+            cache.complete, key, entry if conditional else None, url, str(response.url),
+            response.status_code, bool(response.history), response.headers, lambda: body)
+        if cached is not None:
+            final_url, headers, body = await asyncio.to_thread(HttpCache.unpack, cached)
+            return body, headers.get("Content-Type", ""), final_url
+    return body, response.headers.get("Content-Type", ""), str(response.url)
+
+
+async def fetch_article(client: httpx.AsyncClient, url: str) -> Dict:
+    """抓取单个页面并抽取正文；失败时返回 success=False 和原因，不抛异常"""
+    try:
+        body, content_type, final_url = await asyncio.wait_for(_download(client, url), FETCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"url": url, "success": False, "error": f"无法获取页面: {FETCH_TIMEOUT:g} 秒内未下载完成"}
+    except (httpx.HTTPError, httpx.InvalidURL, FetchError) as e:
+        return {"url": url, "success": False, "error": f"无法获取页面: {str(e) or type(e).__name__}"}
+
+    try:
+        article = await _extract(body, content_type, final_url)
+    except Exception as e:
+        return {"url": url, "success": False, "error": f"提取失败: {str(e)}"}
+
+    word_count = article["word_count"]
+    if word_count < MIN_WORDS:
+        return {"url": url, "success": False, "error": f"提取内容过少（{word_count}字），该网站可能不支持自动提取"}
+    return {
+        "url": url,
+        "success": True,
+        "title": article["title"],
+        "content": article["content"],
+        "author": article["author"],
+        "word_count": word_count,
+    }
+
+
+async def fetch_articles(urls: List[str]) -> List[Dict]:
+    """并发抓取多个页面（同时最多 FETCH_CONCURRENCY 个），结果与 urls 顺序一致"""
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    timeout = httpx.Timeout(10.0, connect=5.0)
+
+    async with httpx.AsyncClient(headers=FETCH_HEADERS, timeout=timeout, follow_redirects=True) as client:
+        async def fetch(url: str) -> Dict:
+            async with semaphore:
+                return await fetch_article(client, url)
+
+        return await asyncio.gather(*(fetch(url) for url in urls))
@@ -107,17 +107,18 @@ class QidianCrawler(BaseCrawler):
 
         return results
 
-    def get_hot_list(self, limit: int = 30) -> List[Dict]:
+    def get_hot_list(self, category: str = "xuanhuan", limit: int = 30) -> List[Dict]:
         """
-        获取起点热榜（综合热榜）
+        获取起点热榜（与其他平台爬虫的 get_hot_list 参数一致）
 
         Args:
+            category: 分类，同 get_ranking
             limit: 数量限制
 
         Returns:
             热门小说列表
         """
-        return self.get_ranking("xuanhuan", limit)
+        return self.get_ranking(category, limit)
 
     def search(self, keyword: str, limit: int = 20) -> List[Dict]:
         """
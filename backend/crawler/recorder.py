@@ -0,0 +1,148 @@
+"""
+请求录制与回放 - 把爬虫会话的响应存入夹具目录，之后离线原样回放
+
+- CRAWL_FIXTURES=record：照常联网抓取（仍按域名限速，不走 HTTP 缓存），每个响应写入 CRAWL_FIXTURES_DIR
+- CRAWL_FIXTURES=replay：不联网、不限速，按请求方法 + URL（+ 请求体）从夹具目录取响应，结果可重复；
+  没有录到的请求抛出 FixtureMissing（ConnectionError 的子类，爬虫按网络失败处理）
+- 每个响应两个文件：<域名>/<键>.json（请求、状态码、响应头）和 <域名>/<键>.body（原始正文）
+
+用于离线复现爬虫解析问题、测量解析性能（bench_crawlers.py）
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import List, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .engine import DomainThrottle, PoliteSession, domain_of
+from .http_cache import _DROP_HEADERS
+
+CRAWL_FIXTURES = os.getenv("CRAWL_FIXTURES", "").lower()  # record / replay，留空为正常联网
+CRAWL_FIXTURES_DIR = os.getenv("CRAWL_FIXTURES_DIR", "./fixtures/crawlers")
+
+
+class FixtureMissing(requests.ConnectionError):
+    """回放时夹具目录中没有该请求"""
+
+
+class FixtureStore:
+    """夹具目录（线程安全）"""
+
+    def __init__(self, directory: str = CRAWL_FIXTURES_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0, "replayed": 0, "missing": 0}
+        self.missing: List[str] = []
+
+    @staticmethod
+    def key(request: requests.PreparedRequest) -> str:
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        return hashlib.sha1(f"{request.method} {request.url}\n".encode("utf-8") + body).hexdigest()[:20]
+
+    def _path(self, request: requests.PreparedRequest) -> str:
+        """不含扩展名的夹具路径"""
+        return os.path.join(self.directory, domain_of(request.url) or "_", self.key(request))
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response):
+        path = self._path(request)
+        meta = {
+            "method": request.method,
+            "url": request.url,
+            "final_url": response.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS},
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            with open(path + ".body", "wb") as f:
+                f.write(response.content)
+            with open(path + ".json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=1)
+            self.stats["recorded"] += 1
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        path = self._path(request)
+        try:
+            with open(path + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(path + ".body", "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.stats["missing"] += 1
+                self.missing.append(f"{request.method} {request.url}")
+            raise FixtureMissing(f"没有录制该请求: {request.method} {request.url}", request=request)
+
+        response = requests.Response()
+        response.status_code = meta["status"]
+        response.reason = meta.get("reason") or ""
+        response.url = meta.get("final_url") or meta["url"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response._content = body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.request = request
+        response.from_fixture = True
+        with self._lock:
+            self.stats["replayed"] += 1
+        return response
+
+    def count(self) -> int:
+        """已录制的响应数"""
+        total = 0
+        for _, _, files in os.walk(self.directory):
+            total += sum(1 for name in files if name.endswith(".json"))
+        return total
+
+
+class RecordingSession(PoliteSession):
+    """联网抓取并录制响应；不走 HTTP 缓存，录到的是站点的真实响应"""
+
+    def __init__(self, store: FixtureStore):
+        super().__init__()
+        self.store = store
+
+    def send(self, request, **kwargs):
+        response = self._send_network(request, **kwargs)
+        self.store.record(request, response)
+        return response
+
+
+class ReplaySession(PoliteSession):
+    """从夹具目录回放响应，不联网、不限速"""
+
+    def __init__(self, store: FixtureStore):
+        # 爬虫的 _random_delay 只推迟这个独立调度器，不影响联网的会话
+        super().__init__(DomainThrottle())
+        self.store = store
+
+    def send(self, request, **kwargs):
+        return self.store.replay(request)
+
+
+_store: Optional[FixtureStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> FixtureStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FixtureStore()
+        return _store
+
+
+def crawler_session() -> PoliteSession:
+    """爬虫会话：按 CRAWL_FIXTURES 录制、回放或正常联网"""
+    if CRAWL_FIXTURES == "record":
+        return RecordingSession(get_store())
+    if CRAWL_FIXTURES == "replay":
+        return ReplaySession(get_store())
+    return PoliteSession()
@@ -0,0 +1,442 @@
+"""
+正文块存储 - 大文本按内容哈希去重、压缩后存入 content_blobs 表
+
+章节正文会同时出现在 NovelProject.chapters / ChapterDraft.content /
+Manuscript.content / ManuscriptStep.step_data 中，且每个版本都存一份完整副本。
+这里在 ORM 层透明地处理：
+- 写入(flush)时：超过 BLOB_MIN_SIZE 的字符串替换为引用，正文只存一份并增加引用计数
+- 读取时：查询结果中的引用批量还原为原文（业务代码看到的仍是原文）
+- 删除/覆盖时：减少旧正文的引用计数，计数归零的块由 collect_garbage 回收
+
+引用格式：Text 列为 "@blob:<sha256>"，JSON 中为 {"@blob": "<sha256>"}
+安装 zstandard 时使用 zstd 压缩，否则使用 zlib；读取按每块记录的算法解压
+
+用法: python -m backend.database.blob_store [--stats] [--pack] [--recount] [--gc]
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value, flag_modified
+
+from backend.database.models import (
+    ContentBlob, NovelProject, ChapterDraft, Manuscript, ManuscriptStep, ImitationStep, ManuscriptVersion
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOB_STORE_ENABLED = os.getenv("BLOB_STORE_ENABLED", "true").lower() != "false"
+BLOB_MIN_SIZE = int(os.getenv("BLOB_MIN_SIZE", "1024"))           # 超过该字符数才外置
+BLOB_CACHE_CHARS = int(os.getenv("BLOB_CACHE_CHARS", "20000000"))  # 解压缓存上限(字符)
+
+TEXT_PREFIX = "@blob:"
+JSON_KEY = "@blob"
+
+# 使用正文块存储的模型 -> 字段
+BLOB_FIELDS = {
+    NovelProject: ("chapters",),
+    ChapterDraft: ("content",),
+    Manuscript: ("content",),
+    ManuscriptStep: ("step_data",),
+    ImitationStep: ("step_data",),
+    ManuscriptVersion: ("data",),
+}
+
+# 查询时加上 execution_options(blob_raw=True) 可跳过还原，直接拿到引用
+RAW_OPTION = "blob_raw"
+
+
+# ========== 压缩 ==========
+
+def _compress(raw: bytes):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("该正文块使用 zstd 压缩，请先安装: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def blob_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ========== 解压缓存（内容寻址，缓存永不失效，只按容量淘汰） ==========
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_chars = 0
+_cache_lock = threading.Lock()
+
+
+def _cache_get(h: str) -> Optional[str]:
+    with _cache_lock:
+        text = _cache.get(h)
+        if text is not None:
+            _cache.move_to_end(h)
+        return text
+
+
+def _cache_put(h: str, text: str):
+    global _cache_chars
+    if len(text) > BLOB_CACHE_CHARS:
+        return
+    with _cache_lock:
+        if h in _cache:
+            return
+        _cache[h] = text
+        _cache_chars += len(text)
+        while _cache_chars > BLOB_CACHE_CHARS:
+            _, old = _cache.popitem(last=False)
+            _cache_chars -= len(old)
+
+
+# ========== 引用的识别与替换 ==========
+
+def _is_json_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(JSON_KEY), str)
+
+
+def _is_text_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(TEXT_PREFIX) and len(value) == len(TEXT_PREFIX) + 64
+
+
+def _pack(value: Any, blobs: Dict[str, str], top_level: bool = True) -> Any:
+    """把大字符串替换为引用，被替换的正文记入 blobs"""
+    if isinstance(value, str):
+        if len(value) < BLOB_MIN_SIZE or _is_text_ref(value):
+            return value
+        h = blob_hash(value)
+        blobs[h] = value
+        return TEXT_PREFIX + h if top_level else {JSON_KEY: h}
+    if isinstance(value, dict):
+        if _is_json_ref(value):
+            return value
+        return {k: _pack(v, blobs, False) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_pack(v, blobs, False) for v in value]
+    return value
+
+
+def _unpack(value: Any, texts: Dict[str, str]) -> Any:
+    if _is_text_ref(value):
+        return texts[value[len(TEXT_PREFIX):]]
+    if _is_json_ref(value):
+        return texts[value[JSON_KEY]]
+    if isinstance(value, dict):
+        return {k: _unpack(v, texts) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unpack(v, texts) for v in value]
+    return value
+
+
+def _has_refs(value: Any) -> bool:
+    if _is_text_ref(value) or _is_json_ref(value):
+        return True
+    if isinstance(value, dict):
+        return any(_has_refs(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_has_refs(v) for v in value)
+    return False
+
+
+def _raw_refs(value: Any) -> List[str]:
+    """只收集引用（不把原文当作引用）"""
+    if _is_text_ref(value):
+        return [value[len(TEXT_PREFIX):]]
+    if _is_json_ref(value):
+        return [value[JSON_KEY]]
+    if isinstance(value, dict):
+        return [h for v in value.values() for h in _raw_refs(v)]
+    if isinstance(value, list):
+        return [h for v in value for h in _raw_refs(v)]
+    return []
+
+
+# ========== 存取 ==========
+
+def fetch_texts(connection, hashes: Iterable[str]) -> Dict[str, str]:
+    """批量读取正文块（优先走解压缓存）"""
+    texts, missing = {}, []
+    for h in set(hashes):
+        text = _cache_get(h)
+        if text is None:
+            missing.append(h)
+        else:
+            texts[h] = text
+    for i in range(0, len(missing), 500):
+        rows = connection.execute(
+            select(ContentBlob.content_hash, ContentBlob.codec, ContentBlob.data)
+            .where(ContentBlob.content_hash.in_(missing[i:i + 500]))
+        ).all()
+        for h, codec, data in rows:
+            text = _decompress(codec, data).decode("utf-8")
+            texts[h] = text
+            _cache_put(h, text)
+    lost = set(missing) - set(texts)
+    if lost:
+        raise LookupError(f"正文块缺失: {', '.join(sorted(lost))[:200]}")
+    return texts
+
+
+_UPSERT_DIALECTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def _add_ref(connection, h: str, text: Optional[str]):
+    """
+    引用计数 +1，块不存在时压缩写入
+
+    块已存在时一条 UPDATE 即可，不必压缩；不存在时用 INSERT … ON CONFLICT DO UPDATE 写入，
+    两个会话同时保存同一段新正文时，后到的一方变为计数 +1，而不是主键冲突导致整个保存回滚
+    """
+    bump = update(ContentBlob).where(ContentBlob.content_hash == h).values(ref_count=ContentBlob.ref_count + 1)
+    if connection.execute(bump).rowcount:
+        return
+    if text is None:
+        raise LookupError(f"正文块缺失: {h}")
+    raw = text.encode("utf-8")
+    codec, data = _compress(raw)
+    values = dict(content_hash=h, codec=codec, size=len(raw), stored_size=len(data), data=data, ref_count=1)
+    insert = _UPSERT_DIALECTS.get(connection.dialect.name)
+    if insert is None:
+        connection.execute(ContentBlob.__table__.insert().values(**values))
+    else:
+        stmt = insert(ContentBlob.__table__).values(**values)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[ContentBlob.content_hash],
+            set_={"ref_count": ContentBlob.__table__.c.ref_count + 1},
+        ))
+    _cache_put(h, text)
+
+
+def _release_ref(connection, h: str):
+    connection.execute(
+        update(ContentBlob)
+        .where(ContentBlob.content_hash == h, ContentBlob.ref_count > 0)
+        .values(ref_count=ContentBlob.ref_count - 1)
+    )
+
+
+def pack_row(connection, model, row: Dict[str, Any]) -> Dict[str, Any]:
+    """批量插入（不经过 flush）前外置行中的大文本，返回替换为引用后的新行"""
+    fields = BLOB_FIELDS.get(model)
+    if not BLOB_STORE_ENABLED or not fields:
+        return row
+    packed_row = dict(row)
+    for key in fields:
+        if key not in row:
+            continue
+        blobs: Dict[str, str] = {}
+        packed_row[key] = _pack(row[key], blobs)
+        for h in _raw_refs(packed_row[key]):
+            _add_ref(connection, h, blobs.get(h))
+    return packed_row
+
+
+def _stored_refs(connection, obj, key: str) -> List[str]:
+    """读取数据库中该字段当前保存的引用（旧值以库中为准，不依赖内存状态）"""
+    model = type(obj)
+    value = connection.execute(select(getattr(model, key)).where(model.id == obj.id)).scalar()
+    return _raw_refs(value)
+
+
+# ========== ORM 钩子 ==========
+
+@event.listens_for(Session, "before_flush")
+def _before_flush(session, flush_context, instances):
+    if not BLOB_STORE_ENABLED:
+        return
+    connection = session.connection()
+    restore = session.info.setdefault("blob_restore", [])
+
+    for obj in list(session.new) + list(session.dirty):
+        fields = BLOB_FIELDS.get(type(obj))
+        if not fields:
+            continue
+        state = inspect(obj)
+        is_new = obj in session.new
+        for key in fields:
+            if is_new:
+                new_value, old_refs = getattr(obj, key), []
+            else:
+                history = state.attrs[key].history
+                if not history.added:
+                    continue
+                new_value = history.added[0]
+                old_refs = _stored_refs(connection, obj, key)
+
+            blobs: Dict[str, str] = {}
+            packed = _pack(new_value, blobs)
+            for h in _raw_refs(packed):
+                _add_ref(connection, h, blobs.get(h))
+            for h in old_refs:
+                _release_ref(connection, h)
+            if packed is not new_value:
+                setattr(obj, key, packed)
+                restore.append((obj, key, new_value, packed))
+
+    for obj in session.deleted:
+        fields = BLOB_FIELDS.get(type(obj))
+        if not fields:
+            continue
+        for key in fields:
+            for h in _stored_refs(connection, obj, key):
+                _release_ref(connection, h)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _after_flush(session, flush_context):
+    # flush 后把内存中的引用换回原文，业务代码继续看到原文
+    for obj, key, value, packed in session.info.pop("blob_restore", []):
+        if packed is not value:
+            set_committed_value(obj, key, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("blob_restore", None)
+
+
+def hydrate(session, objects: Iterable[Any]):
+    """把一批实体中的引用还原为原文（一次查询）"""
+    pending = []
+    for obj in objects:
+        fields = BLOB_FIELDS.get(type(obj))
+        if not fields:
+            continue
+        state = inspect(obj)
+        for key in fields:
+            value = state.dict.get(key)  # 未加载的字段不触发懒加载
+            if _has_refs(value):
+                pending.append((obj, key, value))
+    if not pending:
+        return
+    texts = fetch_texts(session.connection(), [h for _, _, v in pending for h in _raw_refs(v)])
+    for obj, key, value in pending:
+        set_committed_value(obj, key, _unpack(value, texts))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_orm_execute(orm_execute_state):
+    if not orm_execute_state.is_select or orm_execute_state.execution_options.get(RAW_OPTION):
+        return None
+    if not any(m.class_ in BLOB_FIELDS for m in orm_execute_state.all_mappers):
+        return None
+
+    frozen = orm_execute_state.invoke_statement().freeze()
+    objects = []
+    for row in frozen().all():
+        for item in row:
+            if type(item) in BLOB_FIELDS:
+                objects.append(item)
+    hydrate(orm_execute_state.session, objects)
+    return frozen()
+
+
+# ========== 维护 ==========
+
+def pack_existing(db, batch_size: int = 200) -> int:
+    """把已有行中的内联大文本外置为正文块，返回处理的行数"""
+    total = 0
+    for model, fields in BLOB_FIELDS.items():
+        last_id = 0
+        while True:
+            # 读原始值（不还原引用），只处理仍有内联大文本的字段
+            rows = db.query(model).execution_options(**{RAW_OPTION: True}).filter(
+                model.id > last_id
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                for key in fields:
+                    if _pack(getattr(row, key), {}) == getattr(row, key):
+                        continue
+                    # 标记为已修改，由 before_flush 外置
+                    flag_modified(row, key)
+                    total += 1
+            db.commit()
+            last_id = rows[-1].id
+    return total
+
+
+def recount(db) -> int:
+    """按实际引用重算所有块的引用计数，返回被修正的块数"""
+    counts: Dict[str, int] = {}
+    for model, fields in BLOB_FIELDS.items():
+        columns = [getattr(model, key) for key in fields]
+        for row in db.execute(select(*columns).execution_options(**{RAW_OPTION: True})):
+            for value in row:
+                for h in _raw_refs(value):
+                    counts[h] = counts.get(h, 0) + 1
+
+    fixed = 0
+    for h, ref_count in db.execute(select(ContentBlob.content_hash, ContentBlob.ref_count)).all():
+        actual = counts.get(h, 0)
+        if actual != ref_count:
+            db.execute(update(ContentBlob).where(ContentBlob.content_hash == h).values(ref_count=actual))
+            fixed += 1
+    db.commit()
+    return fixed
+
+
+def collect_garbage(db) -> int:
+    """删除引用计数为0的块，返回删除数量"""
+    count = db.execute(delete(ContentBlob).where(ContentBlob.ref_count <= 0)).rowcount
+    db.commit()
+    return count
+
+
+def stats(db) -> Dict[str, int]:
+    blobs, size, stored, refs = db.execute(select(
+        func.count(ContentBlob.content_hash), func.coalesce(func.sum(ContentBlob.size), 0),
+        func.coalesce(func.sum(ContentBlob.stored_size), 0), func.coalesce(func.sum(ContentBlob.ref_count), 0)
+    )).one()
+    return {"blobs": blobs, "size": size, "stored_size": stored, "refs": refs}
+
+
+def main():
+    from backend.database.models import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="正文块存储维护")
+    parser.add_argument("--stats", action="store_true", help="查看存储统计")
+    parser.add_argument("--pack", action="store_true", help="把已有内联大文本外置为正文块")
+    parser.add_argument("--recount", action="store_true", help="重算引用计数")
+    parser.add_argument("--gc", action="store_true", help="回收无引用的正文块")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.pack:
+            print(f"📦 已外置 {pack_existing(db)} 个字段")
+            args.recount = True
+        if args.recount:
+            print(f"🔢 修正引用计数 {recount(db)} 个块")
+        if args.gc:
+            print(f"🗑️ 回收正文块 {collect_garbage(db)} 个")
+        s = stats(db)
+        ratio = s["stored_size"] / s["size"] if s["size"] else 0
+        print(f"📊 正文块 {s['blobs']} 个, 原文 {s['size'] / 1024:.1f}KB, "
+              f"压缩后 {s['stored_size'] / 1024:.1f}KB ({ratio:.0%}), 引用 {s['refs']} 次")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
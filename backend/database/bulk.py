@@ -0,0 +1,44 @@
+"""
+批量写入 - 一条 INSERT ... RETURNING 写入多行并按参数顺序取回主键
+
+逐条 add + flush 为了拿主键每行一次往返，SQLite 写锁持有时间随行数线性增长。
+这里父表（大纲）一条语句、子表（章节草稿）一条语句，写锁只在最后的短事务里持有：
+调用方应先完成 AI 调用和查询，再集中写入并立即提交。
+
+批量插入不经过 ORM flush，正文块外置和全文检索索引在这里同步处理；
+插入的行不会进入会话的 identity map，后续需要实体时重新查询
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+
+from backend.database import blob_store, search_index
+from backend.database.models import ChapterDraft, PlotOutline
+
+
+def bulk_insert(db, model, rows: Sequence[Dict[str, Any]]) -> List[int]:
+    """批量插入，返回与 rows 顺序一致的主键列表（不提交）"""
+    if not rows:
+        return []
+    connection = db.connection()
+    stored = [blob_store.pack_row(connection, model, row) for row in rows]
+    ids = list(db.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), stored
+    ).scalars())
+    search_index.index_rows(connection, model, ids, rows)
+    return ids
+
+
+def insert_outlines_with_drafts(db, outlines: Sequence[Dict[str, Any]],
+                                drafts: Sequence[Optional[Dict[str, Any]]]) -> Tuple[List[int], List[int]]:
+    """
+    批量写入章节大纲及对应草稿（不提交）
+
+    drafts[i] 对应 outlines[i]，自动填入 outline_id；为 None 时该大纲不建草稿
+    返回 (大纲ID列表, 草稿ID列表)
+    """
+    outline_ids = bulk_insert(db, PlotOutline, outlines)
+    draft_rows = [dict(draft, outline_id=outline_id)
+                  for outline_id, draft in zip(outline_ids, drafts) if draft is not None]
+    return outline_ids, bulk_insert(db, ChapterDraft, draft_rows)
@@ -0,0 +1,189 @@
+"""
+语料去重存储 - URL 哈希精确去重 + SimHash 近似重复检测
+
+- URL 规范化（去掉锚点和跟踪参数、统一大小写和末尾斜杠）后取 sha1，唯一索引保证同一链接只存一次
+- 同一故事在知乎、晋江、17k 转载时链接不同，排版、标点和首尾广告也不同，但正文的
+  64 位 SimHash（字符 3-gram）汉明距离很小（实测 0-8），无关文本约 32，距离 ≤ SIMHASH_DISTANCE 视为重复
+- SimHash 分八段各 8 位分别建索引：距离 ≤7 时至少有一段完全相同（抽屉原理），
+  按段等值查出候选（约为总量的 1/32），再逐个计算汉明距离
+- 抓取时按页一次查询已存在的链接，已入库的链接不再请求正文
+
+用法:
+    batch = CorpusBatch(db, "晋江", [item["url"] for item in results])
+    for item in results:
+        if batch.is_new(item["url"]):
+            batch.add(title=..., content=..., url=item["url"], plot_tags=...)
+    db.commit()
+"""
+
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import or_
+
+from backend.database.models import Corpus
+
+BANDS = 8
+BAND_BITS = 64 // BANDS
+# 分段查找只能保证找出距离 < BANDS 的重复
+SIMHASH_DISTANCE = min(int(os.getenv("CORPUS_SIMHASH_DISTANCE", "6")), BANDS - 1)
+MIN_SIMHASH_CHARS = 100  # 正文过短时 SimHash 不稳定，不做近似去重
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = {"spm", "from", "source", "share_from", "share_source", "share_medium", "utm_psn",
+                   "scene", "timestamp", "ref", "ref_src"}
+
+_MASK = (1 << 64) - 1
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+# ========== URL ==========
+
+def normalize_url(url: str) -> str:
+    """去掉锚点和跟踪参数、统一协议/域名大小写、去掉末尾斜杠，查询参数按名称排序"""
+    parts = urlsplit((url or "").strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_"))
+    scheme = "https" if parts.scheme.lower() in ("http", "https") else parts.scheme.lower()
+    return urlunsplit((scheme, parts.netloc.lower(), parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def url_hash(url: str) -> Optional[str]:
+    if not url or not url.strip():
+        return None
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+# ========== SimHash ==========
+
+def simhash(text: str) -> Optional[int]:
+    """正文的 64 位 SimHash（无符号），忽略空白和标点；正文过短返回 None"""
+    normalized = _NON_WORD.sub("", (text or "").lower())
+    if len(normalized) < MIN_SIMHASH_CHARS:
+        return None
+    shingles = [normalized[i:i + 3] for i in range(len(normalized) - 2)]
+    digests = {s: hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in set(shingles)}
+    # 所有特征的哈希按出现次数拼接，逐字节位置统计取值分布（Counter 在 C 层计数）
+    data = b"".join(map(digests.__getitem__, shingles))
+    total = len(shingles)
+    result = 0
+    for position in range(8):
+        counts = Counter(data[position::8])
+        for bit in range(8):
+            ones = sum(n for byte, n in counts.items() if byte >> bit & 1)
+            if ones * 2 > total:
+                result |= 1 << (position * 8 + bit)
+    return result
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def _bands(h: int) -> List[int]:
+    return [(h >> (i * BAND_BITS)) & ((1 << BAND_BITS) - 1) for i in range(BANDS)]
+
+
+def _to_signed(h: int) -> int:
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def simhash_columns(h: Optional[int]) -> Dict[str, Optional[int]]:
+    """SimHash 对应的 Corpus 列值"""
+    bands = _bands(h) if h is not None else [None] * BANDS
+    columns = {f"simhash_band{i}": band for i, band in enumerate(bands)}
+    columns["simhash"] = _to_signed(h) if h is not None else None
+    return columns
+
+
+def find_near_duplicate(db, h: int) -> Optional[int]:
+    """返回与 SimHash 距离最近且在阈值内的语料ID"""
+    bands = _bands(h)
+    columns = [getattr(Corpus, f"simhash_band{i}") for i in range(BANDS)]
+    with db.no_autoflush:
+        candidates = db.query(Corpus.id, Corpus.simhash).filter(
+            or_(*[column == band for column, band in zip(columns, bands)])
+        ).all()
+    best = None
+    for corpus_id, other in candidates:
+        distance = hamming(h, other)
+        if distance <= SIMHASH_DISTANCE and (best is None or distance < best[0]):
+            best = (distance, corpus_id)
+    return best[1] if best else None
+
+
+# ========== 写入 ==========
+
+class CorpusBatch:
+    """一页抓取结果的去重写入：构造时一次查出已入库的链接，add 时做近似重复检测（不提交）"""
+
+    def __init__(self, db, source: str, urls: Iterable[str] = ()):
+        self.db = db
+        self.source = source
+        self.saved = 0
+        self.duplicate_urls = 0
+        self.near_duplicates = 0
+        self.updated = 0
+        self._pending_hashes: List[int] = []
+        self._known: Set[str] = set()
+        self.refresh(urls)
+
+    def refresh(self, urls: Iterable[str]):
+        """重新查询这些链接是否已入库（并发抓取时，等待期间其他任务可能已写入）"""
+        hashes = {h for h in map(url_hash, urls) if h} - self._known
+        if hashes:
+            with self.db.no_autoflush:
+                self._known.update(h for (h,) in self.db.query(Corpus.url_hash).filter(Corpus.url_hash.in_(hashes)))
+
+    def is_new(self, url: str) -> bool:
+        """链接未入库（本页已写入的也算已入库）；已入库的计入 duplicate_urls"""
+        h = url_hash(url)
+        if h is not None and h in self._known:
+            self.duplicate_urls += 1
+            return False
+        return True
+
+    def add(self, title: str, content: str, url: str = "", **fields) -> Optional[Corpus]:
+        """写入一条语料；链接已存在或正文与已有语料近似重复时返回 None"""
+        h_url = url_hash(url)
+        if h_url is not None and h_url in self._known:
+            self.duplicate_urls += 1
+            return None
+        h = simhash(content)
+        if h is not None:
+            # 本页尚未 flush 的语料在内存中比对
+            if any(hamming(h, other) <= SIMHASH_DISTANCE for other in self._pending_hashes) \
+                    or find_near_duplicate(self.db, h) is not None:
+                self.near_duplicates += 1
+                print(f"⏭️  近似重复，跳过：{title}")
+                return None
+            self._pending_hashes.append(h)
+
+        corpus = Corpus(source=self.source, title=title, content=content, url=url, url_hash=h_url,
+                        **simhash_columns(h), **fields)
+        self.db.add(corpus)
+        if h_url is not None:
+            self._known.add(h_url)
+        self.saved += 1
+        return corpus
+
+    def update(self, url: str, title: str, content: str, **fields) -> bool:
+        """重抓发现页面变化时更新已入库的语料（不提交），该链接未入库时返回 False"""
+        h_url = url_hash(url)
+        corpus = self.db.query(Corpus).filter(Corpus.url_hash == h_url).first() if h_url else None
+        if corpus is None:
+            return False
+        corpus.title = title
+        corpus.content = content
+        for key, value in {**simhash_columns(simhash(content)), **fields}.items():
+            setattr(corpus, key, value)
+        self.updated += 1
+        return True
+
+    def summary(self) -> str:
+        text = f"保存 {self.saved} 条，跳过已存在链接 {self.duplicate_urls} 条，近似重复 {self.near_duplicates} 条"
+        return text + (f"，更新 {self.updated} 条" if self.updated else "")
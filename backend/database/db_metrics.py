@@ -0,0 +1,193 @@
+"""
+数据库会话与连接池监控 - 发现未关闭的会话和长时间占用的连接
+
+- TrackedSession：记录每个会话的创建位置，关闭时注销；被垃圾回收时仍未关闭则计为泄漏并打印创建位置
+- watch_pool：统计连接签出次数、当前占用数、占用时长分布，超过 DB_LONG_CHECKOUT 秒的签出打印告警
+- snapshot() 汇总以上指标，由 /api/metrics/db 暴露
+"""
+
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DB_LONG_CHECKOUT = float(os.getenv("DB_LONG_CHECKOUT", "30"))  # 连接占用超过该秒数视为可疑
+HOLD_BUCKETS = (0.01, 0.1, 1, 10, 60)  # 占用时长分布(秒)
+
+# 定位创建位置时跳过的框架代码
+_SKIP_PATHS = ("sqlalchemy", "<string>", "contextlib", "fastapi", "starlette", "anyio", "concurrent", "threading",
+               os.path.join("backend", "database", "db_metrics"))
+
+_lock = threading.Lock()
+
+
+def _caller_site() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not any(part in filename for part in _SKIP_PATHS):
+            return f"{os.path.relpath(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+# ========== 会话 ==========
+
+class _SessionRegistry:
+    def __init__(self):
+        self.open: Dict[int, Dict[str, Any]] = {}
+        self.opened_total = 0
+        self.closed_total = 0
+        self.leaked_total = 0
+        self.leak_sites: Dict[str, int] = {}
+        # 会话被回收时只记下 key：回收可能发生在持有锁的任意位置，不能在回调里加锁
+        self._collected = deque()
+
+    def _drain(self) -> List[str]:
+        """处理已回收的会话，返回泄漏的创建位置（调用方需持有锁）"""
+        leaked = []
+        while self._collected:
+            info = self.open.pop(self._collected.popleft(), None)
+            if info is not None:
+                self.leaked_total += 1
+                self.leak_sites[info["site"]] = self.leak_sites.get(info["site"], 0) + 1
+                leaked.append(info["site"])
+        return leaked
+
+    def _report(self, leaked: List[str]):
+        for site in leaked:
+            print(f"⚠️ 数据库会话未关闭即被回收: {site}")
+
+    def opened(self, session: Session, site: str):
+        key = id(session)
+        with _lock:
+            leaked = self._drain()
+            if key not in self.open:
+                self.open[key] = {"site": site, "since": time.time(), "thread": threading.current_thread().name}
+                self.opened_total += 1
+                weakref.finalize(session, self._collected.append, key)
+        self._report(leaked)
+
+    def closed(self, session: Session):
+        with _lock:
+            leaked = self._drain()
+            if self.open.pop(id(session), None) is not None:
+                self.closed_total += 1
+        self._report(leaked)
+
+    def snapshot(self, top: int) -> Dict[str, Any]:
+        now = time.time()
+        with _lock:
+            leaked = self._drain()
+            oldest = sorted(
+                ({"site": i["site"], "thread": i["thread"], "seconds": round(now - i["since"], 2)}
+                 for i in list(self.open.values())),
+                key=lambda x: -x["seconds"]
+            )
+            result = {
+                "open": len(self.open),
+                "opened_total": self.opened_total,
+                "closed_total": self.closed_total,
+                "leaked_total": self.leaked_total,
+                "leak_sites": dict(sorted(self.leak_sites.items(), key=lambda x: -x[1])[:top]),
+                "oldest": oldest[:top],
+            }
+        self._report(leaked)
+        return result
+
+
+sessions = _SessionRegistry()
+
+
+class TrackedSession(Session):
+    """带泄漏检测的会话：close() 后再次使用会重新计为打开"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        sessions.opened(self, _caller_site())
+
+    def close(self):
+        super().close()
+        sessions.closed(self)
+
+
+@event.listens_for(TrackedSession, "after_begin")
+def _reopened(session, transaction, connection):
+    # 关闭后继续查询的会话（如 next(get_db()) 的写法）重新登记
+    if id(session) not in sessions.open:
+        sessions.opened(session, _caller_site())
+
+
+# ========== 连接池 ==========
+
+class _PoolStats:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.checkouts = 0
+        self.long_checkouts = 0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        self.buckets = [0] * (len(HOLD_BUCKETS) + 1)
+        self.checked_out: Dict[int, Dict[str, Any]] = {}
+
+    def checkout(self, record):
+        with _lock:
+            self.checkouts += 1
+            self.checked_out[id(record)] = {"since": time.perf_counter(), "site": _caller_site()}
+
+    def checkin(self, record):
+        with _lock:
+            info = self.checked_out.pop(id(record), None)
+            if info is None:
+                return
+            held = time.perf_counter() - info["since"]
+            self.hold_total += held
+            self.hold_max = max(self.hold_max, held)
+            self.buckets[sum(1 for b in HOLD_BUCKETS if held > b)] += 1
+            if held > DB_LONG_CHECKOUT:
+                self.long_checkouts += 1
+        if held > DB_LONG_CHECKOUT:
+            print(f"⚠️ 数据库连接占用 {held:.1f} 秒: {info['site']}")
+
+    def snapshot(self, top: int) -> Dict[str, Any]:
+        now = time.perf_counter()
+        with _lock:
+            held = sorted(({"site": i["site"], "seconds": round(now - i["since"], 2)}
+                           for i in self.checked_out.values()), key=lambda x: -x["seconds"])
+            completed = self.checkouts - len(self.checked_out)
+            buckets = {f"<={b}s": n for b, n in zip(HOLD_BUCKETS, self.buckets)}
+            buckets[f">{HOLD_BUCKETS[-1]}s"] = self.buckets[-1]
+            return {
+                "pool": self.engine.pool.status(),
+                "checkouts_total": self.checkouts,
+                "checked_out": len(self.checked_out),
+                "long_checkouts_total": self.long_checkouts,
+                "hold_avg_ms": round(self.hold_total / completed * 1000, 2) if completed else 0,
+                "hold_max_ms": round(self.hold_max * 1000, 2),
+                "hold_buckets": buckets,
+                "oldest": held[:top],
+            }
+
+
+pools: Dict[str, _PoolStats] = {}
+
+
+def watch_pool(name: str, engine):
+    """给引擎（异步引擎传 sync_engine）挂上签出/归还统计"""
+    stats = _PoolStats(name, engine)
+    pools[name] = stats
+    event.listen(engine, "checkout", lambda dbapi_conn, record, proxy: stats.checkout(record))
+    event.listen(engine, "checkin", lambda dbapi_conn, record: stats.checkin(record))
+    return stats
+
+
+def snapshot(top: int = 5) -> Dict[str, Any]:
+    """当前会话与连接池指标"""
+    return {"sessions": sessions.snapshot(top), "pools": {name: p.snapshot(top) for name, p in pools.items()}}
@@ -0,0 +1,104 @@
+"""
+定时任务锁 - 多个 API 副本共用一个数据库时，同一定时任务只在一个节点上执行
+
+- scheduler_locks 表每个锁一行，记录持有者（主机名:进程号:随机串）和过期时间
+- 获取：锁已过期时用一条带条件的 UPDATE 抢占，锁不存在时 INSERT（主键冲突即被其他节点抢先）；
+  未过期的锁即使是本进程持有也不能再次获取，同一任务上一次未结束时下一次直接跳过
+- 持有者运行期间定期续期（renew），进程崩溃后锁在 ttl 秒后自动过期，不会永久卡住；
+  持有者是本机上已退出的进程（或进程号相同的上一次运行，如容器重启）时不等过期直接接管
+- 进程正常退出前用 release_all 释放本节点持有的全部锁，重启后的任务不会被自己上一次的锁挡住
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.database.models import SessionLocal, SchedulerLock
+
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _left_behind(owner: str) -> bool:
+    """锁的持有者是否为本机上已不存在的进程"""
+    host, pid, _ = (owner.rsplit(":", 2) + ["", ""])[:3]
+    if owner == NODE_ID or host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        # 进程号与本进程相同而随机串不同：本进程重启前的上一次运行
+        return True
+    if os.name == "nt":
+        # Windows 上 os.kill 会结束目标进程，无法用来探测
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def acquire(name: str, ttl: int) -> bool:
+    """获取锁，成功返回 True"""
+    now = datetime.now()
+    db = SessionLocal()
+    try:
+        takeover = SchedulerLock.expires_at < now
+        holder = db.query(SchedulerLock.owner).filter(SchedulerLock.name == name).scalar()
+        if holder and _left_behind(holder):
+            takeover = or_(takeover, SchedulerLock.owner == holder)
+        result = db.execute(
+            update(SchedulerLock)
+            .where(SchedulerLock.name == name, takeover)
+            .values(owner=NODE_ID, acquired_at=now, expires_at=now + timedelta(seconds=ttl))
+        )
+        if result.rowcount == 0:
+            db.add(SchedulerLock(name=name, owner=NODE_ID, acquired_at=now,
+                                 expires_at=now + timedelta(seconds=ttl)))
+        db.commit()
+        return True
+    except IntegrityError:
+        # 锁存在且未过期
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def renew(name: str, ttl: int) -> bool:
+    """续期本节点持有的锁；锁已过期被其他节点获取时返回 False"""
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(SchedulerLock)
+            .where(SchedulerLock.name == name, SchedulerLock.owner == NODE_ID)
+            .values(expires_at=datetime.now() + timedelta(seconds=ttl))
+        )
+        db.commit()
+        return result.rowcount > 0
+    finally:
+        db.close()
+
+
+def release(name: str):
+    """释放本节点持有的锁"""
+    db = SessionLocal()
+    try:
+        db.execute(delete(SchedulerLock).where(SchedulerLock.name == name, SchedulerLock.owner == NODE_ID))
+        db.commit()
+    finally:
+        db.close()
+
+
+def release_all():
+    """释放本节点持有的全部锁（进程退出前调用）"""
+    db = SessionLocal()
+    try:
+        db.execute(delete(SchedulerLock).where(SchedulerLock.owner == NODE_ID))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,102 @@
+"""
+批量加载器 - 用固定次数的查询取出整棵数据树，在内存中分组，避免 N+1 查询
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import load_only
+
+from backend.database.models import NovelProject, LongNovelMapping, PlotOutline, ChapterDraft
+
+
+def _parse_focus(value: Any) -> Dict[str, Any]:
+    """长篇大纲的 focus_elements 以 JSON 字符串保存"""
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            parsed = json.loads(value)
+            return parsed if isinstance(parsed, dict) else {}
+        except ValueError:
+            return {}
+    return {}
+
+
+def load_long_project(db, project_id: int, include_content: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    加载长篇项目的卷/章结构（共4次查询，与章节数无关）
+
+    include_content=False 时不读取章节正文，只返回元数据
+    """
+    project = db.query(NovelProject).options(
+        load_only(NovelProject.id, NovelProject.name, NovelProject.source_manuscript_id)
+    ).filter(NovelProject.id == project_id).first()
+    if not project:
+        return None
+
+    mappings = db.query(LongNovelMapping).filter(
+        LongNovelMapping.project_id == project_id
+    ).order_by(LongNovelMapping.volume_number).all()
+
+    outlines = db.query(PlotOutline).options(
+        load_only(PlotOutline.id, PlotOutline.chapter_number, PlotOutline.title,
+                  PlotOutline.summary, PlotOutline.focus_elements)
+    ).filter(
+        PlotOutline.project_id == project_id
+    ).order_by(PlotOutline.chapter_number.asc().nulls_first(), PlotOutline.id).all()
+
+    draft_columns = [ChapterDraft.id, ChapterDraft.outline_id, ChapterDraft.status, ChapterDraft.word_count]
+    if include_content:
+        draft_columns.append(ChapterDraft.content)
+    drafts = {}
+    if outlines:
+        rows = db.query(ChapterDraft).options(load_only(*draft_columns)).filter(
+            ChapterDraft.outline_id.in_([ol.id for ol in outlines])
+        ).order_by(ChapterDraft.id).all()
+        for draft in rows:
+            # 每个大纲取最早的一份草稿
+            drafts.setdefault(draft.outline_id, draft)
+
+    # 二分查找要求有序：章节号为空的按 0 计，排序时显式 NULL 在前（PostgreSQL 升序默认 NULL 在后）
+    chapter_numbers = [ol.chapter_number or 0 for ol in outlines]
+    volumes = []
+    for m in mappings:
+        lo = bisect_left(chapter_numbers, m.start_chapter or 0)
+        hi = bisect_right(chapter_numbers, m.end_chapter or 0)
+        chapter_list = []
+        for ol in outlines[lo:hi]:
+            draft = drafts.get(ol.id)
+            focus = _parse_focus(ol.focus_elements)
+            chapter = {
+                "id": draft.id if draft else None,
+                "outline_id": ol.id,
+                "chapter_number": ol.chapter_number,
+                "title": ol.title,
+                "summary": ol.summary,
+                "main_conflict": focus.get("main_conflict"),
+                "sub_conflict": focus.get("sub_conflict"),
+                "emotion_arc": focus.get("emotion_arc"),
+                "status": draft.status if draft else "planning",
+                "word_count": draft.word_count if draft else 0
+            }
+            if include_content:
+                chapter["content"] = draft.content if draft else ""
+            chapter_list.append(chapter)
+
+        volumes.append({
+            "volume_number": m.volume_number,
+            "title": m.short_chapter_title,
+            "summary": m.short_chapter_summary,
+            "chapters": chapter_list
+        })
+
+    return {
+        "project": {
+            "id": project.id,
+            "name": project.name,
+            "source_manuscript_id": project.source_manuscript_id
+        },
+        "volumes": volumes
+    }
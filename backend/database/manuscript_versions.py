@@ -0,0 +1,325 @@
+"""
+稿件版本链 - 基准快照 + 段落级增量
+
+每次重新生成/定向重写都会产生新稿件，但通常只改了少数章节的少数段落。
+稿件正文不再整份保存在 Manuscript.content，而是写入 ManuscriptVersion：
+- snapshot：完整正文
+- delta：相对上一版本的差异（未变章节只记序号，变更章节只记新增段落和复用区间）
+增量层数达到 SNAPSHOT_INTERVAL 或增量体积过大时重新打快照，控制还原成本
+
+旧稿件（Manuscript.content 非空）按原样读取，无需迁移
+"""
+
+import copy
+import difflib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from backend.database import search_index
+from backend.database.models import Manuscript, ManuscriptVersion
+
+SNAPSHOT_INTERVAL = int(os.getenv("MANUSCRIPT_SNAPSHOT_INTERVAL", "10"))  # 最多连续增量层数
+SNAPSHOT_RATIO = float(os.getenv("MANUSCRIPT_SNAPSHOT_RATIO", "0.5"))    # 增量超过全文该比例时改存快照
+
+_MISSING = object()
+
+
+# ========== 编码 ==========
+
+def _split_content(content: Any) -> Tuple[str, Any, List[Any]]:
+    """拆成 (格式, 章节以外的部分, 章节列表)"""
+    if isinstance(content, list):
+        return "list", None, content
+    if isinstance(content, dict) and isinstance(content.get("chapters"), list):
+        return "dict", {k: v for k, v in content.items() if k != "chapters"}, content["chapters"]
+    return "raw", content, []
+
+
+def _join_content(fmt: str, meta: Any, chapters: List[Any]) -> Any:
+    if fmt == "list":
+        return chapters
+    if fmt == "dict":
+        return {**meta, "chapters": chapters}
+    return meta
+
+
+def _chapter_key(chapter: Any, idx: int) -> Any:
+    if isinstance(chapter, dict):
+        return chapter.get("chapter_number") or idx + 1
+    return idx + 1
+
+
+def _paragraphs(text: Any) -> List[str]:
+    # 按换行无损切分，join 后与原文完全一致
+    return text.split("\n") if isinstance(text, str) and text else []
+
+
+def _encode_text(old: str, new: str) -> List[Any]:
+    """段落级差异: ["=", i1, i2] 复用旧段落区间, ["+", [段落...]] 新增段落"""
+    old_paras, new_paras = _paragraphs(old), _paragraphs(new)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_paras, new_paras, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i1, i2])
+        elif j2 > j1:
+            ops.append(["+", new_paras[j1:j2]])
+    return ops
+
+
+def _decode_text(old: str, ops: List[Any]) -> str:
+    old_paras = _paragraphs(old)
+    paras = []
+    for op in ops:
+        if op[0] == "=":
+            paras.extend(old_paras[op[1]:op[2]])
+        else:
+            paras.extend(op[1])
+    return "\n".join(paras)
+
+
+def encode_delta(base: Any, new: Any) -> Optional[Dict[str, Any]]:
+    """计算 new 相对 base 的增量；结构不可比时返回 None（应存快照）"""
+    base_fmt, base_meta, base_chapters = _split_content(base)
+    fmt, meta, chapters = _split_content(new)
+    if fmt == "raw" or fmt != base_fmt:
+        return None
+
+    base_index = {}
+    for i, ch in enumerate(base_chapters):
+        base_index.setdefault(_chapter_key(ch, i), i)
+
+    entries = []
+    for i, ch in enumerate(chapters):
+        bi = base_index.get(_chapter_key(ch, i))
+        old = base_chapters[bi] if bi is not None else None
+        if old == ch:
+            entries.append(bi)
+        elif isinstance(ch, dict) and isinstance(old, dict):
+            entry = {
+                "base": bi,
+                "set": {k: v for k, v in ch.items() if k != "content" and old.get(k, _MISSING) != v},
+                "unset": [k for k in old if k not in ch],
+            }
+            if "content" in ch and ch["content"] != old.get("content"):
+                if isinstance(ch["content"], str) and isinstance(old.get("content"), str):
+                    entry["content"] = _encode_text(old["content"], ch["content"])
+                else:
+                    entry["set"]["content"] = ch["content"]
+            entries.append(entry)
+        else:
+            entries.append({"new": ch})
+
+    delta = {"format": fmt, "chapters": entries}
+    if meta != base_meta:
+        delta["meta"] = meta
+    return delta
+
+
+def apply_delta(base: Any, delta: Dict[str, Any]) -> Any:
+    """把增量应用到 base 上得到新正文"""
+    _, base_meta, base_chapters = _split_content(base)
+    chapters = []
+    for entry in delta["chapters"]:
+        if isinstance(entry, int):
+            chapters.append(copy.deepcopy(base_chapters[entry]))
+        elif "new" in entry:
+            chapters.append(copy.deepcopy(entry["new"]))
+        else:
+            old = base_chapters[entry["base"]]
+            ch = {k: copy.deepcopy(v) for k, v in old.items() if k not in entry["unset"]}
+            ch.update(copy.deepcopy(entry["set"]))
+            if "content" in entry:
+                ch["content"] = _decode_text(old.get("content", ""), entry["content"])
+            chapters.append(ch)
+    meta = copy.deepcopy(delta["meta"] if "meta" in delta else base_meta)
+    return _join_content(delta["format"], meta, chapters)
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+# ========== 存取 ==========
+
+def _version_of(db, manuscript_id: int) -> Optional[ManuscriptVersion]:
+    return db.query(ManuscriptVersion).filter(ManuscriptVersion.manuscript_id == manuscript_id).first()
+
+
+def _materialize_version(db, version: ManuscriptVersion) -> Any:
+    """沿版本链回溯到快照后依次应用增量（一次查询取回整条链）"""
+    if version.kind == "snapshot":
+        return copy.deepcopy(version.data)
+    chain_rows = db.query(ManuscriptVersion).filter(
+        ManuscriptVersion.snapshot_id == version.snapshot_id,
+        ManuscriptVersion.id <= version.id
+    ).all()
+    by_id = {v.id: v for v in chain_rows}
+    chain = []
+    current = version
+    while current.kind != "snapshot":
+        chain.append(current)
+        current = by_id.get(current.base_version_id) or db.get(ManuscriptVersion, current.base_version_id)
+        if current is None:
+            raise LookupError(f"稿件版本链断裂: version {version.id}")
+    content = copy.deepcopy(current.data)
+    for v in reversed(chain):
+        content = apply_delta(content, v.data)
+    return content
+
+
+def materialize(db, manuscript: Manuscript) -> Any:
+    """还原稿件正文（旧稿件直接返回 Manuscript.content）"""
+    if manuscript.content is not None:
+        return manuscript.content
+    version = _version_of(db, manuscript.id)
+    return _materialize_version(db, version) if version else None
+
+
+def load_manuscript(db, manuscript_id: int) -> Optional[Manuscript]:
+    """查询稿件并填充还原后的正文（不会被当作修改写回）"""
+    manuscript = db.query(Manuscript).filter(Manuscript.id == manuscript_id).first()
+    if manuscript is not None and manuscript.content is None:
+        set_committed_value(manuscript, "content", materialize(db, manuscript))
+    return manuscript
+
+
+def _latest_version(db, manuscript: Manuscript) -> Optional[ManuscriptVersion]:
+    """同一项目下最近的已版本化稿件"""
+    if not manuscript.project_id:
+        return None
+    return db.query(ManuscriptVersion).join(
+        Manuscript, Manuscript.id == ManuscriptVersion.manuscript_id
+    ).filter(
+        Manuscript.project_id == manuscript.project_id,
+        Manuscript.id != manuscript.id
+    ).order_by(ManuscriptVersion.id.desc()).first()
+
+
+def save_version(db, manuscript: Manuscript, content: Any, base_manuscript_id: Optional[int] = None) -> ManuscriptVersion:
+    """
+    以版本链方式保存稿件正文（不提交）
+
+    base_manuscript_id 为空时以同项目最近的稿件为基准；
+    增量层数超过 SNAPSHOT_INTERVAL 或增量体积过大时存完整快照
+    """
+    if manuscript.id is None:
+        db.flush()
+    base = _version_of(db, base_manuscript_id) if base_manuscript_id else _latest_version(db, manuscript)
+
+    version = ManuscriptVersion(manuscript_id=manuscript.id)
+    delta = None
+    if base is not None and (base.depth or 0) + 1 <= SNAPSHOT_INTERVAL:
+        delta = encode_delta(_materialize_version(db, base), content)
+    full_size = _size(content)
+    if delta is not None and _size(delta) <= full_size * SNAPSHOT_RATIO:
+        version.kind, version.data, version.stored_size = "delta", delta, _size(delta)
+        version.base_version_id, version.snapshot_id, version.depth = base.id, base.snapshot_id, (base.depth or 0) + 1
+        db.add(version)
+        db.flush()
+    else:
+        version.kind, version.data, version.stored_size, version.depth = "snapshot", content, full_size, 0
+        db.add(version)
+        db.flush()
+        version.snapshot_id = version.id
+
+    manuscript.content = None
+    db.flush()
+    # 内存中保留正文，调用方可继续使用 manuscript.content
+    set_committed_value(manuscript, "content", content)
+    search_index.index_manuscript(db, manuscript, content)
+    return version
+
+
+def diff_manuscripts(db, from_manuscript: Manuscript, to_manuscript: Manuscript) -> List[Dict[str, Any]]:
+    """按章节对比两个稿件，返回段落级差异"""
+    _, _, old_chapters = _split_content(materialize(db, from_manuscript))
+    _, _, new_chapters = _split_content(materialize(db, to_manuscript))
+    old_index = {_chapter_key(ch, i): ch for i, ch in enumerate(old_chapters)}
+    new_keys = set()
+
+    changes = []
+    for i, ch in enumerate(new_chapters):
+        key = _chapter_key(ch, i)
+        new_keys.add(key)
+        old = old_index.get(key)
+        if old == ch:
+            continue
+        new_ch = ch if isinstance(ch, dict) else {}
+        old_ch = old if isinstance(old, dict) else {}
+        item = {"chapter_number": key, "title": new_ch.get("title"),
+                "status": "changed" if old is not None else "added", "paragraphs": []}
+        if old is not None and old_ch.get("title") != new_ch.get("title"):
+            item["old_title"] = old_ch.get("title")
+        old_paras, new_paras = _paragraphs(old_ch.get("content")), _paragraphs(new_ch.get("content"))
+        matcher = difflib.SequenceMatcher(None, old_paras, new_paras, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != "equal":
+                item["paragraphs"].append({"op": tag, "position": i1,
+                                           "old": old_paras[i1:i2], "new": new_paras[j1:j2]})
+        changes.append(item)
+
+    for i, ch in enumerate(old_chapters):
+        key = _chapter_key(ch, i)
+        if key not in new_keys:
+            changes.append({"chapter_number": key, "title": ch.get("title") if isinstance(ch, dict) else None,
+                            "status": "removed", "paragraphs": []})
+    return changes
+
+
+def version_history(db, manuscript: Manuscript) -> List[Dict[str, Any]]:
+    """从当前稿件沿版本链回溯到快照"""
+    history = []
+    version = _version_of(db, manuscript.id)
+    while version is not None:
+        history.append({
+            "manuscript_id": version.manuscript_id,
+            "kind": version.kind,
+            "depth": version.depth,
+            "stored_size": version.stored_size,
+            "created_at": version.created_at.strftime("%Y-%m-%d %H:%M:%S") if version.created_at else None
+        })
+        if version.kind == "snapshot":
+            break
+        version = db.get(ManuscriptVersion, version.base_version_id)
+    return history
+
+
+# ========== 删除稿件时保持版本链完整 ==========
+
+def _detach_children(db, version: ManuscriptVersion):
+    """把以 version 为基准的子版本改存为快照，并更新其后代的快照归属"""
+    children = db.query(ManuscriptVersion).filter(ManuscriptVersion.base_version_id == version.id).all()
+    if not children:
+        return
+    family = db.query(ManuscriptVersion).filter(ManuscriptVersion.snapshot_id == version.snapshot_id).all()
+    kids = {}
+    for v in family:
+        kids.setdefault(v.base_version_id, []).append(v)
+
+    for child in children:
+        content = _materialize_version(db, child)
+        offset = child.depth
+        stack = list(kids.get(child.id, []))
+        while stack:
+            v = stack.pop()
+            v.snapshot_id = child.id
+            v.depth = (v.depth or 0) - offset
+            stack.extend(kids.get(v.id, []))
+        child.kind, child.data, child.stored_size = "snapshot", content, _size(content)
+        child.base_version_id, child.snapshot_id, child.depth = None, child.id, 0
+
+
+@event.listens_for(Session, "before_flush")
+def _before_flush(session, flush_context, instances):
+    for obj in list(session.deleted):
+        if isinstance(obj, Manuscript):
+            with session.no_autoflush:
+                version = _version_of(session, obj.id)
+                if version is not None:
+                    _detach_children(session, version)
@@ -0,0 +1,407 @@
+"""
+版本化数据库迁移
+
+- schema_migrations 表记录已应用的版本，启动时(init_db)自动执行未应用的迁移
+- 每个迁移都是幂等的：新库由 create_all 建好完整结构，迁移只会补齐老库缺失的部分
+- SQLite 无法 ALTER 添加外键，采用官方推荐的"新建表-复制-改名"方式在单个事务内重建
+
+用法:
+    python -m backend.database.migrations            # 执行迁移
+    python -m backend.database.migrations --status   # 查看迁移状态
+    python -m backend.database.migrations --check-plans  # 检查热点查询是否走索引
+"""
+
+import argparse
+import hashlib
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+from backend.database.models import Base, engine
+
+
+def _columns(conn, table: str) -> List[str]:
+    return [c["name"] for c in inspect(conn).get_columns(table)]
+
+
+def _has_table(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def _add_columns(conn, table: str, columns: List[Tuple[str, str]]):
+    """补齐缺失的列"""
+    if not _has_table(conn, table):
+        return
+    existing = _columns(conn, table)
+    for col_name, col_type in columns:
+        if col_name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}"))
+            print(f"  ✅ {table} 添加列: {col_name}")
+
+
+def _create_model_indexes(conn, table: str):
+    """按模型定义补齐索引"""
+    for index in Base.metadata.tables[table].indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _backfill_hash(conn, table: str, source_column: str, hash_column: str = "content_hash"):
+    rows = conn.execute(text(f"SELECT id, {source_column} FROM {table} WHERE {hash_column} IS NULL")).fetchall()
+    for row_id, content in rows:
+        digest = hashlib.sha256((content or "").strip().encode("utf-8")).hexdigest()
+        conn.execute(text(f"UPDATE {table} SET {hash_column} = :h WHERE id = :id"), {"h": digest, "id": row_id})
+    if rows:
+        print(f"  ✅ {table} 回填哈希: {len(rows)} 条")
+
+
+# ========== 迁移定义 ==========
+
+def m001_character_card_columns(conn):
+    """星月风格角色卡字段（原 migrate_character_columns.py）"""
+    _add_columns(conn, "characters", [
+        ("importance", "VARCHAR(20) DEFAULT 'supporting'"),
+        ("status", "VARCHAR(20) DEFAULT 'active'"),
+        ("is_visible", "INTEGER DEFAULT 1"),
+        ("personality_flaw", "TEXT"),
+        ("flaw_consequence", "TEXT"),
+        ("core_identity", "TEXT"),
+        ("core_personality", "TEXT"),
+        ("core_motivation", "TEXT"),
+        ("growth_direction", "TEXT"),
+        ("speech_example", "TEXT"),
+        ("current_location", "VARCHAR(200)"),
+        ("relationship_notes", "TEXT"),
+        ("biography_current", "TEXT"),
+        ("first_appearance_chapter", "INTEGER"),
+        ("last_appearance_chapter", "INTEGER"),
+    ])
+
+
+def m002_channel_agents(conn):
+    """渠道智能体表及联系方式字段（原 migrate_agent_table.py / add_contact_info.py）"""
+    Base.metadata.tables["channel_agents"].create(conn, checkfirst=True)
+    _add_columns(conn, "channel_agents", [("contact_info", "TEXT")])
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_channel_agents_name ON channel_agents(name)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_channel_agents_type ON channel_agents(channel_type)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_channel_agents_status ON channel_agents(training_status, is_active)"
+    ))
+
+
+def m003_content_hash(conn):
+    """原文内容哈希（原 migrate_content_hash.py）"""
+    _add_columns(conn, "imitation_projects", [("content_hash", "VARCHAR(64)")])
+    _add_columns(conn, "example_analyses", [("content_hash", "VARCHAR(64)"), ("plot_analysis", "JSON")])
+    for table, source in (("imitation_projects", "original_content"), ("example_analyses", "content")):
+        if _has_table(conn, table):
+            _create_model_indexes(conn, table)
+            _backfill_hash(conn, table, source)
+
+
+def m004_step_fingerprint(conn):
+    """阶段产物输入指纹（原 migrate_step_fingerprint.py）"""
+    for table in ("manuscript_steps", "imitation_steps"):
+        _add_columns(conn, table, [("input_fingerprint", "VARCHAR(64)")])
+
+
+# 外键所在表 -> [(列, 父表)]
+FOREIGN_KEY_TABLES = {
+    "characters": [("project_id", "novel_projects")],
+    "plot_outlines": [("project_id", "novel_projects")],
+    "chapter_drafts": [("project_id", "novel_projects"), ("outline_id", "plot_outlines")],
+    "manuscripts": [("project_id", "novel_projects")],
+    "manuscript_steps": [("manuscript_id", "manuscripts")],
+    "agent_executions": [("agent_id", "agents")],
+    "agent_versions": [("execution_id", "agent_executions")],
+    "long_novel_mappings": [("project_id", "novel_projects")],
+}
+
+
+def _rebuild_sqlite_table(conn, table_name: str):
+    """按当前模型重建 SQLite 表（带外键），保留两边共有的列数据"""
+    table = Base.metadata.tables[table_name]
+    old_columns = {c["name"]: c["type"] for c in inspect(conn).get_columns(table_name)}
+    tmp_name = f"{table_name}__migrating"
+
+    conn.execute(text(f"DROP TABLE IF EXISTS {tmp_name}"))
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(ddl.replace(f"CREATE TABLE {table_name}", f"CREATE TABLE {tmp_name}", 1)))
+    # 老库中模型已不再声明的列也一并保留
+    for name, col_type in old_columns.items():
+        if name not in table.columns:
+            conn.execute(text(f'ALTER TABLE {tmp_name} ADD COLUMN "{name}" {col_type.compile(dialect=conn.dialect)}'))
+
+    common = list(old_columns)
+    column_list = ", ".join(f'"{c}"' for c in common)
+    conn.execute(text(f"INSERT INTO {tmp_name} ({column_list}) SELECT {column_list} FROM {table_name}"))
+    conn.execute(text(f"DROP TABLE {table_name}"))
+    conn.execute(text(f"ALTER TABLE {tmp_name} RENAME TO {table_name}"))
+    _create_model_indexes(conn, table_name)
+
+
+def m005_hot_indexes_and_foreign_keys(conn):
+    """热点查询列的索引和外键"""
+    is_sqlite = conn.dialect.name == "sqlite"
+    for table_name, fks in FOREIGN_KEY_TABLES.items():
+        if not _has_table(conn, table_name):
+            continue
+
+        # 悬空引用（父记录已删除、或占位的0）置空，保证外键一致
+        for column, parent in fks:
+            conn.execute(text(
+                f"UPDATE {table_name} SET {column} = NULL WHERE {column} IS NOT NULL "
+                f"AND {column} NOT IN (SELECT id FROM {parent})"
+            ))
+
+        existing_fks = {tuple(fk["constrained_columns"]) for fk in inspect(conn).get_foreign_keys(table_name)}
+        missing = [(c, p) for c, p in fks if (c,) not in existing_fks]
+        if missing and is_sqlite:
+            _rebuild_sqlite_table(conn, table_name)
+            print(f"  ✅ {table_name} 重建表并添加外键")
+        else:
+            for column, parent in missing:
+                ondelete = "SET NULL" if column == "outline_id" else "CASCADE"
+                conn.execute(text(
+                    f"ALTER TABLE {table_name} ADD CONSTRAINT fk_{table_name}_{column} "
+                    f"FOREIGN KEY ({column}) REFERENCES {parent} (id) ON DELETE {ondelete}"
+                ))
+                print(f"  ✅ {table_name}.{column} 添加外键")
+            _create_model_indexes(conn, table_name)
+
+
+# 需要在 PostgreSQL 上存为 JSONB 的列（与模型中 JSONB_COMPAT 列保持一致）
+JSONB_COLUMNS = [
+    ("example_analyses", "tags"),
+    ("plot_outlines", "plot_points"),
+    ("agents", "tags"),
+    ("reference_materials", "analysis"),
+    ("reference_materials", "tags"),
+    ("reference_materials", "similarity_tags"),
+]
+
+
+def m006_jsonb_and_tag_indexes(conn):
+    """PostgreSQL: JSON 列转 JSONB 并建 GIN 索引；素材列表排序索引"""
+    if conn.dialect.name == "postgresql":
+        for table_name, column in JSONB_COLUMNS:
+            if not _has_table(conn, table_name):
+                continue
+            types = {c["name"]: c["type"] for c in inspect(conn).get_columns(table_name)}
+            if column in types and type(types[column]).__name__ != "JSONB":
+                conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"))
+                print(f"  ✅ {table_name}.{column} 转为 JSONB")
+    if _has_table(conn, "reference_materials"):
+        # GIN 索引带 ddl_if(dialect='postgresql')，SQLite 上自动跳过
+        _create_model_indexes(conn, "reference_materials")
+
+
+def m007_search_index(conn):
+    """SQLite: 创建全文检索表并回填已有章节、素材、范文和稿件"""
+    if conn.dialect.name != "sqlite":
+        return
+    from sqlalchemy.orm import Session
+    from backend.database import search_index
+
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_index.TABLE} USING fts5("
+        "title, body, kind UNINDEXED, project_id UNINDEXED, tokenize='trigram')"
+    ))
+    session = Session(bind=conn)
+    try:
+        count = search_index.rebuild(session)
+    finally:
+        session.close()
+    if count:
+        print(f"  ✅ 全文检索索引回填: {count} 条")
+
+
+def m008_corpus_dedupe(conn):
+    """语料表：URL 哈希唯一索引和 SimHash 分段索引，回填已有语料"""
+    if not _has_table(conn, "corpus"):
+        return
+    from backend.database import corpus_store
+
+    _add_columns(conn, "corpus", [("url_hash", "VARCHAR(40)"), ("simhash", "BIGINT")] +
+                 [(f"simhash_band{i}", "INTEGER") for i in range(corpus_store.BANDS)])
+    rows = conn.execute(text("SELECT id, url, content FROM corpus WHERE simhash IS NULL ORDER BY id")).fetchall()
+    seen = {h for (h,) in conn.execute(text("SELECT url_hash FROM corpus WHERE url_hash IS NOT NULL"))}
+    repeated = 0
+    for row_id, url, content in rows:
+        values = {"id": row_id, "url_hash": corpus_store.url_hash(url),
+                  **corpus_store.simhash_columns(corpus_store.simhash(content))}
+        if values["url_hash"] in seen:
+            values["url_hash"] = None  # 老数据中的重复链接保留记录，但不参与唯一索引
+            repeated += 1
+        elif values["url_hash"]:
+            seen.add(values["url_hash"])
+        assignments = ", ".join(f"{column} = :{column}" for column in values if column != "id")
+        conn.execute(text(f"UPDATE corpus SET {assignments} WHERE id = :id"), values)
+    if rows:
+        print(f"  ✅ corpus 回填哈希: {len(rows)} 条（重复链接 {repeated} 条）")
+    _create_model_indexes(conn, "corpus")
+
+
+def m009_corpus_analyzed_at(conn):
+    """语料表：AI 分析时间（为空的由流水线补做 AI 分析）"""
+    if not _has_table(conn, "corpus"):
+        return
+    _add_columns(conn, "corpus", [("analyzed_at", "TIMESTAMP")])
+    _create_model_indexes(conn, "corpus")
+
+
+def m010_crawl_task_stats(conn):
+    """抓取任务表：各平台抓取耗时和各项条数（任务锁表由 create_all 新建）"""
+    _add_columns(conn, "crawl_tasks", [("duration", "FLOAT"), ("stats", "JSON")])
+
+
+def m011_plot_analysis_null(conn):
+    """例文表：修改原文时清空的情节分析曾存为 JSON 'null' 而非 SQL NULL，会被当作缓存命中"""
+    if not _has_table(conn, "example_analyses"):
+        return
+    result = conn.execute(text(
+        "UPDATE example_analyses SET plot_analysis = NULL WHERE CAST(plot_analysis AS TEXT) = 'null'"))
+    if result.rowcount:
+        print(f"  ✅ example_analyses 清理空的情节分析缓存: {result.rowcount} 条")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "character_card_columns", m001_character_card_columns),
+    (2, "channel_agents", m002_channel_agents),
+    (3, "content_hash", m003_content_hash),
+    (4, "step_fingerprint", m004_step_fingerprint),
+    (5, "hot_indexes_and_foreign_keys", m005_hot_indexes_and_foreign_keys),
+    (6, "jsonb_and_tag_indexes", m006_jsonb_and_tag_indexes),
+    (7, "search_index", m007_search_index),
+    (8, "corpus_dedupe", m008_corpus_dedupe),
+    (9, "corpus_analyzed_at", m009_corpus_analyzed_at),
+    (10, "crawl_task_stats", m010_crawl_task_stats),
+    (11, "plot_analysis_null", m011_plot_analysis_null),
+]
+
+
+# ========== 执行器 ==========
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(100), applied_at TIMESTAMP)"
+    ))
+
+
+def applied_versions(bind=engine) -> List[int]:
+    with bind.begin() as conn:
+        _ensure_version_table(conn)
+        return [row[0] for row in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+
+
+def run_migrations(bind=engine) -> List[int]:
+    """执行所有未应用的迁移，返回本次应用的版本号"""
+    done = set(applied_versions(bind))
+    pending = [m for m in MIGRATIONS if m[0] not in done]
+    if not pending:
+        return []
+
+    applied = []
+    with bind.connect() as conn:
+        is_sqlite = conn.dialect.name == "sqlite"
+        if is_sqlite:
+            # 重建表期间关闭外键检查（该 PRAGMA 在事务内无效）
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        try:
+            for version, name, func in pending:
+                print(f"🔧 执行迁移 {version:03d}_{name}")
+                if is_sqlite:
+                    # pysqlite 不会为 DDL 自动开启事务，显式 BEGIN 保证单个迁移原子执行
+                    conn.exec_driver_sql("BEGIN")
+                try:
+                    func(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                        {"v": version, "n": name, "t": datetime.now()}
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(version)
+
+            if is_sqlite:
+                violations = conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    print(f"⚠️ 外键检查发现 {len(violations)} 条不一致记录")
+        finally:
+            if is_sqlite:
+                conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+    print(f"✅ 数据库迁移完成: {applied}")
+    return applied
+
+
+# ========== 查询计划检查 ==========
+
+# (名称, SQL, 期望使用的索引)
+HOT_QUERIES = [
+    ("项目人物", "SELECT * FROM characters WHERE project_id = 1", "ix_characters_project_id"),
+    ("项目大纲", "SELECT * FROM plot_outlines WHERE project_id = 1 ORDER BY chapter_number",
+     "ix_plot_outlines_project_chapter"),
+    ("项目章节", "SELECT * FROM chapter_drafts WHERE project_id = 1 ORDER BY chapter_number",
+     "ix_chapter_drafts_project_chapter"),
+    ("大纲章节", "SELECT * FROM chapter_drafts WHERE outline_id = 1", "ix_chapter_drafts_outline_id"),
+    ("项目稿件", "SELECT * FROM manuscripts WHERE project_id = 1 ORDER BY created_at DESC",
+     "ix_manuscripts_project_created"),
+    ("稿件步骤", "SELECT * FROM manuscript_steps WHERE manuscript_id = 1 AND step_name = 'outline'",
+     "ix_manuscript_steps_manuscript_step"),
+    ("智能体执行", "SELECT * FROM agent_executions WHERE agent_id = 1", "ix_agent_executions_agent_id"),
+    ("执行版本", "SELECT * FROM agent_versions WHERE execution_id = 1", "ix_agent_versions_execution_id"),
+    ("长文映射", "SELECT * FROM long_novel_mappings WHERE project_id = 1 ORDER BY volume_number",
+     "ix_long_novel_mappings_project_volume"),
+    ("素材列表", "SELECT * FROM reference_materials ORDER BY created_at DESC, id DESC LIMIT 50",
+     "ix_reference_materials_created"),
+    ("语料链接", "SELECT id FROM corpus WHERE url_hash IN ('a', 'b')", "ux_corpus_url_hash"),
+    ("抓取队列", "SELECT * FROM crawl_frontier WHERE source = 'a' AND next_fetch_at <= '2024-01-01' "
+     "ORDER BY priority DESC LIMIT 20", "ix_crawl_frontier_due"),
+    ("待AI分析语料", "SELECT id, content FROM corpus WHERE analyzed_at IS NULL ORDER BY id DESC LIMIT 6",
+     "ix_corpus_analyzed_at"),
+]
+
+
+def check_query_plans(bind=engine) -> List[Tuple[str, bool, str]]:
+    """对热点查询执行 EXPLAIN QUERY PLAN，确认走了预期索引（仅 SQLite）"""
+    results = []
+    with bind.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            return results
+        for name, sql, index_name in HOT_QUERIES:
+            plan = " | ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+            ok = index_name in plan and "USE TEMP B-TREE" not in plan
+            results.append((name, ok, plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库版本迁移")
+    parser.add_argument("--status", action="store_true", help="查看迁移状态")
+    parser.add_argument("--check-plans", action="store_true", help="检查热点查询的执行计划")
+    args = parser.parse_args()
+
+    if args.status:
+        done = set(applied_versions())
+        for version, name, _ in MIGRATIONS:
+            print(f"{'✅' if version in done else '⏳'} {version:03d}_{name}")
+        return
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations()
+
+    if args.check_plans:
+        failed = 0
+        for name, ok, plan in check_query_plans():
+            print(f"{'✅' if ok else '❌'} {name}: {plan}")
+            failed += 0 if ok else 1
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,202 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float, create_engine
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Text, DateTime, JSON, Float, ForeignKey, Index, LargeBinary, create_engine, event,
+    and_, exists, func, text, type_coerce
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from datetime import datetime
+import hashlib
 import os
 
+from backend.database.db_metrics import TrackedSession, watch_pool
+
 Base = declarative_base()
 
 # 数据库配置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./novel_generator.db")
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# 引擎配置: production(默认, WAL+调优连接池) / default(SQLAlchemy默认配置)
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))          # 常驻连接数，覆盖生成线程池(5) + 请求线程
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))    # 突发时额外连接数
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))    # 等待连接超时(秒)
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "15000"))          # 锁等待(毫秒)
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))             # 负数表示KB，即64MB
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256MB
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # PostgreSQL 连接回收(秒)，避免被服务端/代理断开
+
+# PostgreSQL 下存为 JSONB（支持 GIN 索引与 @> 包含查询），SQLite 下仍为 JSON
+JSONB_COMPAT = JSON().with_variant(JSONB(), "postgresql")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新连接建立时设置 SQLite 运行参数"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute("PRAGMA journal_mode=WAL")      # 读写互不阻塞
+    cursor.execute("PRAGMA synchronous=NORMAL")    # WAL 下安全且减少 fsync
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")      # 启用外键约束（级联删除）
+    cursor.close()
+
+
+def _is_postgres(database_url: str) -> bool:
+    return database_url.startswith(("postgresql", "postgres://"))
+
+
+def _require_postgres_drivers():
+    """PostgreSQL 同步引擎用 psycopg2、异步引擎用 asyncpg，缺少时给出安装提示"""
+    missing = []
+    for module, package in (("psycopg2", "psycopg2-binary"), ("asyncpg", "asyncpg")):
+        try:
+            __import__(module)
+        except ImportError:
+            missing.append(package)
+    if missing:
+        raise ImportError(f"使用 PostgreSQL 需要安装 {', '.join(missing)}: pip install -r requirements-postgres.txt")
+
+
+def _postgres_pool_args() -> dict:
+    """多实例共享 PostgreSQL 时的连接池参数（每个实例同步、异步引擎各一个池）"""
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _sync_url(database_url: str) -> str:
+    # SQLAlchemy 2.0 不再识别 postgres:// 写法（部分云平台默认提供这种连接串）
+    if database_url.startswith("postgres://"):
+        return database_url.replace("postgres://", "postgresql://", 1)
+    return database_url
+
+
+def create_db_engine(database_url: str = DATABASE_URL, profile: str = DB_PROFILE):
+    """按配置创建数据库引擎"""
+    database_url = _sync_url(database_url)
+    if _is_postgres(database_url):
+        _require_postgres_drivers()
+    if profile == "production" and _is_postgres(database_url):
+        return create_engine(database_url, echo=False, **_postgres_pool_args())
+
+    is_file_sqlite = database_url.startswith("sqlite") and ":memory:" not in database_url
+    if profile != "production" or not is_file_sqlite:
+        return create_engine(database_url, echo=False)
+
+    new_engine = create_engine(
+        database_url,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    event.listen(new_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+engine = create_db_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=TrackedSession)
+watch_pool("sync", engine)
+
+
+def _async_url(database_url: str) -> str:
+    """同步连接串转换为异步驱动连接串"""
+    database_url = _sync_url(database_url)
+    if database_url.startswith("sqlite:///"):
+        return database_url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if _is_postgres(database_url):
+        # postgresql:// 与 postgresql+psycopg2:// 统一换成 asyncpg 驱动
+        return "postgresql+asyncpg://" + database_url.split("://", 1)[1]
+    return database_url
+
+
+def create_async_db_engine(database_url: str = DATABASE_URL, profile: str = DB_PROFILE, pooled: bool = True):
+    """
+    按配置创建异步引擎 (SQLite 使用 aiosqlite，PostgreSQL 使用 asyncpg，查询不阻塞事件循环)
+
+    pooled=False 时每次会话结束即关闭连接：aiosqlite 每个连接占用一个非守护线程，asyncpg 连接绑定创建它的事件循环，
+    池中的空闲连接必须在同一个事件循环里 dispose，否则进程退出时会一直等待这些线程
+    """
+    url = _async_url(database_url)
+    is_file_sqlite = database_url.startswith("sqlite") and ":memory:" not in database_url
+    if not pooled and (is_file_sqlite or _is_postgres(database_url)):
+        new_engine = create_async_engine(url, echo=False, poolclass=NullPool,
+                                         connect_args={"timeout": SQLITE_BUSY_TIMEOUT / 1000} if is_file_sqlite else {})
+        if is_file_sqlite and profile == "production":
+            event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return new_engine
+    if profile == "production" and _is_postgres(database_url):
+        return create_async_engine(url, echo=False, **_postgres_pool_args())
+
+    if profile != "production" or not is_file_sqlite:
+        return create_async_engine(url, echo=False)
+
+    new_engine = create_async_engine(
+        url,
+        echo=False,
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT / 1000},
+        poolclass=AsyncAdaptedQueuePool,  # aiosqlite 默认 NullPool，每次查询都会新建连接
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+# 异步会话只用于事件循环中的只读接口；后台线程仍使用 SessionLocal
+# 默认不保留连接（脚本、测试直接调用接口后可以正常退出），应用运行期间由 open_async_pool / close_async_pool 换成连接池
+async_engine = create_async_db_engine(pooled=False)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False,
+                                       sync_session_class=TrackedSession)
+watch_pool("async", async_engine.sync_engine)
+
+
+async def open_async_pool():
+    """在服务的事件循环中启用异步连接池（应用启动时调用）"""
+    global async_engine
+    pooled = create_async_db_engine()
+    watch_pool("async", pooled.sync_engine)
+    AsyncSessionLocal.configure(bind=pooled)
+    async_engine = pooled
+
+
+async def close_async_pool():
+    """关闭异步连接池并恢复为不保留连接（应用关闭时调用）"""
+    global async_engine
+    pooled = async_engine
+    async_engine = create_async_db_engine(pooled=False)
+    watch_pool("async", async_engine.sync_engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    await pooled.dispose()
+
+
+def json_contains_all(column, values):
+    """
+    JSON 数组字段包含全部给定值
+
+    PostgreSQL 使用 JSONB @>（走 GIN 索引）；SQLite 用 json_each 逐个精确匹配
+    （JSON.contains 在 SQLite 上会退化为对序列化文本的 LIKE，结果不可靠）
+    """
+    values = list(values)
+    if engine.dialect.name == "postgresql":
+        return type_coerce(column, JSONB).contains(values)
+    conditions = []
+    for value in values:
+        elements = func.json_each(column).table_valued("value")
+        conditions.append(exists().where(elements.c.value == value))
+    return and_(*conditions)
 
 
 class ExampleAnalysis(Base):
@@ -20,6 +207,8 @@ class ExampleAnalysis(Base):
     title = Column(String(200))  # 例文标题
     source_url = Column(String(500))  # 来源链接（可选）
     content = Column(Text)  # 例文原文内容
+    content_hash = Column(String(64), index=True)  # 原文内容哈希，用于复用拆解结果
+    plot_analysis = Column(JSON(none_as_null=True))  # AI情节分析结果缓存（None 存为 SQL NULL，即未缓存）
 
     # 拆解内容
     analysis_title = Column(Text)  # 文章名称（拆解后的）
@@ -29,7 +218,7 @@ class ExampleAnalysis(Base):
     character_profile = Column(Text)  # 人设分析
 
     notes = Column(Text)  # 个人学习笔记
-    tags = Column(JSON)  # 标签 ['世情文', '追妻火葬场']
+    tags = Column(JSONB_COMPAT)  # 标签 ['世情文', '追妻火葬场']
 
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now)
@@ -70,7 +259,7 @@ class Character(Base):
     __tablename__ = 'characters'
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer)  # 关联的项目ID
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'), index=True)  # 关联的项目ID
 
     # 基本信息
     name = Column(String(100))  # 姓名
@@ -128,9 +317,12 @@ class Character(Base):
 class PlotOutline(Base):
     """情节大纲表 - 支持分章大纲管理"""
     __tablename__ = 'plot_outlines'
+    __table_args__ = (
+        Index('ix_plot_outlines_project_chapter', 'project_id', 'chapter_number'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer)  # 关联的项目ID
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'))  # 关联的项目ID
 
     # 大纲层级
     level = Column(String(20))  # story(故事梗概), chapter(章节大纲), scene(场景细节)
@@ -142,7 +334,7 @@ class PlotOutline(Base):
     summary = Column(Text)  # 章节摘要
 
     # 情节要点
-    plot_points = Column(JSON)  # 情节要点列表 ["主角发现真相", "与反派对峙"]
+    plot_points = Column(JSONB_COMPAT)  # 情节要点列表 ["主角发现真相", "与反派对峙"]
     key_events = Column(JSON)  # 关键事件 [{"time": "", "location": "", "event": "", "characters": []}]
 
     # 章节设定
@@ -166,10 +358,13 @@ class PlotOutline(Base):
 class ChapterDraft(Base):
     """章节草稿表 - 支持分步写作和编辑"""
     __tablename__ = 'chapter_drafts'
+    __table_args__ = (
+        Index('ix_chapter_drafts_project_chapter', 'project_id', 'chapter_number'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer)  # 关联的项目ID
-    outline_id = Column(Integer)  # 关联的大纲ID
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'))  # 关联的项目ID
+    outline_id = Column(Integer, ForeignKey('plot_outlines.id', ondelete='SET NULL'), index=True)  # 关联的大纲ID
 
     # 章节信息
     chapter_number = Column(Integer)  # 章节序号
@@ -221,12 +416,91 @@ class CrawlTask(Base):
     status = Column(String(20), default="pending")  # pending, running, success, failed
     url_count = Column(Integer, default=0)  # 爬取URL数量
     success_count = Column(Integer, default=0)  # 成功数量
+    duration = Column(Float)  # 抓取耗时（秒，列表页和正文）
+    stats = Column(JSON)  # 各项条数 {"discovered": 新入队, "fetched", "saved", "updated", "unchanged", "skipped", "failed"}
     error_message = Column(Text)
     started_at = Column(DateTime)
     finished_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.now)
 
 
+class SchedulerLock(Base):
+    """定时任务锁（见 job_lock）：多个节点共用数据库时，同一时间只有持有者执行任务"""
+    __tablename__ = 'scheduler_locks'
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(200), nullable=False)  # 主机名:进程号:随机串
+    acquired_at = Column(DateTime)
+    expires_at = Column(DateTime, nullable=False)  # 持有者定期续期，过期后其他节点可获取
+
+
+class Corpus(Base):
+    """爬取语料表（去重逻辑见 corpus_store）"""
+    __tablename__ = 'corpus'
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(50), index=True)  # 来源平台
+    title = Column(String(500))
+    content = Column(Text)
+    url = Column(String(1000))
+    url_hash = Column(String(40))  # 规范化 URL 的 sha1，无 URL 时为空
+    simhash = Column(BigInteger)  # 正文 64 位 SimHash（按有符号整数存储）
+    # SimHash 八段各 8 位，分别建索引（含 simhash 列，查候选不回表）用于近似重复查找；正文过短时为空
+    simhash_band0 = Column(Integer)
+    simhash_band1 = Column(Integer)
+    simhash_band2 = Column(Integer)
+    simhash_band3 = Column(Integer)
+    simhash_band4 = Column(Integer)
+    simhash_band5 = Column(Integer)
+    simhash_band6 = Column(Integer)
+    simhash_band7 = Column(Integer)
+    plot_tags = Column(JSONB_COMPAT)  # 情节标签
+    emotion_score = Column(Float)  # 情绪强度 0-10
+    view_count = Column(Integer, default=0)
+    analyzed_at = Column(DateTime)  # AI 分析时间，为空表示只有规则分析结果（见 pipeline）
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ux_corpus_url_hash", "url_hash", unique=True),
+        Index("ix_corpus_analyzed_at", "analyzed_at"),
+        Index("ix_corpus_simhash_band0", "simhash_band0", "simhash"),
+        Index("ix_corpus_simhash_band1", "simhash_band1", "simhash"),
+        Index("ix_corpus_simhash_band2", "simhash_band2", "simhash"),
+        Index("ix_corpus_simhash_band3", "simhash_band3", "simhash"),
+        Index("ix_corpus_simhash_band4", "simhash_band4", "simhash"),
+        Index("ix_corpus_simhash_band5", "simhash_band5", "simhash"),
+        Index("ix_corpus_simhash_band6", "simhash_band6", "simhash"),
+        Index("ix_corpus_simhash_band7", "simhash_band7", "simhash"),
+    )
+
+
+class CrawlFrontier(Base):
+    """持久化抓取队列：待抓取和待重抓的正文链接（调度逻辑见 crawler/frontier）"""
+    __tablename__ = 'crawl_frontier'
+
+    id = Column(Integer, primary_key=True, index=True)
+    url_hash = Column(String(40), nullable=False)  # 规范化 URL 的 sha1（同 corpus.url_hash）
+    url = Column(String(1000), nullable=False)
+    source = Column(String(50))  # 来源平台
+    title = Column(String(500))  # 列表页上的标题
+    priority = Column(Integer, default=0)  # 越大越先抓；新发现的链接按榜单排名，重抓为 0
+    next_fetch_at = Column(DateTime, nullable=False)  # 下次抓取时间
+    retries = Column(Integer, default=0)  # 连续失败次数
+    recrawl_interval = Column(Integer)  # 当前重抓间隔（秒），随页面变化频率调整
+    content_hash = Column(String(40))  # 上次正文的 sha1，为空表示尚未成功抓取
+    fetch_count = Column(Integer, default=0)
+    change_count = Column(Integer, default=0)
+    last_fetched_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ux_crawl_frontier_url_hash", "url_hash", unique=True),
+        # 按优先级、到期时间顺序扫描，取到足够的到期链接即停止
+        Index("ix_crawl_frontier_due", "source", text("priority DESC"), "next_fetch_at"),
+    )
+
+
 class Submission(Base):
     """投稿记录表"""
     __tablename__ = 'submissions'
@@ -248,12 +522,26 @@ class Submission(Base):
 
 
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：建表后执行未应用的版本迁移"""
     Base.metadata.create_all(bind=engine)
 
+    from backend.database.migrations import run_migrations
+    run_migrations(engine)
+
+
+def compute_content_hash(text: str) -> str:
+    """计算正文内容哈希（忽略首尾空白）"""
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
 
-def get_db():
-    """获取数据库会话"""
+async def get_db():
+    """
+    请求级数据库会话，供接口以 Depends(get_db) 注入，请求结束后关闭
+
+    使用异步生成器，创建和关闭会话都在事件循环内完成，不必两次切换到线程池
+    （接口本身的同步查询原本就在事件循环中执行）
+    后台任务/线程请直接使用 SessionLocal() 并在 finally 中 close()
+    """
     db = SessionLocal()
     try:
         yield db
@@ -290,7 +578,7 @@ class Agent(Base):
     require_approval = Column(Integer, default=0)  # 是否需要审批（0=否, 1=是）
 
     # 标签与排序
-    tags = Column(JSON)  # 标签 ["导语", "短篇", "世情文"]
+    tags = Column(JSONB_COMPAT)  # 标签 ["导语", "短篇", "世情文"]
     order = Column(Integer, default=0)  # 排序
 
     # 使用统计
@@ -310,7 +598,7 @@ class AgentExecution(Base):
     __tablename__ = 'agent_executions'
 
     id = Column(Integer, primary_key=True, index=True)
-    agent_id = Column(Integer)  # 关联的智能体ID
+    agent_id = Column(Integer, ForeignKey('agents.id', ondelete='CASCADE'), index=True)  # 关联的智能体ID
 
     # 输入数据
     input_variables = Column(JSON)  # 用户输入的变量值 {"对标作品": "xxx", "导语": "xxx"}
@@ -336,7 +624,7 @@ class AgentVersion(Base):
     __tablename__ = 'agent_versions'
 
     id = Column(Integer, primary_key=True, index=True)
-    execution_id = Column(Integer)  # 关联的执行记录ID
+    execution_id = Column(Integer, ForeignKey('agent_executions.id', ondelete='CASCADE'), index=True)  # 关联的执行记录ID
     agent_id = Column(Integer)  # 关联的智能体ID
 
     # 版本信息
@@ -377,6 +665,14 @@ class AgentShare(Base):
 class ReferenceMaterial(Base):
     """参考素材表 - 用于写同款功能"""
     __tablename__ = 'reference_materials'
+    __table_args__ = (
+        Index('ix_reference_materials_created', 'created_at', 'id'),  # 列表按时间倒序游标分页
+        # GIN 索引仅在 PostgreSQL 上创建：tags @> '["狗血"]' 与 similarity_tags ? '狗血'
+        Index('ix_reference_materials_tags_gin', 'tags', postgresql_using='gin',
+              postgresql_ops={'tags': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_reference_materials_similarity_tags_gin', 'similarity_tags',
+              postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -398,9 +694,9 @@ class ReferenceMaterial(Base):
     raw_content = Column(Text)  # 提取的文本内容
 
     # AI分析结果
-    analysis = Column(JSON)  # 完整的AI分析结果
+    analysis = Column(JSONB_COMPAT)  # 完整的AI分析结果
     genre = Column(String(100))  # 题材类型（世情文、追妻火葬场等）
-    tags = Column(JSON)  # 标签 ["狗血", "虐恋", "复仇"]
+    tags = Column(JSONB_COMPAT)  # 标签 ["狗血", "虐恋", "复仇"]
     core_conflict = Column(Text)  # 核心冲突
     emotion_style = Column(String(100))  # 情绪风格（压抑、爆发、温暖等）
     writing_style = Column(Text)  # 写作风格描述
@@ -412,7 +708,7 @@ class ReferenceMaterial(Base):
     plot_structure = Column(JSON)  # 情节结构 [{"chapter": 1, "summary": "", "emotion": ""}]
 
     # 同款度评分（用于推荐相似素材）
-    similarity_tags = Column(JSON)  # 相似度标签 {"狗血": 0.9, "虐恋": 0.8}
+    similarity_tags = Column(JSONB_COMPAT)  # 相似度标签 {"狗血": 0.9, "虐恋": 0.8}
 
     # 使用统计
     usage_count = Column(Integer, default=0)  # 被使用的次数
@@ -588,9 +884,12 @@ class ChannelAgent(Base):
 class Manuscript(Base):
     """稿件存储表 - 用于保存每次生成的版本及对应审稿建议"""
     __tablename__ = 'manuscripts'
+    __table_args__ = (
+        Index('ix_manuscripts_project_created', 'project_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer)  # 关联的项目ID
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'))  # 关联的项目ID（未成文前为空）
     title = Column(String(200))   # 稿件标题
     content = Column(JSON)        # 稿件正文 (可能是章节内容列表)
     review_report = Column(Text)  # AI 审稿报告
@@ -607,20 +906,27 @@ class Manuscript(Base):
 class ManuscriptStep(Base):
     """稿件生成步骤表 - 存储中间产物"""
     __tablename__ = 'manuscript_steps'
+    __table_args__ = (
+        Index('ix_manuscript_steps_manuscript_step', 'manuscript_id', 'step_name'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    manuscript_id = Column(Integer)  # 关联的稿件ID
+    manuscript_id = Column(Integer, ForeignKey('manuscripts.id', ondelete='CASCADE'))  # 关联的稿件ID
     step_name = Column(String(50))   # 步骤名称: settings, outline, chapters
     step_data = Column(JSON)         # 步骤数据 (JSON)
+    input_fingerprint = Column(String(64), index=True)  # 输入指纹 (上游产物+参数+模型)，用于复用
     created_at = Column(DateTime, default=datetime.now)
 
 
 class LongNovelMapping(Base):
     """长文映射表 - 记录短篇每个章节如何扩展为长篇的一卷"""
     __tablename__ = 'long_novel_mappings'
+    __table_args__ = (
+        Index('ix_long_novel_mappings_project_volume', 'project_id', 'volume_number'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer)  # 长文项目ID
+    project_id = Column(Integer, ForeignKey('novel_projects.id', ondelete='CASCADE'))  # 长文项目ID
     short_chapter_title = Column(String(200)) # 短篇章节标题
     short_chapter_summary = Column(Text)      # 短篇章节摘要
     volume_number = Column(Integer)           # 对应长篇卷号
@@ -641,6 +947,7 @@ class ImitationProject(Base):
     # 原文信息
     original_title = Column(String(200))  # 原文标题
     original_content = Column(Text)  # 原文内容
+    content_hash = Column(String(64), index=True)  # 原文内容哈希，相同原文复用拆解结果
     original_source = Column(String(500))  # 原文来源（URL或文件名）
 
     # 新设定信息
@@ -667,6 +974,7 @@ class ImitationStep(Base):
 
     step_name = Column(String(50))  # 步骤名称：deconstruction, configuration, preview, generation
     step_data = Column(JSON)  # 步骤数据
+    input_fingerprint = Column(String(64), index=True)  # 输入指纹，用于复用
     status = Column(String(20), default="pending")  # pending, in_progress, completed, failed
     error_message = Column(Text)  # 错误信息
 
@@ -674,3 +982,52 @@ class ImitationStep(Base):
     updated_at = Column(DateTime, default=datetime.now)
 
 
+
+
+class DeconstructionChunk(Base):
+    """拆解分块缓存表 - 按分块内容哈希缓存单块拆解结果"""
+    __tablename__ = 'deconstruction_chunks'
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True)  # sha256(提示词 + 分块正文)
+    char_count = Column(Integer, default=0)  # 分块字数
+    result = Column(JSON)  # 单块拆解结果
+
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class ContentBlob(Base):
+    """正文块存储表 - 按内容哈希去重的压缩大文本，大字段中只保存引用"""
+    __tablename__ = 'content_blobs'
+
+    content_hash = Column(String(64), primary_key=True)  # sha256(原文)
+    codec = Column(String(10), default="zlib")  # 压缩算法: zlib / zstd
+    size = Column(Integer, default=0)  # 原文字节数
+    stored_size = Column(Integer, default=0)  # 压缩后字节数
+    data = Column(LargeBinary)  # 压缩数据
+    ref_count = Column(Integer, default=0)  # 引用计数，为0时可被回收
+
+    created_at = Column(DateTime, default=datetime.now)
+
+
+
+class ManuscriptVersion(Base):
+    """稿件版本表 - 基准快照 + 段落级增量，稿件正文按版本链还原"""
+    __tablename__ = 'manuscript_versions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    manuscript_id = Column(Integer, ForeignKey('manuscripts.id', ondelete='CASCADE'), unique=True)  # 对应稿件
+    base_version_id = Column(Integer, index=True)  # 上一版本ID（快照为空）
+    snapshot_id = Column(Integer, index=True)  # 所属快照ID（快照指向自身）
+    kind = Column(String(10), default="snapshot")  # snapshot(完整快照) / delta(增量)
+    depth = Column(Integer, default=0)  # 距快照的增量层数
+    data = Column(JSON)  # 快照为完整正文，增量为段落级差异
+    stored_size = Column(Integer, default=0)  # 序列化后的字节数
+
+    created_at = Column(DateTime, default=datetime.now)
+
+
+# 注册大字段的正文块存储钩子（需在所有模型定义之后导入）
+from backend.database import blob_store  # noqa: E402,F401
+# 全文检索钩子需在正文块钩子之后注册，flush 后才能拿到还原的原文
+from backend.database import search_index  # noqa: E402,F401
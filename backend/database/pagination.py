@@ -0,0 +1,180 @@
+"""
+列表分页工具 - 游标(keyset)分页 + 稀疏字段
+
+- 游标 = 上一页最后一行的排序列取值（base64 编码的 JSON），翻页不依赖 OFFSET
+- 排序列最后一项必须唯一（通常为 id），保证翻页稳定
+- NULL 排序显式指定：升序 NULL 在前，降序 NULL 在后（与 SQLite 默认一致，PostgreSQL 下同样成立）
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, false, DateTime
+
+# 单页条数上限
+MAX_PAGE_SIZE = 500
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], default: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    解析 fields=a,b,c 参数
+
+    未传时返回 default（缺省为全部字段）；出现未知字段时抛 ValueError
+    """
+    if not fields:
+        return list(default or allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}；可选字段: {', '.join(allowed)}")
+    # id 始终返回，便于前端定位
+    if "id" in allowed and "id" not in requested:
+        requested.insert(0, "id")
+    return requested
+
+
+def clamp_limit(limit: Optional[int], default: int) -> int:
+    """把 limit 限制在 [1, MAX_PAGE_SIZE]"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def page_limit(limit: Optional[int], cursor: Optional[str], default: int) -> Optional[int]:
+    """
+    列表接口的单页条数：未传 limit 和 cursor 时返回 None，即不分页、返回全部（兼容不翻页的旧调用方）；
+    否则同 clamp_limit
+    """
+    if not limit and not cursor:
+        return None
+    return clamp_limit(limit, default)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(column, value: Any) -> Any:
+    if value is not None and isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values: Iterable[Any]) -> str:
+    payload = json.dumps([_encode_value(v) for v in values], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """解析游标；格式不对时抛 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("无效的分页游标")
+    try:
+        return [_decode_value(col, v) for col, v in zip(columns, values)]
+    except (TypeError, ValueError):
+        raise ValueError("无效的分页游标")
+
+
+def _after(column, direction: str, value: Any):
+    """排序意义上严格位于 value 之后的条件"""
+    if direction == "asc":
+        # 升序 NULL 在前：NULL 之后是所有非 NULL 值
+        return column.isnot(None) if value is None else column > value
+    # 降序 NULL 在后：NULL 之后没有值
+    return false() if value is None else or_(column < value, column.is_(None))
+
+
+def _equal(column, value: Any):
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_condition(order: Sequence[Tuple[Any, str]], values: Sequence[Any]):
+    """
+    构造 (c1, c2, ...) > (v1, v2, ...) 的 keyset 条件，支持混合升降序
+
+    展开为: c1 后于 v1 OR (c1 = v1 AND c2 后于 v2) OR ...
+    """
+    clauses = []
+    for i, (column, direction) in enumerate(order):
+        prefix = [_equal(c, v) for (c, _), v in zip(order[:i], values[:i])]
+        clauses.append(and_(*prefix, _after(column, direction, values[i])))
+    return or_(*clauses)
+
+
+def _order_clause(column, direction: str):
+    if direction == "asc":
+        return column.asc().nulls_first()
+    return column.desc().nulls_last()
+
+
+def _row_value(row, column) -> Any:
+    # 查询带附加列时每行是 Row(实体, ...)，取第一个元素
+    entity = row[0] if hasattr(row, "_mapping") else row
+    return getattr(entity, column.key)
+
+
+def apply_keyset(query, order: Sequence[Tuple[Any, str]], cursor: Optional[str], limit: Optional[int]):
+    """给 Query 或 select() 加上游标条件、排序，并多取一行用于判断是否有下一页；limit 为 None 时不限条数"""
+    if cursor:
+        columns = [column for column, _ in order]
+        query = query.filter(keyset_condition(order, decode_cursor(cursor, columns)))
+    query = query.order_by(*[_order_clause(c, d) for c, d in order])
+    return query if limit is None else query.limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], order: Sequence[Tuple[Any, str]],
+               limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+    """截取本页并生成下一页游标；没有下一页时游标为 None"""
+    rows = list(rows)
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_row_value(rows[-1], c) for c, _ in order])
+    return rows, next_cursor
+
+
+def keyset_paginate(query, order: Sequence[Tuple[Any, str]], cursor: Optional[str] = None,
+                    limit: Optional[int] = 50) -> Tuple[List[Any], Optional[str]]:
+    """
+    按 order 对 query 做游标分页
+
+    order: [(列, "asc"|"desc"), ...]，最后一项必须是唯一列；limit 为 None 时返回全部
+    返回 (本页行, 下一页游标)；没有下一页时游标为 None
+    """
+    return split_page(apply_keyset(query, order, cursor, limit).all(), order, limit)
+
+
+def load_columns(column_map: Dict[str, Any], fields: Sequence[str], order: Sequence[Tuple[Any, str]]) -> List[Any]:
+    """
+    计算 load_only 需要的列：请求字段对应的列 + 排序列
+
+    大字段（正文、JSON）只有被显式请求时才会读取
+    """
+    columns = {}
+    for column in [column_map[f] for f in fields if f in column_map] + [c for c, _ in order]:
+        columns.setdefault(column.key, column)
+    return list(columns.values())
+
+
+def to_dict(entity, fields: Sequence[str], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """按请求字段序列化实体，datetime 转 ISO 字符串；extra 提供非列字段的值"""
+    result = {}
+    for field in fields:
+        value = extra[field] if extra and field in extra else getattr(entity, field)
+        result[field] = _encode_value(value)
+    return result
+
+
+async def keyset_paginate_async(db, stmt, order: Sequence[Tuple[Any, str]], cursor: Optional[str] = None,
+                                limit: Optional[int] = 50) -> Tuple[List[Any], Optional[str]]:
+    """keyset_paginate 的异步版本，stmt 为 select(实体)，db 为 AsyncSession"""
+    result = await db.execute(apply_keyset(stmt, order, cursor, limit))
+    return split_page(result.scalars().all(), order, limit)
@@ -0,0 +1,316 @@
+"""
+全文检索 - SQLite FTS5 索引章节、参考素材、范文和稿件
+
+- 中文没有空格分词，使用 trigram 分词：任意 ≥3 字的片段都能走索引命中
+- 少于 3 字的检索词无法走索引，退化为 LIKE 扫描（结果仍正确，只是较慢）
+- 章节/稿件正文存在正文块和版本链中，SQL 触发器拿不到原文，因此用 ORM 钩子在 flush 时同步
+- rowid = 记录ID * 8 + 类型编码，更新/删除按 rowid 直接定位
+- 仅支持 SQLite；其他数据库上钩子不生效，检索接口返回 501
+
+批量 SQL 更新绕过 ORM 时需重建索引:
+用法: python -m backend.database.search_index [--rebuild] [--stats]
+"""
+
+import argparse
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import DDL, event, inspect, text
+from sqlalchemy.orm import Session
+
+from backend.database.models import (
+    Base, ChapterDraft, ExampleAnalysis, Manuscript, NovelProject, ReferenceMaterial
+)
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() != "false"
+
+TABLE = "search_index"
+MIN_TERM_LENGTH = 3  # trigram 可索引的最短检索词
+
+# 类型 -> rowid 中的类型编码
+KINDS = {"chapter": 1, "material": 2, "example": 3, "manuscript": 4}
+_KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+# 新库 create_all 时一并创建（老库由迁移 007 创建并回填）
+event.listen(Base.metadata, "after_create", DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "title, body, kind UNINDEXED, project_id UNINDEXED, tokenize='trigram')"
+).execute_if(dialect="sqlite"))
+
+
+def manuscript_text(content: Any) -> str:
+    """稿件正文（章节列表 / {"chapters": [...]} / 纯文本）拼成检索文本"""
+    if isinstance(content, str):
+        return content
+    chapters = content.get("chapters") if isinstance(content, dict) else content
+    if not isinstance(chapters, list):
+        return ""
+    parts = []
+    for chapter in chapters:
+        if isinstance(chapter, dict):
+            parts.append(f"{chapter.get('title') or ''}\n{chapter.get('content') or ''}".strip())
+        elif isinstance(chapter, str):
+            parts.append(chapter)
+    return "\n\n".join(parts)
+
+
+# 模型 -> (类型, 影响索引的字段, 提取 (标题, 正文, 项目ID))
+DOCUMENTS = {
+    ChapterDraft: ("chapter", ("title", "content", "chapter_number", "project_id"),
+                   lambda o: (o.title or f"第{o.chapter_number}章", o.content, o.project_id)),
+    ReferenceMaterial: ("material", ("title", "raw_content"),
+                        lambda o: (o.title, o.raw_content, None)),
+    ExampleAnalysis: ("example", ("title", "content"),
+                      lambda o: (o.title, o.content, None)),
+    Manuscript: ("manuscript", ("title", "content", "project_id"),
+                 lambda o: (o.title, manuscript_text(o.content), o.project_id)),
+}
+
+
+def _enabled(connection) -> bool:
+    return SEARCH_INDEX_ENABLED and connection.dialect.name == "sqlite"
+
+
+def _rowid(kind: str, ref_id: int) -> int:
+    return ref_id * 8 + KINDS[kind]
+
+
+# ========== 写入 ==========
+
+def index_document(connection, kind: str, ref_id: int, title: Optional[str], body: Optional[str],
+                   project_id: Optional[int] = None):
+    """写入或覆盖一条索引"""
+    if not _enabled(connection):
+        return
+    rowid = _rowid(kind, ref_id)
+    connection.execute(text(f"DELETE FROM {TABLE} WHERE rowid = :rowid"), {"rowid": rowid})
+    if title or body:
+        connection.execute(
+            text(f"INSERT INTO {TABLE} (rowid, title, body, kind, project_id) VALUES (:rowid, :title, :body, :kind, :project_id)"),
+            {"rowid": rowid, "title": title or "", "body": body or "", "kind": KINDS[kind], "project_id": project_id}
+        )
+
+
+def index_rows(connection, model, ids: Sequence[int], rows: Sequence[Dict[str, Any]]):
+    """批量插入（不经过 flush）的行写入索引，rows 为插入时的原文"""
+    spec = DOCUMENTS.get(model)
+    if spec is None or not ids or not _enabled(connection):
+        return
+    kind, _, extract = spec
+    documents = []
+    for ref_id, row in zip(ids, rows):
+        title, body, project_id = extract(_Row(row))
+        if title or body:
+            documents.append({"rowid": _rowid(kind, ref_id), "title": title or "", "body": body or "",
+                              "kind": KINDS[kind], "project_id": project_id})
+    # SQLite 会复用被删除的最大ID，先清掉可能残留的旧索引
+    connection.execute(text(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(str(_rowid(kind, i)) for i in ids)})"))
+    if documents:
+        connection.execute(
+            text(f"INSERT INTO {TABLE} (rowid, title, body, kind, project_id) VALUES (:rowid, :title, :body, :kind, :project_id)"),
+            documents
+        )
+
+
+class _Row(dict):
+    """让提取函数按属性读取字典行，缺失字段为 None"""
+    __getattr__ = dict.get
+
+
+def remove_document(connection, kind: str, ref_id: int):
+    if _enabled(connection):
+        connection.execute(text(f"DELETE FROM {TABLE} WHERE rowid = :rowid"), {"rowid": _rowid(kind, ref_id)})
+
+
+def index_manuscript(db, manuscript: Manuscript, content: Any):
+    """版本化稿件的正文不在 Manuscript.content 中，由 save_version 显式写入索引"""
+    index_document(db.connection(), "manuscript", manuscript.id, manuscript.title,
+                   manuscript_text(content), manuscript.project_id)
+
+
+# ========== ORM 钩子 ==========
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    # flush 后 new/dirty/deleted 和字段历史仍是 flush 前的状态，此时记录待同步的记录
+    if not _enabled(session.connection()):
+        return
+    pending = session.info.setdefault("search_pending", [])
+    for obj in session.new:
+        if type(obj) in DOCUMENTS:
+            pending.append(("upsert", obj))
+    for obj in session.dirty:
+        spec = DOCUMENTS.get(type(obj))
+        if spec is None:
+            continue
+        state = inspect(obj)
+        if any(state.attrs[key].history.has_changes() for key in spec[1]):
+            pending.append(("upsert", obj))
+    for obj in session.deleted:
+        spec = DOCUMENTS.get(type(obj))
+        if spec is not None:
+            pending.append(("delete", spec[0], obj.id))
+        elif isinstance(obj, NovelProject):
+            # 章节/稿件随项目级联删除，ORM 看不到
+            pending.append(("project", obj.id))
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _apply_changes(session, flush_context):
+    # 在正文块钩子把引用换回原文之后执行（blob_store 先注册）
+    pending = session.info.pop("search_pending", None)
+    if not pending:
+        return
+    connection = session.connection()
+    for item in pending:
+        if item[0] == "delete":
+            remove_document(connection, item[1], item[2])
+        elif item[0] == "project":
+            connection.execute(text(f"DELETE FROM {TABLE} WHERE project_id = :p"), {"p": item[1]})
+        else:
+            obj = item[1]
+            if isinstance(obj, Manuscript) and obj.content is None:
+                continue  # 版本化稿件由 save_version 写入
+            kind = DOCUMENTS[type(obj)][0]
+            title, body, project_id = DOCUMENTS[type(obj)][2](obj)
+            index_document(connection, kind, obj.id, title, body, project_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("search_pending", None)
+
+
+# ========== 检索 ==========
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _highlight(snippet: str, terms: Sequence[str]) -> str:
+    for term in terms:
+        snippet = snippet.replace(term, f"<mark>{term}</mark>")
+    return snippet
+
+
+def search(db, q: str, kinds: Optional[Sequence[str]] = None, project_id: Optional[int] = None,
+           limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """
+    全文检索，多个检索词用空格分隔（须同时命中）
+
+    ≥3 字的词走 FTS5 索引并按 bm25 排序（标题权重更高），片段由 snippet() 生成；
+    全部是短词时按 LIKE 扫描，按时间倒序返回
+    """
+    terms = [t for t in re.split(r"\s+", q or "") if t]
+    if not terms:
+        raise ValueError("检索词不能为空")
+    unknown = [k for k in kinds or [] if k not in KINDS]
+    if unknown:
+        raise ValueError(f"未知类型: {', '.join(unknown)}；可选类型: {', '.join(KINDS)}")
+
+    indexed = [t for t in terms if len(t) >= MIN_TERM_LENGTH]
+    short = [t for t in terms if len(t) < MIN_TERM_LENGTH]
+    where: List[str] = []
+    params: Dict[str, Any] = {"limit": limit + 1, "offset": offset}
+
+    if indexed:
+        where.append(f"{TABLE} MATCH :match")
+        params["match"] = " AND ".join('"' + t.replace('"', '""') + '"' for t in indexed)
+    for i, term in enumerate(short):
+        where.append(f"(title LIKE :like{i} ESCAPE '\\' OR body LIKE :like{i} ESCAPE '\\')")
+        params[f"like{i}"] = f"%{_escape_like(term)}%"
+    if kinds:
+        where.append(f"kind IN ({', '.join(str(KINDS[k]) for k in kinds)})")
+    if project_id is not None:
+        where.append("project_id = :project_id")
+        params["project_id"] = project_id
+
+    if indexed:
+        columns = f"snippet({TABLE}, 1, '<mark>', '</mark>', '…', 24), bm25({TABLE}, 10.0, 1.0)"
+        order = f"bm25({TABLE}, 10.0, 1.0)"
+    else:
+        columns = "substr(body, max(instr(body, :first) - 30, 1), 80), NULL"
+        order = "rowid DESC"
+        params["first"] = short[0]
+
+    rows = db.connection().execute(text(
+        f"SELECT rowid, kind, project_id, title, {columns} FROM {TABLE} "
+        f"WHERE {' AND '.join(where)} ORDER BY {order} LIMIT :limit OFFSET :offset"
+    ), params).fetchall()
+
+    results = []
+    for rowid, kind, row_project_id, title, snippet, score in rows[:limit]:
+        results.append({
+            "type": _KIND_NAMES[kind],
+            "id": rowid // 8,
+            "project_id": row_project_id,
+            "title": title,
+            "snippet": _highlight(snippet or "", short),
+            "score": round(-score, 4) if score is not None else None,
+        })
+    return {"results": results, "has_more": len(rows) > limit}
+
+
+# ========== 维护 ==========
+
+def _iter_documents(db, model, batch_size: int = 200):
+    last_id = 0
+    while True:
+        rows = db.query(model).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+        db.expunge_all()  # 正文较大，逐批释放
+
+
+def rebuild(db) -> int:
+    """清空并重建索引（不提交），返回写入的记录数"""
+    from backend.database.manuscript_versions import materialize
+
+    connection = db.connection()
+    if not _enabled(connection):
+        return 0
+    connection.execute(text(f"DELETE FROM {TABLE}"))
+    count = 0
+    for model, (kind, _, extract) in DOCUMENTS.items():
+        for rows in _iter_documents(db, model):
+            for obj in rows:
+                if isinstance(obj, Manuscript) and obj.content is None:
+                    title, body, project_id = obj.title, manuscript_text(materialize(db, obj)), obj.project_id
+                else:
+                    title, body, project_id = extract(obj)
+                index_document(connection, kind, obj.id, title, body, project_id)
+                count += 1
+    connection.execute(text(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')"))
+    return count
+
+
+def stats(db) -> Dict[str, Dict[str, int]]:
+    rows = db.connection().execute(text(f"SELECT kind, count(*), sum(length(body)) FROM {TABLE} GROUP BY kind")).fetchall()
+    return {_KIND_NAMES[kind]: {"documents": n, "chars": chars or 0} for kind, n, chars in rows}
+
+
+def main():
+    from backend.database.models import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="全文检索索引维护")
+    parser.add_argument("--rebuild", action="store_true", help="重建全部索引")
+    parser.add_argument("--stats", action="store_true", help="查看索引统计")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"🔎 已重建索引 {rebuild(db)} 条")
+            db.commit()
+        for kind, s in stats(db).items():
+            print(f"📊 {kind}: {s['documents']} 条, {s['chars']} 字")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+阶段产物记忆化 - 基于 ManuscriptStep / ImitationStep 复用上游阶段结果
+
+指纹 = sha256(阶段名 + 输入(上游产物 + 参数) + 模型名)
+同一指纹已有步骤记录时，直接返回其 step_data，不再调用大模型
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from backend.database.models import ManuscriptStep, ImitationStep
+
+# 步骤表 -> 归属字段
+OWNER_COLUMNS = {
+    ManuscriptStep: "manuscript_id",
+    ImitationStep: "project_id",
+}
+
+# 请求中每次都会变化、不影响产物的字段
+VOLATILE_KEYS = {"manuscript_id", "project_id", "timestamp", "created_at", "updated_at"}
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def compute_fingerprint(step_name: str, inputs: Dict[str, Any], model: Optional[str] = None) -> str:
+    """计算阶段输入指纹"""
+    payload = json.dumps(
+        {"step": step_name, "model": model, "inputs": _strip_volatile(inputs)},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageMemo:
+    """阶段产物记忆化"""
+
+    def __init__(self, db, step_model=ManuscriptStep):
+        self.db = db
+        self.step_model = step_model
+        self.owner_column = getattr(step_model, OWNER_COLUMNS[step_model])
+
+    def lookup(self, step_name: str, fingerprint: str):
+        """查找同一指纹的已完成步骤"""
+        query = self.db.query(self.step_model).filter(
+            self.step_model.step_name == step_name,
+            self.step_model.input_fingerprint == fingerprint
+        )
+        if hasattr(self.step_model, "status"):
+            query = query.filter(self.step_model.status == "completed")
+        return query.order_by(self.step_model.id.desc()).first()
+
+    def record(self, owner_id: Optional[int], step_name: str, step_data: Any, fingerprint: str):
+        """保存带指纹的步骤记录（不提交）"""
+        fields = {
+            OWNER_COLUMNS[self.step_model]: owner_id,
+            "step_name": step_name,
+            "step_data": step_data,
+            "input_fingerprint": fingerprint,
+        }
+        if hasattr(self.step_model, "status"):
+            fields["status"] = "completed"
+        step = self.step_model(**fields)
+        self.db.add(step)
+        return step
+
+    def invalidate(self, step_name: Optional[str] = None, owner_id: Optional[int] = None,
+                   fingerprint: Optional[str] = None) -> int:
+        """
+        使记忆失效：清空匹配步骤的指纹（保留历史记录），返回受影响条数
+        不传任何条件时清空整张表的指纹
+        """
+        query = self.db.query(self.step_model).filter(self.step_model.input_fingerprint.isnot(None))
+        if step_name:
+            query = query.filter(self.step_model.step_name == step_name)
+        if owner_id is not None:
+            query = query.filter(self.owner_column == owner_id)
+        if fingerprint:
+            query = query.filter(self.step_model.input_fingerprint == fingerprint)
+        count = query.update({self.step_model.input_fingerprint: None}, synchronize_session=False)
+        self.db.commit()
+        return count
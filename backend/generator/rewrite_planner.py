@@ -0,0 +1,351 @@
+"""
+定向重写规划器 - 只重写审稿报告点名的章节/段落
+
+核心流程：
+1. 规则预扫：从审稿报告中提取被点名的章节号（第N章 / 第N-M章）
+2. AI规划：只为需要修改的章节输出重写计划，并区分 整章重写(chapter) / 段落补丁(patch)
+3. 并行执行：被点名的章节并行处理，其余章节原样保留
+4. 段落补丁：章节切分为编号段落，模型只返回被修改段落，服务端合并（未改动段落的缩进和空行原样保留）
+"""
+
+import re
+import json
+import concurrent.futures
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class RewritePlanError(Exception):
+    """模型返回的重写计划无法解析，且审稿报告中也没有点名章节可以退回"""
+
+
+CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+# 第3章 / 第三章 / 第2-4章 / 第二至四章
+CHAPTER_REF_PATTERN = re.compile(
+    r"第\s*([0-9零一二两三四五六七八九十]+)\s*(?:[-~～—到至]\s*第?\s*([0-9零一二两三四五六七八九十]+)\s*)?章"
+)
+
+
+def _cn_to_int(text: str) -> Optional[int]:
+    """把 '12' / '十二' / '二十' 之类的章节号转为整数"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        value = (CN_DIGITS.get(tens, 0) if tens else 1) * 10
+        return value + (CN_DIGITS.get(ones, 0) if ones else 0)
+    if len(text) == 1 and text in CN_DIGITS:
+        return CN_DIGITS[text]
+    return None
+
+
+def extract_flagged_chapters(report: str, valid_numbers: List[int]) -> List[int]:
+    """从审稿报告中提取被点名的章节号（只保留稿件中存在的章节）"""
+    valid = set(valid_numbers)
+    flagged = set()
+    for match in CHAPTER_REF_PATTERN.finditer(report or ""):
+        start = _cn_to_int(match.group(1))
+        end = _cn_to_int(match.group(2)) if match.group(2) else start
+        if start is None or end is None:
+            continue
+        if end < start:
+            start, end = end, start
+        for num in range(start, min(end, start + 50) + 1):
+            if num in valid:
+                flagged.add(num)
+    return sorted(flagged)
+
+
+def split_paragraphs(content: str) -> List[str]:
+    """按行切分段落，去掉空段"""
+    return [p.strip() for p in (content or "").split("\n") if p.strip()]
+
+
+def number_paragraphs(paragraphs: List[str]) -> str:
+    """给段落加上 [P1] [P2] ... 编号，供模型定位"""
+    return "\n".join(f"[P{i}] {p}" for i, p in enumerate(paragraphs, 1))
+
+
+def _plan_edits(paragraphs: List[str], edits: List[Dict[str, Any]]):
+    """解析补丁：返回 (被替换/删除的段落, 各段之后插入的段落, 实际生效的补丁数)"""
+    replaced: Dict[int, Optional[str]] = {}
+    inserted: Dict[int, List[str]] = {}
+    applied = 0
+
+    for edit in edits or []:
+        if not isinstance(edit, dict):
+            continue
+        try:
+            pid = int(str(edit.get("id", "")).lstrip("Pp"))
+        except (TypeError, ValueError):
+            continue
+        # insert_after 允许 id=0，表示插到开头
+        action = edit.get("action", "replace")
+        text = (edit.get("text") or "").strip()
+        if action == "insert_after" and 0 <= pid <= len(paragraphs) and text:
+            inserted.setdefault(pid, []).extend(split_paragraphs(text))
+            applied += 1
+        elif action == "delete" and 1 <= pid <= len(paragraphs):
+            replaced[pid] = None
+            applied += 1
+        elif action == "replace" and 1 <= pid <= len(paragraphs) and text:
+            replaced[pid] = text
+            applied += 1
+    return replaced, inserted, applied
+
+
+def patch_text(content: str, edits: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """
+    把段落补丁应用到原文，段落编号与 split_paragraphs 一致
+
+    edits 格式: [{"id": 3, "action": "replace|delete|insert_after", "text": "..."}]，不是对象的元素忽略
+
+    未改动的段落保留原始行（含缩进）和其后的换行/空行；新段落沿用所替换段落的缩进，
+    段与段之间用原文最常见的分隔符。返回 (新正文, 实际生效的补丁数)
+    """
+    content = content or ""
+    lines = list(re.finditer(r"[^\n]*\S[^\n]*", content))
+    if not lines:
+        return content, 0
+    raw = [m.group(0) for m in lines]
+    separators = [content[a.end():b.start()] for a, b in zip(lines, lines[1:])] + [content[lines[-1].end():]]
+    replaced, inserted, applied = _plan_edits([line.strip() for line in raw], edits)
+    if not applied:
+        return content, 0
+
+    default_sep = Counter(separators[:-1]).most_common(1)[0][0] if len(raw) > 1 else "\n"
+
+    def indent(line: str) -> str:
+        return line[:len(line) - len(line.lstrip())]
+
+    parts = [[indent(raw[0]) + p, default_sep] for p in inserted.get(0, [])]
+    for i, line in enumerate(raw, 1):
+        if i in replaced:
+            group = [indent(line) + p for p in split_paragraphs(replaced[i] or "")]
+        else:
+            group = [line]
+        group += [indent(line) + p for p in inserted.get(i, [])]
+        parts += [[text, default_sep] for text in group]
+        if group:
+            parts[-1][1] = separators[i - 1]
+    if parts:
+        parts[-1][1] = separators[-1]
+    return content[:lines[0].start()] + "".join(text + sep for text, sep in parts), applied
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """从AI响应中提取JSON（对象或数组）"""
+    if not text:
+        return None
+    candidates = [text]
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+    if match:
+        candidates.append(match.group(1))
+    match = re.search(r"[\{\[].*[\}\]]", text, re.DOTALL)
+    if match:
+        candidates.append(match.group(0))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except Exception:
+            continue
+    return None
+
+
+PATCH_RULES = """**补丁输出规则:**
+1. 只输出需要改动的段落，未改动的段落不要输出。
+2. action 取值: replace(替换该段) / delete(删除该段) / insert_after(在该段后插入新段，id=0 表示插在开头)。
+3. text 为改动后的完整段落正文，可包含多段（用换行分隔）。
+4. 严格输出JSON，不要有任何说明：
+```json
+{{"edits": [{{"id": 12, "action": "replace", "text": "改写后的段落"}}]}}
+```"""
+
+
+class RewritePlanner:
+    """定向重写规划器：只改被点名的章节，其余章节原样共享"""
+
+    def __init__(self, ai_client, max_workers: int = 5):
+        self.ai_client = ai_client
+        self.max_workers = max_workers
+
+    @staticmethod
+    def chapter_number(chapter: Dict[str, Any], idx: int) -> int:
+        return chapter.get("chapter_number") or chapter.get("id") or idx + 1
+
+    def plan(self, chapters: List[Dict[str, Any]], report: str, instruction: str = "") -> List[Dict[str, Any]]:
+        """
+        根据审稿报告生成重写计划，只包含需要修改的章节
+
+        返回空列表表示模型判断无需修改；计划无法解析且报告未点名章节时抛出 RewritePlanError
+        """
+        numbers = [self.chapter_number(c, i) for i, c in enumerate(chapters)]
+        flagged = extract_flagged_chapters(report, numbers)
+
+        chapters_summary = "\n".join([
+            f"- 第{num}章: {c.get('title', '')} (约{c.get('word_count', len(c.get('content', '')))}字)"
+            for num, c in zip(numbers, chapters)
+        ])
+        flagged_hint = "、".join(f"第{n}章" for n in flagged) if flagged else "（报告未明确点名，请自行判断）"
+
+        plan_prompt = f"""你是顶级网文主编。请根据“审稿报告”，只为**确实需要修改**的章节制定“重写指令”。
+
+**审稿报告建议:**
+{report}
+
+**额外修改要求:**
+{instruction}
+
+**原稿章节列表:**
+{chapters_summary}
+
+**报告中被点名的章节:** {flagged_hint}
+
+**任务:**
+1. 只列出需要修改的章节，没有问题的章节不要出现在计划中。
+2. scope 取值：
+   - "patch"：局部问题（如强化结尾钩子、删减某段水文、补一句铺垫），只改少数段落
+   - "chapter"：结构性问题（如剧情前置、冲突重排），需要整章重写
+3. 能用 patch 解决的不要用 chapter。
+
+格式如下：
+```json
+{{
+  "rewrite_plan": [
+    {{
+      "chapter_number": 2,
+      "scope": "patch",
+      "original_title": "旧标题",
+      "new_title": "新标题（不改可留空）",
+      "modifications": "具体修改点：1... 2... 3...",
+      "target_hook": "本章必须强化的悬念/钩子"
+    }}
+  ]
+}}
+```
+"""
+        messages = [{"role": "user", "content": plan_prompt}]
+        plan_response = self.ai_client._call_api(messages, temperature=0.7, max_tokens=2000)
+        plan_result = extract_json(plan_response)
+
+        if isinstance(plan_result, dict):
+            raw_plans = plan_result.get("rewrite_plan")
+        else:
+            raw_plans = plan_result
+        if not isinstance(raw_plans, list):
+            # 模型未给出可用计划时，退回到规则预扫的结果
+            if not flagged:
+                raise RewritePlanError("重写计划解析失败，且审稿报告未点名需要修改的章节，请重试或在修改要求中写明章节")
+            raw_plans = [{"chapter_number": n, "scope": "patch", "modifications": report} for n in flagged]
+
+        valid = set(numbers)
+        plans = {}
+        for item in raw_plans:
+            if not isinstance(item, dict):
+                continue
+            try:
+                num = int(item.get("chapter_number"))
+            except (TypeError, ValueError):
+                continue
+            if num not in valid or num in plans:
+                continue
+            item["chapter_number"] = num
+            item["scope"] = "chapter" if item.get("scope") == "chapter" else "patch"
+            plans[num] = item
+        return [plans[n] for n in sorted(plans)]
+
+    def rewrite_full(self, chapter: Dict[str, Any], plan: Dict[str, Any]) -> Dict[str, Any]:
+        """整章重写"""
+        chapter_num = plan["chapter_number"]
+        new_title = plan.get("new_title") or chapter.get("title", "")
+        chapter_prompt = f"""你是顶级网文修改专家。请执行具体的章节重写。
+
+**原章节内容 (第{chapter_num}章):**
+标题: {chapter.get('title', '无')}
+正文:
+{chapter.get('content', '无内容')}
+
+**重写计划要求:**
+新标题: {new_title}
+具体修改指令: {plan.get('modifications', '全方位升级')}
+核心钩子: {plan.get('target_hook', '留悬念')}
+
+**重写规则:**
+1. 保持视角一致。
+2. 节奏极速，砍掉废话。
+3. 心理描写融入行动。
+4. 结尾必须卡在钩子上。
+
+直接输出重写后的章节正文，不要有任何说明。
+"""
+        msg = [{"role": "user", "content": chapter_prompt}]
+        new_content = self.ai_client._call_api(msg, temperature=0.85, max_tokens=4000)
+        return {**chapter, "chapter_number": chapter_num, "title": new_title,
+                "content": new_content, "word_count": len(new_content)}
+
+    def rewrite_patch(self, chapter: Dict[str, Any], plan: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """段落补丁：只让模型输出被修改的段落；补丁无法解析时返回 None"""
+        chapter_num = plan["chapter_number"]
+        paragraphs = split_paragraphs(chapter.get("content", ""))
+        if not paragraphs:
+            return None
+
+        patch_prompt = f"""你是顶级网文修改专家。请对下面的章节做**局部修改**。
+
+**第{chapter_num}章: {chapter.get('title', '')}**（正文已按段落编号）
+{number_paragraphs(paragraphs)}
+
+**修改指令:** {plan.get('modifications', '')}
+**核心钩子:** {plan.get('target_hook', '')}
+
+""" + PATCH_RULES.format()
+        msg = [{"role": "user", "content": patch_prompt}]
+        response = self.ai_client._call_api(msg, temperature=0.8, max_tokens=2000)
+        result = extract_json(response)
+        edits = result.get("edits") if isinstance(result, dict) else result
+        if not isinstance(edits, list):
+            return None
+
+        new_content, applied = patch_text(chapter.get("content", ""), edits)
+        if applied == 0:
+            return None
+        return {**chapter, "chapter_number": chapter_num,
+                "title": plan.get("new_title") or chapter.get("title", ""),
+                "content": new_content, "word_count": len(new_content)}
+
+    def execute(self, chapters: List[Dict[str, Any]], plans: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """
+        并行执行重写计划
+
+        返回 (合并后的完整章节列表, 实际被修改的章节号)
+        未被点名或重写失败的章节保持原样
+        """
+        by_number = {self.chapter_number(c, i): c for i, c in enumerate(chapters)}
+
+        def run(plan):
+            chapter = by_number[plan["chapter_number"]]
+            try:
+                if plan["scope"] == "patch":
+                    patched = self.rewrite_patch(chapter, plan)
+                    if patched:
+                        return patched
+                    print(f"⚠️ 第{plan['chapter_number']}章补丁无效，改为整章重写")
+                return self.rewrite_full(chapter, plan)
+            except Exception as e:
+                print(f"重写章节 {plan['chapter_number']} 失败: {e}")
+                return None
+
+        rewritten = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(run, plan) for plan in plans]
+            for future in concurrent.futures.as_completed(futures):
+                res = future.result()
+                if res:
+                    rewritten[res["chapter_number"]] = res
+
+        merged = []
+        for i, chapter in enumerate(chapters):
+            num = self.chapter_number(chapter, i)
+            merged.append(rewritten.get(num, chapter))
+        return merged, sorted(rewritten)
@@ -0,0 +1,378 @@
+"""
+抓取-分析流水线 - 抓取、规则分析、入库、AI 分析同时进行
+
+原先每条正文抓取后在同一线程里做规则分析再抓下一条，AI 分析每天凌晨只处理 20 条，越积越多。
+现在各阶段用有界队列衔接：
+- 抓取：各平台并发从抓取队列（frontier）取到期链接，正文放入有界队列，队列满时暂停抓取（背压）；
+  单个平台超过 PIPELINE_SOURCE_TIMEOUT 秒即停止该平台（未抓的链接留在队列中下次续抓），不拖住其他平台
+- 规则分析：进程池并行计算情节标签和情绪强度（正则匹配是 CPU 密集型，线程受 GIL 限制）；
+  正文与上次相同或抓取失败的不经过分析，直接交给写入
+- 写入：单个写入任务攒批（PIPELINE_WRITE_BATCH 条或 1 秒）提交，同一事务里记录抓取结果并写入或更新语料；
+  提交失败的批次回滚，对应链接仍在抓取队列中，下次运行重抓
+- AI 分析：从数据库按新到旧取 analyzed_at 为空的语料（刚入库的优先，其次是积压），
+  PIPELINE_AI_WORKERS 个并发、每分钟不超过 PIPELINE_AI_RPM 次调用，结果交给写入任务批量提交；
+  抓取结束后继续消化积压，每次运行最多分析 PIPELINE_AI_LIMIT 条
+- 每个平台一条 CrawlTask 记录抓取耗时和各项条数；运行被取消（如定时任务超时）时也会记录
+
+用法:
+    pipeline = CorpusPipeline(CRAWLERS, PlotExtractor(ai_client))
+    stats = await pipeline.run({"晋江": [("晋江 - modern", list_page), ...]})   # 列表页为空时只抓队列中到期的链接
+    stats = await pipeline.run({})                                                 # 只做 AI 分析
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+
+from backend.analyzer.plot_extractor import PlotExtractor, analyze_by_rules
+from backend.crawler.engine import domain_of, fetch_all, run_on_domain
+from backend.crawler.frontier import content_hash, frontier
+from backend.database.corpus_store import CorpusBatch
+from backend.database.models import SessionLocal, Corpus, CrawlFrontier, CrawlTask
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+PIPELINE_CPU_WORKERS = int(os.getenv("PIPELINE_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+PIPELINE_WRITE_BATCH = int(os.getenv("PIPELINE_WRITE_BATCH", "20"))
+PIPELINE_AI_WORKERS = int(os.getenv("PIPELINE_AI_WORKERS", "3"))
+PIPELINE_AI_RPM = int(os.getenv("PIPELINE_AI_RPM", "30"))
+PIPELINE_AI_LIMIT = int(os.getenv("PIPELINE_AI_LIMIT", "500"))
+PIPELINE_SOURCE_TIMEOUT = int(os.getenv("PIPELINE_SOURCE_TIMEOUT", "7200"))  # 单个平台抓取时限（秒）
+
+CRAWL_BATCH_SIZE = 20  # 每批并发抓取的链接数
+CRAWL_RUN_LIMIT = int(os.getenv("CRAWL_RUN_LIMIT", "200"))  # 每个平台每次运行最多抓取的链接数
+
+_WRITE_INTERVAL = 1.0  # 写入攒批最长等待（秒）
+_STOP = object()
+
+Pages = Dict[str, List[Tuple[str, Callable]]]
+
+
+class RateLimiter:
+    """异步限速：两次调用至少间隔 60/per_minute 秒"""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute
+        self._next = 0.0
+
+    async def acquire(self):
+        # 单线程事件循环内领取时间点无需加锁
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class CorpusPipeline:
+    """抓取 → 规则分析 → 批量写入 → AI 分析"""
+
+    # 同一进程内各次运行正在做 AI 分析的语料，避免抓取任务和分析任务重叠时重复调用
+    _ai_inflight: Set[int] = set()
+    # 各次运行共用的 AI 调用限速，重叠运行时合计仍不超过 PIPELINE_AI_RPM
+    _ai_limiter = RateLimiter(PIPELINE_AI_RPM)
+
+    def __init__(self, crawlers: Dict, ai_extractor: Optional[PlotExtractor] = None):
+        self.crawlers = crawlers
+        self.ai_extractor = ai_extractor if ai_extractor and ai_extractor.ai_client else None
+        self.stats: Dict[str, Counter] = {}
+        self.durations: Dict[str, float] = {}
+
+    async def run(self, pages: Pages, analyze: bool = True) -> Dict[str, Dict[str, int]]:
+        """
+        运行一次流水线，返回各平台及 AI 分析的统计
+
+        pages: 平台 -> [(标签, 列表页函数)]；平台对应的列表为空时只抓取队列中到期的链接
+        """
+        self.stats = {source: Counter() for source in pages}
+        self.stats["ai"] = Counter()
+        self.durations = {}
+        self._ai_fed: Set[int] = set()
+        self._fetched = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+        self._writes = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+        self._ai_queue = asyncio.Queue(PIPELINE_AI_WORKERS * 2)
+        self._crawling = True
+        tasks = self._start_tasks(pages)
+
+        cpu_pool = ProcessPoolExecutor(max(1, PIPELINE_CPU_WORKERS), mp_context=multiprocessing.get_context("spawn"))
+        ai_pool = ThreadPoolExecutor(max_workers=PIPELINE_AI_WORKERS, thread_name_prefix="pipeline-ai")
+        errors = {source: "运行被取消" for source in pages}
+        workers = []
+        try:
+            writer = asyncio.create_task(self._writer())
+            analyzers = [asyncio.create_task(self._analyzer(cpu_pool)) for _ in range(max(1, PIPELINE_CPU_WORKERS))]
+            ai_tasks = []
+            if analyze and self.ai_extractor:
+                ai_tasks = [asyncio.create_task(self._ai_feeder())] + [
+                    asyncio.create_task(self._ai_worker(ai_pool, self._ai_limiter)) for _ in range(PIPELINE_AI_WORKERS)
+                ]
+            workers = [writer] + analyzers + ai_tasks
+
+            errors = dict(zip(pages, await asyncio.gather(*[self._crawl_source_timed(source, source_pages)
+                                                            for source, source_pages in pages.items()])))
+
+            # 抓取结束：先让规则分析和写入清空，AI 分析看到全部新语料后再按积压收尾
+            for _ in analyzers:
+                await self._fetched.put(_STOP)
+            await asyncio.gather(*analyzers)
+            await self._writes.join()
+            self._crawling = False
+            await asyncio.gather(*ai_tasks)
+            await self._writes.put(_STOP)
+            await writer
+        finally:
+            # 运行被取消或出错时，各阶段任务不会自行结束
+            for worker in workers:
+                worker.cancel()
+            self._ai_inflight.difference_update(self._ai_fed)
+            cpu_pool.shutdown(wait=False, cancel_futures=True)
+            ai_pool.shutdown(wait=False, cancel_futures=True)
+            self._finish_tasks(tasks, errors)
+
+        return {name: dict(counter) for name, counter in self.stats.items()}
+
+    # ========== 抓取任务记录 ==========
+
+    def _start_tasks(self, pages: Pages) -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            tasks = {source: CrawlTask(source=source, status="running", started_at=datetime.now())
+                     for source in pages}
+            db.add_all(tasks.values())
+            db.commit()
+            return {source: task.id for source, task in tasks.items()}
+        finally:
+            db.close()
+
+    def _finish_tasks(self, tasks: Dict[str, int], errors: Dict[str, Optional[str]]):
+        db = SessionLocal()
+        try:
+            for source, task_id in tasks.items():
+                stats = self.stats[source]
+                task = db.get(CrawlTask, task_id)
+                task.status = "failed" if errors.get(source) else "success"
+                task.error_message = errors.get(source)
+                task.url_count = stats["fetched"]
+                task.success_count = stats["saved"] + stats["updated"]
+                task.duration = round(self.durations.get(source, 0.0), 1)
+                task.stats = dict(stats)
+                task.finished_at = datetime.now()
+            db.commit()
+        finally:
+            db.close()
+
+    # ========== 抓取 ==========
+
+    async def _discover(self, label: str, source: str, list_page) -> int:
+        """抓取一页列表，新发现的正文链接写入抓取队列，返回新入队条数"""
+        db = SessionLocal()
+        try:
+            results = await run_on_domain(domain_of(self.crawlers[source].base_url), list_page)
+            added = frontier.enqueue(db, source, results)
+            db.commit()
+            print(f"[{label}] 找到 {len(results)} 条，新入队 {added} 条")
+            return added
+        except Exception as e:
+            print(f"列表抓取失败 {label}: {e}")
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+
+    async def _crawl_source_timed(self, source: str, pages: List[Tuple[str, Callable]]) -> Optional[str]:
+        """限时抓取一个平台并记录耗时；超时后已交给分析和写入的正文照常入库"""
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._crawl_source(source, pages), PIPELINE_SOURCE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"⏱️ {source} 抓取超过 {PIPELINE_SOURCE_TIMEOUT} 秒，已停止（未抓的链接下次续抓）")
+            return f"抓取超时（{PIPELINE_SOURCE_TIMEOUT} 秒）"
+        finally:
+            self.durations[source] = time.perf_counter() - started
+
+    async def _crawl_source(self, source: str, pages: List[Tuple[str, Callable]]) -> Optional[str]:
+        """先抓列表页入队，再分批抓取到期链接放入分析队列；返回错误信息"""
+        crawler = self.crawlers[source]
+        stats = self.stats[source]
+        added = await asyncio.gather(*[self._discover(label, source, list_page) for label, list_page in pages])
+        stats["discovered"] += sum(added)
+        dispatched: Set[int] = set()
+        db = SessionLocal()
+        try:
+            while len(dispatched) < CRAWL_RUN_LIMIT:
+                entries = [(e.id, e.url, e.title, e.content_hash) for e in frontier.due(
+                    db, source, min(CRAWL_BATCH_SIZE, CRAWL_RUN_LIMIT - len(dispatched)), exclude=dispatched)]
+                db.rollback()  # 结束读事务，抓取期间不持有快照
+                if not entries:
+                    break
+                dispatched.update(entry[0] for entry in entries)
+                contents = await fetch_all(crawler, [entry[1] for entry in entries])
+                stats["fetched"] += len(entries)
+
+                for (entry_id, url, title, previous_hash), content in zip(entries, contents):
+                    doc = {"kind": "page", "source": source, "entry_id": entry_id, "url": url, "title": title,
+                           "content": content if content and content.get("content") else None}
+                    if doc["content"] is None or content_hash(doc["content"]["content"]) == previous_hash:
+                        await self._writes.put(doc)  # 失败或未变化，无需分析
+                    else:
+                        await self._fetched.put(doc)
+            return None
+        except Exception as e:
+            print(f"抓取失败 {source}: {e}")
+            return str(e)
+        finally:
+            db.close()
+
+    # ========== 规则分析 ==========
+
+    async def _analyzer(self, cpu_pool: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while True:
+            doc = await self._fetched.get()
+            if doc is _STOP:
+                break
+            content = doc["content"]
+            try:
+                fields = await loop.run_in_executor(cpu_pool, analyze_by_rules, content["content"])
+            except Exception as e:
+                print(f"规则分析失败 {doc['url']}: {e}")
+                fields = {"plot_tags": [], "emotion_score": 0}
+            doc["fields"] = dict(fields, view_count=content.get("views", 0))
+            await self._writes.put(doc)
+
+    # ========== 写入 ==========
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        db = SessionLocal()
+        batches: Dict[str, CorpusBatch] = {}
+        try:
+            stop = False
+            while not stop:
+                items = [await self._writes.get()]
+                deadline = loop.time() + _WRITE_INTERVAL
+                while len(items) < PIPELINE_WRITE_BATCH and items[-1] is not _STOP:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        items.append(await asyncio.wait_for(self._writes.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                if items[-1] is _STOP:
+                    stop = True
+                    items.pop()
+                if items:
+                    if not self._flush(db, batches, items):
+                        batches.clear()
+                for _ in range(len(items) + stop):
+                    self._writes.task_done()
+        finally:
+            db.close()
+
+    def _flush(self, db, batches: Dict[str, CorpusBatch], items: List[Dict]) -> bool:
+        """一个事务写入一批结果，成功后才计入统计"""
+        counts = Counter()
+        try:
+            pages = [item for item in items if item["kind"] == "page"]
+            entries = {e.id: e for e in db.query(CrawlFrontier).filter(
+                CrawlFrontier.id.in_([item["entry_id"] for item in pages]))} if pages else {}
+            for item in pages:
+                entry, source = entries.get(item["entry_id"]), item["source"]
+                if entry is None:
+                    continue
+                content = item["content"]
+                if content is None:
+                    frontier.record_failure(entry)
+                    counts[source, "failed"] += 1
+                    continue
+                status = frontier.record_success(entry, content["content"])
+                if status == "unchanged":
+                    counts[source, "unchanged"] += 1
+                    continue
+                batch = batches.get(source)
+                if batch is None:
+                    batch = batches[source] = CorpusBatch(db, source)
+                title = content.get("title") or item["title"] or ""
+                if status == "changed":
+                    # 正文变化后需重新做 AI 分析
+                    if batch.update(item["url"], title, content["content"], analyzed_at=None, **item["fields"]):
+                        counts[source, "updated"] += 1
+                elif batch.add(title=title, content=content["content"], url=item["url"], **item["fields"]):
+                    counts[source, "saved"] += 1
+                else:
+                    counts[source, "skipped"] += 1
+
+            analyzed = [item["values"] for item in items if item["kind"] == "ai"]
+            if analyzed:
+                db.execute(update(Corpus), analyzed)
+                counts["ai", "analyzed"] += len(analyzed)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ 写入失败（{len(items)} 条，下次运行重试）: {e}")
+            return False
+        finally:
+            self._ai_inflight.difference_update(item["values"]["id"] for item in items if item["kind"] == "ai")
+        for (name, key), n in counts.items():
+            self.stats[name][key] += n
+        return True
+
+    # ========== AI 分析 ==========
+
+    async def _ai_feeder(self):
+        """按新到旧取未做 AI 分析的语料；抓取进行中时轮询新入库的语料"""
+        fed = 0
+        try:
+            while fed < PIPELINE_AI_LIMIT:
+                db = SessionLocal()
+                try:
+                    exclude = self._ai_fed | self._ai_inflight
+                    query = db.query(Corpus.id, Corpus.content).filter(Corpus.analyzed_at.is_(None))
+                    if exclude:
+                        query = query.filter(Corpus.id.notin_(list(exclude)))
+                    rows = query.order_by(Corpus.id.desc()).limit(
+                        min(PIPELINE_AI_WORKERS * 2, PIPELINE_AI_LIMIT - fed)).all()
+                finally:
+                    db.close()
+                if not rows:
+                    if not self._crawling:
+                        break
+                    await asyncio.sleep(1)
+                    continue
+                for corpus_id, content in rows:
+                    self._ai_fed.add(corpus_id)
+                    self._ai_inflight.add(corpus_id)
+                    await self._ai_queue.put((corpus_id, content or ""))
+                    fed += 1
+        finally:
+            for _ in range(PIPELINE_AI_WORKERS):
+                await self._ai_queue.put(_STOP)
+
+    async def _ai_worker(self, ai_pool: ThreadPoolExecutor, limiter: RateLimiter):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._ai_queue.get()
+            if item is _STOP:
+                break
+            corpus_id, content = item
+            await limiter.acquire()
+            analysis = await loop.run_in_executor(ai_pool, self.ai_extractor.extract_by_ai, content)
+            if analysis.get("method") == "ai":
+                # 写入提交后才移出 _ai_inflight
+                await self._writes.put({"kind": "ai", "values": {
+                    "id": corpus_id,
+                    "plot_tags": analysis.get("tags", []),
+                    "emotion_score": analysis.get("emotion_intensity", 0),
+                    "analyzed_at": datetime.now(),
+                }})
+            else:
+                # AI 调用失败（已退回规则分析），保持未分析状态，下次运行重试
+                self.stats["ai"]["failed"] += 1
+                self._ai_inflight.discard(corpus_id)
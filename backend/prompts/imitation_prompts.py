@@ -137,3 +137,54 @@ GENERATION_PROMPT = """你是殿堂级网文作家，擅长将大纲转化为沉
 
 现在请开始创作仿写正文：
 """
+
+# ========== 阶段一（长文）：分块拆解 ==========
+CHUNK_DECONSTRUCTION_PROMPT = """你是资深网文分析师。下面是一篇长文中的一个片段，请只针对这个片段做拆解。
+
+**分析维度**：
+1. 剧情节拍：按顺序列出本片段的关键节拍，并标注情绪和强度(1-10)
+2. 情绪高点：本片段情绪最高涨的一处（引用原文）
+3. 钩子技巧：本片段用到的悬念/断章技巧
+4. 片段概要：一句话概括本片段的抽象逻辑（忽略具体人名地名）
+
+**输出格式（JSON）**：
+```json
+{{
+  "beats": [{{"content": "节拍描述", "emotion": "压抑/爆发/期待", "intensity": 6}}],
+  "emotional_peak": {{"content": "原文引用", "analysis": "为什么这里是高点", "intensity": 8}},
+  "hook_techniques": ["钩子技巧1"],
+  "summary": "抽象逻辑概要"
+}}
+```
+
+片段内容：
+"""
+
+# ========== 阶段一（长文）：合并分块结果 ==========
+CHUNK_MERGE_PROMPT = """你是资深网文分析师。以下是一篇长文按顺序分块拆解后的结果，请把它们合并为全文的"爆款骨架"。
+
+**分块拆解结果**：
+{chunk_results}
+
+**合并要求**：
+1. emotional_peak 取全文情绪最高的一处，position 标注为"第X块"
+2. beat_sheet 按 起/承/转/合 四个阶段归纳全文节拍
+3. abstract_structure 用箭头连接全文抽象逻辑链
+4. hook_techniques 合并去重
+
+**输出格式（JSON）**：
+```json
+{{
+  "emotional_peak": {{"position": "第X块", "content": "原文引用", "analysis": "..."}},
+  "core_emotion": "核心情感主线",
+  "beat_sheet": [
+    {{"phase": "起", "content": "...", "emotion": "..."}},
+    {{"phase": "承", "content": "...", "emotion": "..."}},
+    {{"phase": "转", "content": "...", "emotion": "..."}},
+    {{"phase": "合", "content": "...", "emotion": "..."}}
+  ],
+  "abstract_structure": "抽象逻辑链（用箭头连接）",
+  "hook_techniques": ["钩子技巧1", "钩子技巧2"]
+}}
+```
+"""
@@ -1,25 +1,50 @@
+"""
+定时任务 - 各平台热榜抓取、续抓和 AI 分析，均经抓取分析流水线（backend/pipeline.py）执行
+
+- 抓取和 AI 调用在线程池、规则分析在进程池中进行，事件循环不被阻塞；各平台并发且各自限时
+- 任务锁（job_lock）：热榜抓取和续抓共用抓取锁，AI 分析单独一把锁；同一把锁上一次运行未结束时新的一次直接跳过，
+  多个 API 副本共用数据库时只有获得锁的节点执行。抓取运行较久时不会挤掉定时分析，
+  两者重叠时同一进程内不会重复分析同一条语料，AI 调用共用一个限速
+- stop_scheduler 取消运行中的任务并释放本节点持有的锁，重启后的续抓不会被上一次的锁挡住
+- 每个任务有总时限（CRAWL_JOB_TIMEOUT / ANALYZE_JOB_TIMEOUT），超时取消，未抓完的链接留在队列中下次续抓
+"""
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
+from functools import partial, wraps
+from typing import Set
+import asyncio
 import sys
 import os
+import time
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from backend.database.models import get_db, CrawlTask, Corpus
+from backend.database import job_lock
+from backend.database.models import SessionLocal, CrawlTask
 from backend.crawler.zhihu_crawler import ZhihuCrawler
 from backend.crawler.xiaohongshu_crawler import XiaohongshuCrawler
 from backend.crawler.jinjiang_crawler import JinjiangCrawler
 from backend.crawler.qidian_crawler import QidianCrawler
 from backend.crawler.feilu_crawler import FeiluCrawler
 from backend.crawler.k17_crawler import K17Crawler
+from backend.crawler.engine import throttle
+from backend.crawler.http_cache import get_cache
+from backend.crawler.frontier import frontier
 from backend.analyzer.plot_extractor import PlotExtractor
 from backend.ai.deepseek_client import DeepSeekClient
+from backend.pipeline import CorpusPipeline
 from config.settings import settings
 
-# 创建调度器
-scheduler = AsyncIOScheduler()
+CRAWL_JOB_TIMEOUT = int(os.getenv("CRAWL_JOB_TIMEOUT", str(4 * 3600)))
+ANALYZE_JOB_TIMEOUT = int(os.getenv("ANALYZE_JOB_TIMEOUT", str(2 * 3600)))
+JOB_LOCK_TTL = 300  # 任务锁有效期（秒），运行期间每 1/3 有效期续期一次
+CRAWL_LOCK = "corpus_crawl"
+ANALYZE_LOCK = "corpus_analyze"
+
+# 创建调度器（同一任务不并发运行，错过的多次触发合并为一次）
+scheduler = AsyncIOScheduler(job_defaults={"max_instances": 1, "coalesce": True, "misfire_grace_time": 600})
 
 # 初始化组件
 zhihu_crawler = ZhihuCrawler()
@@ -28,17 +53,97 @@ jinjiang_crawler = JinjiangCrawler()
 qidian_crawler = QidianCrawler()
 feilu_crawler = FeiluCrawler()
 k17_crawler = K17Crawler()
-plot_extractor = PlotExtractor()
 ai_client = DeepSeekClient(api_key=settings.deepseek_api_key)
-
-
+plot_extractor = PlotExtractor(ai_client)
+
+
+# 平台名称 -> 爬虫（与语料、抓取队列的 source 一致）
+CRAWLERS = {
+    "晋江": jinjiang_crawler,
+    "起点": qidian_crawler,
+    "飞卢": feilu_crawler,
+    "17k": k17_crawler,
+    "zhihu": zhihu_crawler,
+    "xiaohongshu": xiaohongshu_crawler,
+}
+
+async def _keep_lock(name: str, job: asyncio.Task, lost: list):
+    """定期续期任务锁；锁被其他节点接管（本节点长时间卡住导致过期）时取消任务"""
+    while True:
+        await asyncio.sleep(JOB_LOCK_TTL / 3)
+        try:
+            renewed = await asyncio.to_thread(job_lock.renew, name, JOB_LOCK_TTL)
+        except Exception as e:
+            print(f"⚠️ 任务锁 {name} 续期失败，稍后重试: {e}")
+            continue
+        if not renewed:
+            print(f"⚠️ 任务锁 {name} 已被其他节点获取，停止本节点的任务")
+            lost.append(True)
+            job.cancel()
+            return
+
+
+# 运行中的定时任务，stop_scheduler 时取消
+_running_jobs: Set[asyncio.Task] = set()
+
+
+def locked_job(name: str, timeout: int):
+    """定时任务装饰器：持有任务锁 name 才执行，超过 timeout 秒取消"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper():
+            if not await asyncio.to_thread(job_lock.acquire, name, JOB_LOCK_TTL):
+                print(f"[{datetime.now()}] ⏭️ {func.__name__}: 上一次运行尚未结束或其他节点正在执行，跳过")
+                return
+            job = asyncio.ensure_future(func())
+            _running_jobs.add(job)
+            job.add_done_callback(_running_jobs.discard)
+            lost = []
+            keeper = asyncio.create_task(_keep_lock(name, job, lost))
+            try:
+                await asyncio.wait_for(job, timeout)
+            except asyncio.TimeoutError:
+                print(f"[{datetime.now()}] ⏱️ {func.__name__} 超过 {timeout} 秒未完成，已取消（未抓完的链接下次续抓）")
+            except asyncio.CancelledError:
+                if not lost:
+                    raise
+            finally:
+                keeper.cancel()
+                await asyncio.to_thread(job_lock.release, name)
+        return wrapper
+    return decorator
+
+
+def _print_stats(stats: dict):
+    for name, counts in stats.items():
+        if name == "ai":
+            if counts:
+                print(f"  🤖 AI分析: 完成 {counts.get('analyzed', 0)} 条，失败 {counts.get('failed', 0)} 条")
+        elif counts.get("fetched") or counts.get("discovered"):
+            print(f"  📚 {name}: 抓取 {counts['fetched']} 条，新增 {counts.get('saved', 0)} 条，"
+                  f"更新 {counts.get('updated', 0)} 条，未变化 {counts.get('unchanged', 0)} 条，"
+                  f"重复 {counts.get('skipped', 0)} 条，失败 {counts.get('failed', 0)} 条")
+
+
+def _print_tasks(started_at: datetime):
+    """本次运行各平台的抓取耗时（CrawlTask）"""
+    db = SessionLocal()
+    try:
+        tasks = db.query(CrawlTask).filter(CrawlTask.started_at >= started_at).order_by(CrawlTask.id).all()
+        for task in tasks:
+            print(f"  ⏱️ {task.source}: {task.status}，耗时 {task.duration or 0:.0f} 秒，"
+                  f"新入队 {(task.stats or {}).get('discovered', 0)} 条"
+                  + (f"，{task.error_message}" if task.error_message else ""))
+    finally:
+        db.close()
+
+
+@locked_job(CRAWL_LOCK, CRAWL_JOB_TIMEOUT)
 async def scheduled_crawl_job():
-    """定时抓取任务 - 专注各大小说平台热榜"""
+    """定时抓取任务 - 专注各大小说平台热榜（各平台并发，同一平台按域名限速）"""
     print(f"[{datetime.now()}] 开始定时抓取各大小说平台热榜...")
-
-    db = next(get_db())
-
-    total_saved = 0
+    started = time.perf_counter()
+    started_at = datetime.now()
 
     # 小说平台热榜配置
     novel_platforms = [
@@ -67,148 +172,74 @@ async def scheduled_crawl_job():
             "limit": 15
         },
     ]
-
-    # 抓取小说平台热榜
+    pages = {source: [] for source in CRAWLERS}
     for platform in novel_platforms:
         for category in platform["categories"]:
-            try:
-                task = CrawlTask(
-                    source=platform["name"],
-                    status="running",
-                    started_at=datetime.now()
-                )
-                db.add(task)
-                db.commit()
-
-                # 获取热榜
-                results = platform["crawler"].get_hot_list(category=category, limit=platform["limit"])
-                success_count = 0
-
-                for item in results:
-                    # 检查是否已存在
-                    existing = db.query(Corpus).filter(Corpus.url == item["url"]).first()
-                    if not existing:
-                        # 获取完整内容
-                        content = platform["crawler"].fetch_content(item["url"])
-
-                        if content and content.get("content"):
-                            # 分析情节标签
-                            try:
-                                analysis = plot_extractor.extract_by_rules(content.get("content", ""))
-                            except:
-                                analysis = {"tags": []}
-
-                            corpus = Corpus(
-                                source=platform["name"],
-                                title=content.get("title", item.get("title", "")),
-                                content=content.get("content", ""),
-                                url=item["url"],
-                                plot_tags=analysis.get("tags", []),
-                                emotion_score=plot_extractor.calculate_emotion_score(content.get("content", "")),
-                                view_count=content.get("views", 0)
-                            )
-                            db.add(corpus)
-                            success_count += 1
-
-                task.status = "success"
-                task.url_count = len(results)
-                task.success_count = success_count
-                task.finished_at = datetime.now()
-                total_saved += success_count
-
-                db.commit()
-                print(f"[{platform['name']} - {category}] 找到 {len(results)} 条，保存 {success_count} 条")
-
-            except Exception as e:
-                print(f"抓取失败 {platform['name']} - {category}: {e}")
-                if task:
-                    task.status = "failed"
-                    task.error_message = str(e)
-                    task.finished_at = datetime.now()
-                    db.commit()
-
-    # 仍然抓取一些知乎内容作为补充（针对狗血文关键词）
-    keywords = ["追妻火葬场", "豪门", "掉马", "假死", "复仇"]
+            pages[platform["name"]].append((
+                f"{platform['name']} - {category}",
+                partial(platform["crawler"].get_hot_list, category=category, limit=platform["limit"])
+            ))
 
+    # 仍然抓取一些知乎、小红书内容作为补充（针对狗血文关键词）
+    keywords = ["追妻火葬场", "豪门", "掉马", "假死", "复仇"]
     for keyword in keywords:
-        try:
-            task = CrawlTask(
-                source="zhihu",
-                status="running",
-                started_at=datetime.now()
-            )
-            db.add(task)
-            db.commit()
-
-            results = zhihu_crawler.search(keyword, limit=5)
-            success_count = 0
-
-            for item in results:
-                existing = db.query(Corpus).filter(Corpus.url == item["url"]).first()
-                if not existing:
-                    content = zhihu_crawler.fetch_content(item["url"])
-
-                    if content:
-                        try:
-                            analysis = plot_extractor.extract_by_rules(content.get("content", ""))
-                        except:
-                            analysis = {"tags": []}
-
-                        corpus = Corpus(
-                            source="zhihu",
-                            title=content.get("title", item.get("title", "")),
-                            content=content.get("content", ""),
-                            url=item["url"],
-                            plot_tags=analysis.get("tags", []),
-                            emotion_score=plot_extractor.calculate_emotion_score(content.get("content", "")),
-                            view_count=content.get("views", 0)
-                        )
-                        db.add(corpus)
-                        success_count += 1
-
-            task.status = "success"
-            task.url_count = len(results)
-            task.success_count = success_count
-            task.finished_at = datetime.now()
-            total_saved += success_count
-
-            db.commit()
-
-        except Exception as e:
-            print(f"抓取失败 zhihu - {keyword}: {e}")
-            if task:
-                task.status = "failed"
-                task.error_message = str(e)
-                task.finished_at = datetime.now()
-                db.commit()
-
-    print(f"[{datetime.now()}] 抓取完成，保存了 {total_saved} 条新语料")
-
-
+        pages["zhihu"].append((f"zhihu - {keyword}", partial(zhihu_crawler.search, keyword, limit=5)))
+        pages["xiaohongshu"].append((f"xiaohongshu - {keyword}", partial(xiaohongshu_crawler.search, keyword, limit=5)))
+
+    before = throttle.snapshot()
+    cache = get_cache()
+    cache_before = dict(cache.stats) if cache else {}
+    stats = await CorpusPipeline(CRAWLERS, plot_extractor).run(pages)
+
+    for domain, domain_stats in throttle.snapshot().items():
+        prev = before.get(domain, {"requests": 0, "waited": 0})
+        print(f"  🌐 {domain}: 请求 {domain_stats['requests'] - prev['requests']} 次，"
+              f"排队等待 {domain_stats['waited'] - prev['waited']:.1f} 秒")
+    if cache:
+        delta = {k: v - cache_before.get(k, 0) for k, v in cache.stats.items()}
+        print(f"  💾 HTTP缓存: 命中 {delta['hits']} 次，304 重新验证 {delta['revalidated']} 次，"
+              f"未命中 {delta['misses']} 次，跳过解析 {delta['extraction_hits']} 次")
+    _print_stats(stats)
+    _print_tasks(started_at)
+    saved = sum(counts.get("saved", 0) for name, counts in stats.items() if name != "ai")
+    print(f"[{datetime.now()}] 抓取完成，保存了 {saved} 条新语料，耗时 {time.perf_counter() - started:.0f} 秒")
+
+
+@locked_job(CRAWL_LOCK, CRAWL_JOB_TIMEOUT)
+async def resume_crawl_job():
+    """续抓：抓取队列中到期未抓的链接（上次任务中断遗留或重试到期），不重新抓列表页"""
+    db = SessionLocal()
+    try:
+        sources = [source for source in frontier.pending_sources(db) if source in CRAWLERS]
+    finally:
+        db.close()
+    if not sources:
+        return
+    print(f"[{datetime.now()}] 续抓队列中未完成的链接: {', '.join(sources)}")
+    _print_stats(await CorpusPipeline(CRAWLERS, plot_extractor).run({source: [] for source in sources}))
+    print(f"[{datetime.now()}] 续抓完成")
+
+
+@locked_job(ANALYZE_LOCK, ANALYZE_JOB_TIMEOUT)
 async def analyze_corpus_job():
-    """分析现有语料，使用AI提取情节"""
+    """消化 AI 分析积压（抓取时新入库的语料由流水线同步分析）"""
     print(f"[{datetime.now()}] 开始AI分析语料...")
-
-    db = next(get_db())
-
-    # 获取未分析的语料（plot_tags为空的）
-    unanalyzed = db.query(Corpus).filter(Corpus.plot_tags == None).limit(20).all()
-
-    for corpus in unanalyzed:
-        try:
-            analysis = plot_extractor.extract_by_ai(corpus.content)
-            corpus.plot_tags = analysis.get("tags", [])
-            # 假设AI返回了emotion_intensity
-            corpus.emotion_score = analysis.get("emotion_intensity", 0)
-            db.commit()
-        except Exception as e:
-            print(f"分析失败 corpus_id={corpus.id}: {e}")
-
+    _print_stats(await CorpusPipeline(CRAWLERS, plot_extractor).run({}))
     print(f"[{datetime.now()}] 分析完成")
 
 
 def start_scheduler():
     """启动调度器"""
+    # 从抓取队列和语料表重建已见链接的布隆过滤器
+    db = SessionLocal()
+    try:
+        print(f"已知链接 {frontier.load(db)} 条，抓取队列 {frontier.stats(db)}")
+    finally:
+        db.close()
+
+    # 启动后立即续抓上次中断时未抓完的链接
+    scheduler.add_job(resume_crawl_job, id="resume_crawl", name="续抓未完成链接", replace_existing=True)
+
     # 每天凌晨2点执行抓取（各大小说平台热榜）
     scheduler.add_job(
         scheduled_crawl_job,
@@ -235,8 +266,11 @@ def start_scheduler():
 
 
 def stop_scheduler():
-    """停止调度器"""
+    """停止调度器，取消运行中的任务并释放本节点持有的任务锁"""
     scheduler.shutdown()
+    for job in list(_running_jobs):
+        job.cancel()
+    job_lock.release_all()
     print("调度器已停止")
 
 
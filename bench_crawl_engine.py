@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+并发抓取基准测试 - 对比逐站逐条抓取(旧写法)与按域名并发的抓取引擎
+
+本地启动若干 HTTP 服务模拟不同平台（每个端口一个域名，响应带固定延迟），
+每个平台抓一页热榜再抓正文，统计总耗时，并在服务端校验同一域名的
+请求间隔和并发数没有超过限制
+用法: python bench_crawl_engine.py [--domains 6] [--books 15] [--latency 0.05] [--interval 0.2,0.4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="并发抓取基准测试")
+    parser.add_argument("--domains", type=int, default=6)
+    parser.add_argument("--books", type=int, default=15, help="每个平台热榜条数")
+    parser.add_argument("--latency", type=float, default=0.05, help="服务端响应延迟(秒)")
+    parser.add_argument("--interval", default="0.2,0.4", help="同一域名请求间隔区间(秒)")
+    parser.add_argument("--concurrency", type=int, default=2, help="同一域名并发数")
+    return parser.parse_args()
+
+
+args = parse_args()
+# 限速参数必须在导入爬虫之前设置
+os.environ["CRAWL_DOMAIN_INTERVAL"] = args.interval
+os.environ["CRAWL_DOMAIN_CONCURRENCY"] = str(args.concurrency)
+# 测量的是网络请求的调度，不走 HTTP 缓存
+os.environ["HTTP_CACHE_ENABLED"] = "false"
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from backend.crawler.base_crawler import BaseCrawler
+from backend.crawler.engine import fetch_all, run_on_domain, domain_of, CRAWL_DOMAIN_INTERVAL
+
+INTERVAL_MIN, INTERVAL_MAX = CRAWL_DOMAIN_INTERVAL
+
+
+# ========== 模拟站点 ==========
+
+class SiteLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.starts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def reset(self):
+        with self.lock:
+            self.starts, self.in_flight, self.max_in_flight = [], 0, 0
+
+
+def make_handler(log: SiteLog, port: int):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with log.lock:
+                log.starts.append(time.monotonic())
+                log.in_flight += 1
+                log.max_in_flight = max(log.max_in_flight, log.in_flight)
+            time.sleep(args.latency)
+            if self.path.startswith("/list"):
+                body = json.dumps([{"url": f"http://127.0.0.1:{port}/book/{i}", "title": f"书{i}"}
+                                   for i in range(args.books)])
+            else:
+                body = json.dumps({"title": self.path, "content": "正文" * 500})
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            with log.lock:
+                log.in_flight -= 1
+
+        def log_message(self, *a):
+            pass
+
+    return Handler
+
+
+class BenchCrawler(BaseCrawler):
+    def __init__(self, base_url: str):
+        super().__init__()
+        self.base_url = base_url
+
+    def get_hot_list(self, limit: int = 20):
+        return self.session.get(f"{self.base_url}/list", timeout=10).json()[:limit]
+
+    def search(self, keyword, limit=20):
+        return self.get_hot_list(limit)
+
+    def fetch_content(self, url):
+        return self.session.get(url, timeout=10).json()
+
+
+# ========== 两种写法 ==========
+
+def crawl_sequential(crawlers):
+    """旧写法：逐个平台、逐条抓取，每次请求后休眠"""
+    saved = 0
+    for crawler in crawlers:
+        items = crawler.get_hot_list(args.books)
+        time.sleep(random.uniform(INTERVAL_MIN, INTERVAL_MAX))
+        for item in items:
+            if crawler.fetch_content(item["url"]):
+                saved += 1
+            time.sleep(random.uniform(INTERVAL_MIN, INTERVAL_MAX))
+    return saved
+
+
+async def crawl_engine(crawlers):
+    """新写法：各平台并发，同一域名由引擎限速"""
+    async def crawl(crawler):
+        items = await run_on_domain(domain_of(crawler.base_url), crawler.get_hot_list, args.books)
+        return sum(1 for c in await fetch_all(crawler, [item["url"] for item in items]) if c)
+
+    return sum(await asyncio.gather(*[crawl(c) for c in crawlers]))
+
+
+def main():
+    servers, logs = [], []
+    for _ in range(args.domains):
+        log = SiteLog()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+        server.RequestHandlerClass = make_handler(log, server.server_address[1])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        logs.append(log)
+    crawlers = [BenchCrawler(f"http://127.0.0.1:{s.server_address[1]}") for s in servers]
+
+    print(f"🏁 {args.domains} 个平台 × (1 页热榜 + {args.books} 条正文)，响应延迟 {args.latency * 1000:.0f}ms，"
+          f"同域名间隔 {INTERVAL_MIN}-{INTERVAL_MAX} 秒，并发 {args.concurrency}\n")
+
+    # 旧写法：普通会话，不经过引擎限速
+    polite_sessions = [crawler.session for crawler in crawlers]
+    for crawler in crawlers:
+        crawler.session = requests.Session()
+    t = time.perf_counter()
+    saved = crawl_sequential(crawlers)
+    sequential = time.perf_counter() - t
+    print(f"{'逐站逐条':<10}{sequential:>8.2f} 秒  保存 {saved} 条")
+
+    for crawler, session in zip(crawlers, polite_sessions):
+        crawler.session = session
+    for log in logs:
+        log.reset()
+    t = time.perf_counter()
+    saved = asyncio.run(crawl_engine(crawlers))
+    concurrent = time.perf_counter() - t
+    print(f"{'引擎并发':<10}{concurrent:>8.2f} 秒  保存 {saved} 条  (提速 {sequential / concurrent:.1f}x)")
+
+    # 服务端校验限速
+    ok = True
+    for log in logs:
+        gaps = [b - a for a, b in zip(log.starts, log.starts[1:])]
+        min_gap = min(gaps) if gaps else 0
+        if min_gap < INTERVAL_MIN - 0.01 or log.max_in_flight > args.concurrency:
+            ok = False
+        print(f"   🌐 请求 {len(log.starts)} 次，最小间隔 {min_gap:.3f} 秒，最大并发 {log.max_in_flight}")
+    per_domain = (args.books + 1) * (INTERVAL_MIN + INTERVAL_MAX) / 2
+    print(f"\n单个域名的理论耗时约 {per_domain:.1f} 秒（总耗时应接近该值而非其 {args.domains} 倍）")
+    print(f"{'✅ 限速符合设置' if ok else '❌ 存在超出限速的请求'}")
+    for server in servers:
+        server.shutdown()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+爬虫解析基准测试 - 用录制的响应离线运行所有爬虫，统计解析耗时、抽取条数和内存
+
+先联网录制一次（响应写入夹具目录，见 backend/crawler/recorder.py）：
+    python bench_crawlers.py --record
+之后离线回放，不联网、不限速，结果可重复，耗时即解析耗时：
+    python bench_crawlers.py [--rounds 3] [--json bench_crawlers.json]
+每个爬虫依次调用 get_hot_list（有则调用）、search，再对列表中前 --fetch 个链接调用 fetch_content
+仓库附带一套按默认参数构造的夹具（fixtures/build_crawler_fixtures.py 生成），不录制也能回放；
+有请求没有录制时列出并以非零状态退出（爬虫改了请求地址，需重新录制或重新生成夹具）
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="爬虫解析基准测试")
+    parser.add_argument("--record", action="store_true", help="联网录制响应（默认离线回放）")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "crawlers"))
+    parser.add_argument("--keyword", default="小说", help="search 的关键词")
+    parser.add_argument("--fetch", type=int, default=5, help="每个爬虫抓取正文的链接数")
+    parser.add_argument("--rounds", type=int, default=3, help="回放轮数（录制时只跑一轮）")
+    parser.add_argument("--json", help="结果另存为 JSON（供 CI 对比）")
+    return parser.parse_args()
+
+
+args = parse_args()
+# 录制/回放模式必须在导入爬虫之前设置
+os.environ["CRAWL_FIXTURES"] = "record" if args.record else "replay"
+os.environ["CRAWL_FIXTURES_DIR"] = args.dir
+# 测量的是解析本身，不走 HTTP 缓存和抽取结果缓存
+os.environ["HTTP_CACHE_ENABLED"] = "false"
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.crawler import (FeiluCrawler, JinjiangCrawler, K17Crawler, QidianCrawler, XiaohongshuCrawler,
+                             ZhihuCrawler)
+from backend.crawler.recorder import get_store
+
+CRAWLERS = {
+    "晋江": JinjiangCrawler,
+    "起点": QidianCrawler,
+    "飞卢": FeiluCrawler,
+    "17k": K17Crawler,
+    "zhihu": ZhihuCrawler,
+    "xiaohongshu": XiaohongshuCrawler,
+}
+
+
+def count_items(result):
+    """列表按条数；正文按是否抓到内容（另计字数）"""
+    if isinstance(result, list):
+        return len(result), 0
+    content = (result or {}).get("content") or ""
+    return (1 if content else 0), len(content)
+
+
+def run_step(fn, rounds: int):
+    """多轮调用取平均耗时，另跑一次用 tracemalloc 测峰值内存（会拖慢执行，不计入耗时）"""
+    store = get_store()
+    missing_before = store.stats["missing"]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    items, chars = count_items(result)
+    return result, {
+        "ms": round(elapsed * 1000, 2),
+        "items": items,
+        "chars": chars,
+        "peak_kb": round(peak / 1024, 1),
+        "missing": (store.stats["missing"] - missing_before) // (rounds + 1),
+    }
+
+
+def bench_crawler(crawler, rounds: int):
+    steps = []
+    urls = []
+    calls = []
+    if hasattr(crawler, "get_hot_list"):
+        calls.append(("get_hot_list", "", crawler.get_hot_list))
+    calls.append(("search", args.keyword, lambda: crawler.search(args.keyword)))
+    for method, arg, fn in calls:
+        result, stats = run_step(fn, rounds)
+        steps.append({"method": method, "arg": arg, **stats})
+        for item in result:
+            if item.get("url") and item["url"] not in urls:
+                urls.append(item["url"])
+
+    for url in urls[:args.fetch]:
+        _, stats = run_step(lambda: crawler.fetch_content(url), rounds)
+        steps.append({"method": "fetch_content", "arg": url, **stats})
+    return steps
+
+
+def main():
+    store = get_store()
+    rounds = 1 if args.record else args.rounds
+    if args.record:
+        print(f"🔴 联网录制到 {args.dir}")
+    else:
+        if not store.count():
+            print(f"❌ {args.dir} 中没有录制的响应（先运行 python bench_crawlers.py --record）")
+            return 1
+        print(f"▶️  回放 {args.dir}（{store.count()} 个响应，{rounds} 轮）")
+
+    report = {}
+    for name, crawler_class in CRAWLERS.items():
+        steps = bench_crawler(crawler_class(), rounds)
+        report[name] = steps
+        print(f"\n🕷️  {name}")
+        for step in steps:
+            flag = f"  ⚠️ 缺少夹具 {step['missing']} 个，不计入汇总" if step["missing"] else ""
+            arg = step["arg"] if len(step["arg"]) <= 50 else step["arg"][:47] + "..."
+            chars = f" {step['chars']} 字" if step["method"] == "fetch_content" else ""
+            print(f"  {step['method']:<14} {step['ms']:>8.1f} ms  {step['items']:>3} 条{chars:<10} "
+                  f"峰值 {step['peak_kb']:>8.1f} KB  {arg}{flag}")
+
+    all_steps = [step for steps in report.values() for step in steps if not step["missing"]]
+    print(f"\n📊 共 {len(all_steps)} 次调用，解析耗时 {sum(s['ms'] for s in all_steps):.1f} ms，"
+          f"抽取 {sum(s['items'] for s in all_steps)} 条，"
+          f"峰值内存最高 {max((s['peak_kb'] for s in all_steps), default=0):.1f} KB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rounds": rounds, "crawlers": report}, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {args.json}")
+
+    if args.record:
+        print(f"✅ 录制 {store.stats['recorded']} 个响应")
+    elif store.missing:
+        print(f"❌ {len(set(store.missing))} 个请求没有录制（爬虫代码改了请求地址时需重新录制）:")
+        for request in sorted(set(store.missing))[:20]:
+            print(f"    {request}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟基准测试 - 对比同步查询(旧写法)与异步查询(AsyncSession)对事件循环的阻塞
+
+并发调用章节列表 / 项目列表 / 稿件详情，同时用探针协程每 5ms 醒来一次，
+记录实际醒来时间比预期晚了多少（即事件循环被阻塞的时长）
+用法: python bench_event_loop_lag.py [--clients 20] [--seconds 5] [--chapters 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# 使用临时数据库，必须在导入模型之前设置
+_tmp_dir = tempfile.mkdtemp(prefix="bench_loop_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.database.models import SessionLocal, NovelProject, ChapterDraft, Manuscript, open_async_pool, close_async_pool
+from backend.database.manuscript_versions import load_manuscript, save_version
+import backend.api.app as api
+
+PROBE_INTERVAL = 0.005
+CONTENT = "测试正文。" * 600  # 约3000字的章节
+
+
+def seed(chapters: int):
+    """写入一个带章节和稿件的项目"""
+    db = SessionLocal()
+    try:
+        project = NovelProject(name="基准项目", status="completed")
+        db.add(project)
+        db.flush()
+        for i in range(1, chapters + 1):
+            db.add(ChapterDraft(project_id=project.id, chapter_number=i, title=f"第{i}章",
+                                content=f"{i}\n{CONTENT}", word_count=len(CONTENT)))
+        for i in range(20):
+            db.add(NovelProject(name=f"项目{i}"))
+        manuscript = Manuscript(project_id=project.id, title="基准稿件", status="completed")
+        db.add(manuscript)
+        save_version(db, manuscript, [{"chapter_number": i, "title": f"第{i}章", "content": f"{i}\n{CONTENT}"}
+                                      for i in range(1, 21)])
+        db.commit()
+        return project.id, manuscript.id
+    finally:
+        db.close()
+
+
+# ========== 旧写法：在事件循环中直接执行同步查询 ==========
+
+async def sync_list_chapters(project_id):
+    db = SessionLocal()
+    try:
+        chapters = db.query(ChapterDraft).filter(ChapterDraft.project_id == project_id).order_by(ChapterDraft.chapter_number).all()
+        return [{"id": c.id, "title": c.title, "content": c.content} for c in chapters]
+    finally:
+        db.close()
+
+
+async def sync_list_projects():
+    db = SessionLocal()
+    try:
+        return [{"id": p.id, "name": p.name} for p in db.query(NovelProject).order_by(NovelProject.created_at.desc()).all()]
+    finally:
+        db.close()
+
+
+async def sync_get_manuscript(manuscript_id):
+    db = SessionLocal()
+    try:
+        return load_manuscript(db, manuscript_id).content
+    finally:
+        db.close()
+
+
+# ========== 新写法：接口本身（AsyncSession） ==========
+
+async def async_list_chapters(project_id):
+    return await api.list_chapters(project_id, None, None, 200)
+
+
+async def async_list_projects():
+    return await api.list_projects(None, None, 100)
+
+
+async def async_get_manuscript(manuscript_id):
+    return await api.get_manuscript(manuscript_id)
+
+
+async def run_mode(handlers, project_id, manuscript_id, clients: int, seconds: float) -> dict:
+    list_chapters, list_projects, get_manuscript = handlers
+    deadline = time.perf_counter() + seconds
+    lags, requests = [], [0]
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+    async def client(n):
+        while time.perf_counter() < deadline:
+            if n % 3 == 0:
+                await list_chapters(project_id)
+            elif n % 3 == 1:
+                await list_projects()
+            else:
+                await get_manuscript(manuscript_id)
+            requests[0] += 1
+            await asyncio.sleep(0)
+
+    await asyncio.gather(probe(), *[client(i) for i in range(clients)])
+    lags.sort()
+    return {
+        "requests": requests[0] / seconds,
+        "p50": statistics.median(lags) * 1000,
+        "p99": lags[int(len(lags) * 0.99) - 1] * 1000,
+        "max": lags[-1] * 1000,
+    }
+
+
+async def main_async(args):
+    await open_async_pool()  # 与运行中的服务一致，使用异步连接池
+    project_id, manuscript_id = seed(args.chapters)
+    modes = {
+        "sync": (sync_list_chapters, sync_list_projects, sync_get_manuscript),
+        "async": (async_list_chapters, async_list_projects, async_get_manuscript),
+    }
+    print(f"🏁 事件循环延迟: {args.clients} 并发, 每轮 {args.seconds:.0f} 秒, 章节 {args.chapters} 个\n")
+    print(f"{'模式':<8}{'请求/秒':>10}{'延迟p50(ms)':>14}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name, handlers in modes.items():
+        s = await run_mode(handlers, project_id, manuscript_id, args.clients, args.seconds)
+        print(f"{name:<8}{s['requests']:>10.1f}{s['p50']:>14.1f}{s['p99']:>10.1f}{s['max']:>10.1f}")
+    await close_async_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环延迟基准测试")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--chapters", type=int, default=200)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+正文抽取基准测试 - 对比 BeautifulSoup 与 lxml 两种抽取引擎
+
+读取 fixtures/html 下保存的页面（网易号、晋江、起点、17k、知乎、小红书、论坛、博客等），
+逐页校验两种引擎的标题、作者、清理前后的正文完全一致，再分别测量吞吐量（页/秒）
+用法: python bench_extractor.py [--dir fixtures/html] [--rounds 5]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+# 测量的是解析本身，不走抽取结果缓存
+os.environ["HTTP_CACHE_ENABLED"] = "false"
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.crawler.content_extractor import EnhancedContentExtractor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="正文抽取基准测试")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html"))
+    parser.add_argument("--rounds", type=int, default=5, help="吞吐量测试轮数")
+    return parser.parse_args()
+
+
+def load_pages(directory: str):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def first_difference(a: str, b: str) -> str:
+    i = next((i for i in range(min(len(a), len(b))) if a[i] != b[i]), min(len(a), len(b)))
+    return f"第 {i} 个字符起: {a[max(0, i - 20):i + 40]!r} != {b[max(0, i - 20):i + 40]!r}"
+
+
+def result(extractor, html: str) -> dict:
+    """清理前（标题、作者、正文）和清理后的抽取结果"""
+    cleaned = {f"cleaned_{k}": v for k, v in extractor._extract(html).items()}
+    return {**extractor._extract_raw(html), **cleaned}
+
+
+def check_quality(pages, reference, candidate) -> bool:
+    """逐页比较两种引擎的抽取结果"""
+    print(f"\n🔍 结果校验（{candidate.engine} 对照 {reference.engine}）")
+    all_ok = True
+    for name, html in pages:
+        expected, actual = result(reference, html), result(candidate, html)
+        diffs = [k for k in expected if expected[k] != actual.get(k)]
+        if diffs:
+            all_ok = False
+            print(f"  ❌ {name}")
+            for key in diffs:
+                print(f"     {key}: {first_difference(str(expected[key]), str(actual.get(key)))}")
+        else:
+            print(f"  ✅ {name:<24} {len(html.encode('utf-8')) // 1024:>4} KB  "
+                  f"标题「{expected['title'][:20]}」 正文 {len(expected['content'])} 字")
+    return all_ok
+
+
+def measure(extractor, pages, rounds: int) -> float:
+    """多轮抽取全部页面，返回每秒页数"""
+    extractor._extract(pages[0][1])  # 预热
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for _, html in pages:
+            extractor._extract(html)
+    return rounds * len(pages) / (time.perf_counter() - started)
+
+
+def main():
+    args = parse_args()
+    pages = load_pages(args.dir)
+    if not pages:
+        print(f"❌ {args.dir} 下没有 .html 页面")
+        return 1
+
+    bs4_extractor = EnhancedContentExtractor(engine="bs4")
+    lxml_extractor = EnhancedContentExtractor(engine="lxml")
+    if lxml_extractor.engine != "lxml":
+        print("❌ 未安装 lxml")
+        return 1
+
+    total_mb = sum(len(html.encode("utf-8")) for _, html in pages) / 1024 / 1024
+    print(f"📄 {len(pages)} 个页面，共 {total_mb:.2f} MB")
+
+    ok = check_quality(pages, bs4_extractor, lxml_extractor)
+
+    print(f"\n⏱️  吞吐量（{args.rounds} 轮）")
+    results = {}
+    for extractor in (bs4_extractor, lxml_extractor):
+        pages_per_sec = measure(extractor, pages, args.rounds)
+        results[extractor.engine] = pages_per_sec
+        print(f"  {extractor.engine:<5} {pages_per_sec:8.1f} 页/秒  {pages_per_sec * total_mb / len(pages):6.2f} MB/秒")
+    print(f"\n🚀 lxml 提速 {results['lxml'] / results['bs4']:.1f} 倍")
+
+    if not ok:
+        print("❌ 抽取结果不一致")
+        return 1
+    print("✅ 抽取结果一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+生成爬虫回放夹具 - 不联网，按 bench_crawlers.py 默认参数跑一遍各爬虫，把构造的响应写入 fixtures/crawlers
+
+列表页、搜索结果、书籍页按各爬虫的选择器构造，章节页和知乎/小红书正文取自 fixtures/html 下的样例页面；
+写入格式与联网录制（CRAWL_FIXTURES=record）相同，每个响应一对 <域名>/<键>.json 和 <域名>/<键>.body。
+爬虫改了请求地址或解析逻辑后重新生成：
+    python fixtures/build_crawler_fixtures.py
+生成时出现没有构造的请求会列出并以非零状态退出
+"""
+import json
+import os
+import re
+import shutil
+import sys
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HTML_DIR = os.path.join(ROOT, "fixtures", "html")
+OUT_DIR = os.path.join(ROOT, "fixtures", "crawlers")
+
+# 与 bench_crawlers.py 的默认参数一致
+KEYWORD = "小说"
+FETCH = 5
+BOOKS = 8  # 每个列表页的条目数
+
+sys.path.insert(0, ROOT)
+
+from backend.crawler import (FeiluCrawler, JinjiangCrawler, K17Crawler, QidianCrawler, XiaohongshuCrawler,
+                             ZhihuCrawler)
+from backend.crawler.content_extractor import EnhancedContentExtractor
+from backend.crawler.page_fetcher import sniff_encoding
+from backend.crawler.recorder import FixtureStore, ReplaySession
+
+TITLES = ["离婚后我成了前夫的白月光", "重生之豪门真千金", "假死三年后他疯了", "掉马后全京城都跪了",
+          "追妻火葬场：总裁他后悔了", "替嫁新娘是大佬", "我在末世开超市", "穿成反派的炮灰前妻"]
+SUMMARY = "她用三年时间证明了自己的真心，换来的却是一纸离婚协议。再次相遇，他红着眼求她回头。"
+
+
+def _html_file(name: str) -> bytes:
+    with open(os.path.join(HTML_DIR, name), "rb") as f:
+        return f.read()
+
+
+def _article(name: str) -> str:
+    """样例页面的正文（知乎、小红书的正文来自接口 JSON，不是整页 HTML）"""
+    body = _html_file(name)
+    html = body.decode(sniff_encoding(body), errors="replace")
+    return EnhancedContentExtractor().extract(html, "")["content"]
+
+
+def _list_page(hrefs) -> str:
+    """排行榜 / 搜索结果页：每条含书名链接、作者、简介、热度，满足各平台列表解析的选择器"""
+    items = "\n".join(
+        f'<div class="book-item"><a href="{href}">{TITLES[i % len(TITLES)]}</a>'
+        f'<span class="author">作者{i + 1}</span><p class="intro">{SUMMARY}</p>'
+        f'<span class="count">{(BOOKS - i) * 1234}</span></div>'
+        for i, href in enumerate(hrefs)
+    )
+    return f'<html><head><meta charset="utf-8"><title>排行榜</title></head><body><section class="rank-list">\n{items}\n</section></body></html>'
+
+
+def _book_page(book_id: int, chapter_href: str) -> str:
+    """书籍详情页：书名、作者、简介、热度和第一章链接"""
+    title = TITLES[book_id % len(TITLES)]
+    return (f'<html><head><meta charset="utf-8"><title>{title}</title></head><body>'
+            f'<h1>{title}</h1><span class="author">作者{book_id}</span>'
+            f'<div class="book-intro description">{SUMMARY}</div><span class="count score vote">{book_id * 321}</span>'
+            f'<a href="{chapter_href}">第一章</a></body></html>')
+
+
+def _zhihu_search() -> dict:
+    return {"data": [{"type": "answer", "object": {
+        "id": 2000 + i, "question": {"id": 100 + i, "title": TITLES[i]}, "excerpt": SUMMARY,
+        "author": {"name": f"答主{i}"}, "voteup_count": (BOOKS - i) * 100,
+    }} for i in range(BOOKS)]}
+
+
+def _xiaohongshu_page(state: dict, title: str = "") -> str:
+    meta = f'<meta property="og:title" content="{title}">' if title else ""
+    return (f'<html><head><meta charset="utf-8">{meta}</head><body><div id="app"></div><script>'
+            f'window.__INITIAL_STATE__={json.dumps(state, ensure_ascii=False)};(function(){{}})()</script></body></html>')
+
+
+def route(url: str):
+    """按 URL 构造响应，返回 (Content-Type, 正文字节)；没有构造的地址返回 None"""
+    parts = urlsplit(url)
+    host, path = parts.hostname or "", parts.path
+    html, as_json = "text/html; charset=utf-8", "application/json; charset=utf-8"
+
+    if host.endswith("jjwxc.net"):
+        if path == "/onebook.php" and "chapterid" not in parts.query and "novelid=" in parts.query:
+            book_id = int(re.search(r"novelid=(\d+)", parts.query).group(1))
+            return html, _book_page(book_id, f"/read?novelid={book_id}&chapterid=1").encode()
+        if path in ("/onebook.php", "/search.php"):
+            return html, _list_page(f"/onebook.php?novelid={1001 + i}" for i in range(BOOKS)).encode()
+        if path == "/read":
+            return html, _html_file("jjwxc_chapter.html")
+    if host.endswith("qidian.com"):
+        if path.startswith("/rank/"):
+            return html, _list_page(f"/book/{1001 + i}/" for i in range(BOOKS)).encode()
+        if path == "/majax/book/search":
+            books = [{"bookId": 2001 + i, "bookName": TITLES[i], "authorName": f"作者{i}", "introduction": SUMMARY}
+                     for i in range(BOOKS)]
+            return as_json, json.dumps({"data": {"books": books}}, ensure_ascii=False).encode()
+        match = re.match(r"/book/(\d+)/$", path)
+        if match:
+            return html, _book_page(int(match.group(1)), f"/chapter/{match.group(1)}/1/").encode()
+        if path.startswith("/chapter/"):
+            return html, _html_file("qidian_book.html")
+    if host.endswith("faloo.com"):
+        if path.startswith("/l/") or path == "/search.aspx":
+            return html, _list_page(f"/{1001 + i}.html" for i in range(BOOKS)).encode()
+        match = re.match(r"/(\d+)\.html$", path)
+        if match:
+            return html, _book_page(int(match.group(1)), f"/{match.group(1)}_1.html").encode()
+        if re.match(r"/\d+_\d+\.html$", path):
+            return html, _html_file("faloo_chapter.html")
+    if host.endswith("17k.com"):
+        if path.startswith("/all/book/") or path == "/search.aspx":
+            return html, _list_page(f"/book/{1001 + i}.html" for i in range(BOOKS)).encode()
+        match = re.match(r"/book/(\d+)\.html$", path)
+        if match:
+            return html, _book_page(int(match.group(1)), f"/chapter/{match.group(1)}/1.html").encode()
+        if path.startswith("/chapter/"):
+            return html, _html_file("k17_chapter.html")
+    if host.endswith("zhihu.com"):
+        if path == "/api/v4/search_v3":
+            return as_json, json.dumps(_zhihu_search(), ensure_ascii=False).encode()
+        match = re.match(r"/api/v4/answers/(\d+)$", path)
+        if match:
+            i = int(match.group(1)) - 2000
+            paragraphs = "".join(f"<p>{p}</p>" for p in _article("zhihu_answer.html").split("\n") if p.strip())
+            data = {"content": f'<div class="RichText ztext">{paragraphs}</div>', "question": {"title": TITLES[i % len(TITLES)]},
+                    "author": {"name": f"答主{i}"}, "voteup_count": (BOOKS - i) * 100}
+            return as_json, json.dumps(data, ensure_ascii=False).encode()
+    if host.endswith("xiaohongshu.com"):
+        if path == "/web/search/simplify":
+            notes = [{"noteCard": {"id": f"note{3001 + i}", "title": TITLES[i], "desc": SUMMARY,
+                                   "user": {"nickname": f"博主{i}"}, "interactInfo": {"likedCount": (BOOKS - i) * 50}}}
+                     for i in range(BOOKS)]
+            return html, _xiaohongshu_page({"search": {"noteList": notes}}).encode()
+        if path.startswith("/explore/"):
+            state = {"note": {"noteDetail": {"desc": _article("xiaohongshu_note.html")}}}
+            return html, _xiaohongshu_page(state, TITLES[0]).encode()
+    return None
+
+
+class BuildSession(ReplaySession):
+    """用 route 构造响应并写入夹具目录，不联网"""
+
+    unrouted = []
+
+    def send(self, request, **kwargs):
+        built = route(request.url)
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        if built is None:
+            self.unrouted.append(f"{request.method} {request.url}")
+            response.status_code, response.reason = 404, "Not Found"
+            response.headers = CaseInsensitiveDict({"Content-Type": "text/html; charset=utf-8"})
+            response._content = b""
+        else:
+            content_type, body = built
+            charset = sniff_encoding(body, content_type if "json" in content_type else "")
+            response.status_code, response.reason = 200, "OK"
+            response.headers = CaseInsensitiveDict({"Content-Type": re.sub(r"charset=[\w-]+", f"charset={charset}",
+                                                                           content_type)})
+            response._content = body
+        response.encoding = charset if built else "utf-8"
+        self.store.record(request, response)
+        return response
+
+
+def main():
+    shutil.rmtree(OUT_DIR, ignore_errors=True)
+    store = FixtureStore(OUT_DIR)
+    crawlers = [JinjiangCrawler(), QidianCrawler(), FeiluCrawler(), K17Crawler(), ZhihuCrawler(), XiaohongshuCrawler()]
+    for crawler in crawlers:
+        headers = crawler.session.headers
+        crawler.session = BuildSession(store)
+        crawler.session.headers = headers
+
+        urls = []
+        lists = ([crawler.get_hot_list()] if hasattr(crawler, "get_hot_list") else []) + [crawler.search(KEYWORD)]
+        for items in lists:
+            urls += [item["url"] for item in items if item.get("url") and item["url"] not in urls]
+        contents = [crawler.fetch_content(url) for url in urls[:FETCH]]
+        chars = sum(len(c.get("content") or "") for c in contents)
+        print(f"🕷️  {type(crawler).__name__}: 列表 {[len(items) for items in lists]} 条，正文 {len(contents)} 篇 {chars} 字")
+
+    print(f"💾 写入 {store.stats['recorded']} 个响应到 {OUT_DIR}")
+    if BuildSession.unrouted:
+        print("❌ 以下请求没有构造响应:")
+        for request in BuildSession.unrouted:
+            print(f"    {request}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
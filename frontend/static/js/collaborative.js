@@ -920,19 +920,30 @@ async function aiReviseChapter(chapterId) {
     showToast('AI正在润色，请稍候...');
 
     try {
-        const response = await fetch(`/api/chapters/${chapterId}/revise`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                focus: focus,
-                style: '播报员口吻'
-            })
-        });
-
-        const result = await response.json();
+        const revise = async (fallbackToFull) => {
+            const response = await fetch(`/api/chapters/${chapterId}/revise`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    focus: focus,
+                    style: '播报员口吻',
+                    fallback_to_full: fallbackToFull
+                })
+            });
+            return response.json();
+        };
+
+        let result = await revise(false);
+        // 补丁无效时由用户决定是否整章重写（整章重写消耗的 token 更多）
+        if (!result.success && result.patch_failed && confirm(result.message + '，是否改为整章重写？')) {
+            showToast('AI正在整章重写，请稍候...');
+            result = await revise(true);
+        }
         if (result.success) {
             showToast('AI润色完成！');
             loadChapters();
+        } else {
+            showToast('润色失败：' + (result.message || result.detail || '请重试'));
         }
     } catch (error) {
         console.error('润色失败:', error);
@@ -985,7 +985,13 @@ async function executeShortStoryRewrite() {
         });
 
         const result = await response.json();
-        if (result.success) {
+        if (result.success && !(result.data.changed_chapters || []).length) {
+            // 没有章节被修改：不生成新版本，也不再发起新一轮审稿
+            const message = result.message || '没有需要修改的章节';
+            showToast(message, 'info');
+            container.innerHTML = `<p>ℹ️ ${message}，稿件未改动</p>`;
+            document.getElementById('short-story-step-6-actions').style.display = 'flex';
+        } else if (result.success) {
             showToast('🎉 重构升级完成！', 'success');
             // 更新当前小说内容
             shortStoryData.step5.chapters = result.data.chapters;
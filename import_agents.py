@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from backend.database.models import ChannelAgent, init_db
 from backend.database.models import SessionLocal
+from backend.database.bulk import bulk_insert
 from datetime import datetime
 
 def import_agents_from_config(config_file="submission_agents_config.json"):
@@ -25,43 +26,46 @@ def import_agents_from_config(config_file="submission_agents_config.json"):
     imported = 0
     failed = 0
 
+    # 一次查出已存在的名称，再一条语句批量写入
+    names = [config.get('name') for config in agent_configs]
+    existing = {name for (name,) in db.query(ChannelAgent.name).filter(ChannelAgent.name.in_(names))}
+    rows = []
+
     for config in agent_configs:
         try:
-            # 检查是否已存在
-            existing = db.query(ChannelAgent).filter(
-                ChannelAgent.name == config['name']
-            ).first()
-
-            if existing:
+            # 检查是否已存在（包括配置中重复的名称）
+            if config['name'] in existing:
                 print(f"⏭️  跳过已存在：{config['name']}")
                 continue
 
             # 创建智能体
-            agent = ChannelAgent(
-                name=config['name'],
-                description=config['description'],
-                channel_type=config['channel_type'],
-                target_audience=config['target_audience'],
-                channel_characteristics=config['channel_characteristics'],
-                length_requirements=config['length_requirements'],
-                writing_style=config['writing_style'],
-                content_structure=config['content_structure'],
-                training_status="pending",
-                is_active=1,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-
-            db.add(agent)
+            rows.append({
+                "name": config['name'],
+                "description": config['description'],
+                "channel_type": config['channel_type'],
+                "target_audience": config['target_audience'],
+                "channel_characteristics": config['channel_characteristics'],
+                "length_requirements": config['length_requirements'],
+                "writing_style": config['writing_style'],
+                "content_structure": config['content_structure'],
+                "training_status": "pending",
+                "is_active": 1,
+                "created_at": datetime.now(),
+                "updated_at": datetime.now()
+            })
+            existing.add(config['name'])
             imported += 1
             print(f"✅ 导入成功：{config['name']} ({config['channel_type']})")
 
         except Exception as e:
             failed += 1
-            print(f"❌ 导入失败：{config['name']} - {e}")
+            print(f"❌ 导入失败：{config.get('name')} - {e}")
 
-    db.commit()
-    db.close()
+    try:
+        bulk_insert(db, ChannelAgent, rows)
+        db.commit()
+    finally:
+        db.close()
 
     print(f"\n🎉 导入完成！")
     print(f"✅ 成功：{imported} 个")
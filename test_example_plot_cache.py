@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+例文情节分析缓存测试 - 修改例文原文后，/api/analyze/plot 必须重新分析而不是返回空的缓存
+
+使用临时 SQLite 数据库，AI 分析替换为计数的假实现，不联网
+用法: python -m pytest -q test_example_plot_cache.py  或  python test_example_plot_cache.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+# 必须在导入应用之前设置
+_tmpdir = tempfile.mkdtemp(prefix="plot-cache-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["HTTP_CACHE_ENABLED"] = "false"
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+
+# 添加项目根目录到Python路径，静态文件目录按相对路径挂载
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from backend.api import app as api
+from backend.database.models import SessionLocal, ExampleAnalysis
+
+
+def _fake_ai(calls):
+    def extract_by_ai(content):
+        calls.append(content)
+        return {"method": "ai", "tags": [f"分析{len(calls)}"], "content_length": len(content)}
+    return extract_by_ai
+
+
+def _analyze(content):
+    return asyncio.run(api.analyze_plot(api.AnalyzeRequest(content=content), SessionLocal()))
+
+
+def test_edit_then_analyze_runs_fresh_analysis():
+    calls = []
+    original = api.plot_extractor.extract_by_ai
+    api.plot_extractor.extract_by_ai = _fake_ai(calls)
+    try:
+        db = SessionLocal()
+        try:
+            created = asyncio.run(api.create_example(
+                api.ExampleAnalysisRequest(title="例文", content="原文第一版"), db))
+        finally:
+            db.close()
+        example_id = created["id"]
+
+        first = _analyze("原文第一版")
+        assert first["cached"] is False and first["result"]["tags"] == ["分析1"]
+        again = _analyze("原文第一版")
+        assert again["cached"] is True and again["result"] == first["result"]
+
+        db = SessionLocal()
+        try:
+            asyncio.run(api.update_example(
+                example_id, api.ExampleAnalysisRequest(title="例文", content="原文第二版"), db))
+        finally:
+            db.close()
+
+        db = SessionLocal()
+        try:
+            stored = db.execute(text("SELECT plot_analysis IS NULL FROM example_analyses WHERE id = :id"),
+                                {"id": example_id}).scalar()
+            assert stored == 1, "修改原文后情节分析应清空为 SQL NULL"
+        finally:
+            db.close()
+
+        edited = _analyze("原文第二版")
+        assert edited["cached"] is False
+        assert edited["result"] is not None and edited["result"]["tags"] == ["分析2"]
+        assert calls == ["原文第一版", "原文第二版"]
+
+        db = SessionLocal()
+        try:
+            assert db.get(ExampleAnalysis, example_id).plot_analysis == edited["result"]
+        finally:
+            db.close()
+    finally:
+        api.plot_extractor.extract_by_ai = original
+
+
+if __name__ == "__main__":
+    test_edit_then_analyze_runs_fresh_analysis()
+    print("✅ 修改例文后重新分析")